@@ -0,0 +1,305 @@
+"""
+Build the resources derived from the synced game data, reprocessing only what changed since the last build.
+
+Usage:
+    python script/build_resources.py [--workers N] [--chunk-size N] [--full]
+
+Steps, their inputs and outputs:
+    operator_mapping  resource/battle_data.json  -> resource/operator_mapping.json, by script/process_battle_data.py
+    level_mapping     resource/map/overview.json -> resource/level_code_mapping.json, resource/level_name_mapping.json,
+                                                    by script/process_overview.py
+    view_table        resource/map/*.json        -> resource/view_table.npz, per level, see script/build_view_table.py
+    avatar_pack       resource/avatar/*.png      -> resource/avatar_pack.npy, resource/avatar_pack.json, per avatar
+
+The manifest resource/build_manifest.json records, for every step, the content hash of each input, a hash of
+what else the outputs depend on (the processing code and config constants), and the content hash of each
+output. A step is skipped if none of them changed. It is rebuilt in full if its code, config or outputs
+changed, e.g. an output was deleted or edited by hand. Otherwise, only new and changed inputs are processed,
+in parallel, and merged into the previous outputs, from which removed inputs are dropped.
+
+The avatar pack holds every avatar as cropped by process_avatar, so that src.cache loads avatars without
+decoding and resizing images. src.cache memory maps the images and reads only the avatars it looks up:
+    avatar_pack.npy:  uint8 grayscale avatars of AVATAR_CROP_SIZE, stacked in the order of the names
+    avatar_pack.json: {"names": file name of each avatar, sorted,
+                       "config": AVATAR_STANDARD_SIZE and AVATAR_CROP_SIZE, to detect a stale pack}
+"""
+
+import argparse
+import glob
+import hashlib
+import inspect
+import json
+import os
+import runpy
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from src.config import ImageProcessingConfig as imgconfig
+from build_view_table import MAP_PATH, OUTPUT_PATH as VIEW_TABLE_PATH, pack_table, project_chunk, view_config
+
+SCRIPT_PATH = os.path.dirname(os.path.abspath(__file__))
+RESOURCE_PATH = "resource"
+AVATAR_PATH = os.path.join(RESOURCE_PATH, "avatar")
+AVATAR_PACK_PATH = os.path.join(RESOURCE_PATH, "avatar_pack.npy")
+AVATAR_PACK_INDEX_PATH = os.path.join(RESOURCE_PATH, "avatar_pack.json")
+MANIFEST_PATH = os.path.join(RESOURCE_PATH, "build_manifest.json")
+MANIFEST_VERSION = 1
+
+
+def file_hash(path: str) -> str:
+    with open(path, "rb") as file:
+        return hashlib.sha256(file.read()).hexdigest()
+
+
+def text_hash(*parts: Any) -> str:
+    return hashlib.sha256("\n".join(str(part) for part in parts).encode("utf-8")).hexdigest()
+
+
+def hash_inputs(paths: List[str]) -> Dict[str, str]:
+    """
+    Hash input files, keyed by file name.
+    """
+    return {os.path.basename(path): file_hash(path) for path in paths}
+
+
+def hash_outputs(paths: List[str]) -> Optional[Dict[str, str]]:
+    """
+    Hash output files, or None if one of them is missing.
+    """
+    if not all(os.path.exists(path) for path in paths):
+        return None
+    return {path.replace(os.sep, "/"): file_hash(path) for path in paths}
+
+
+class Plan:
+    """
+    What a step has to do, from its previous entry in the manifest.
+
+    Attributes:
+        full (bool): Whether the outputs are rebuilt from scratch.
+        todo (List[str]): Inputs to process, all of them on a full rebuild.
+        removed (List[str]): Inputs gone since the last build.
+        unchanged (List[str]): Inputs whose previous results are reused.
+    """
+    def __init__(self, previous: Optional[Dict[str, Any]], inputs: Dict[str, str], dependencies: str, outputs: List[str], full: bool):
+        self.previous_inputs = previous["inputs"] if previous else {}
+        self.full = full or previous is None or previous["dependencies"] != dependencies or previous["outputs"] != hash_outputs(outputs)
+        if self.full:
+            self.previous_inputs = {}
+        self.todo = sorted(name for name, digest in inputs.items() if self.previous_inputs.get(name, {}).get("hash") != digest)
+        self.removed = sorted(name for name in self.previous_inputs if name not in inputs)
+        self.unchanged = sorted(name for name in inputs if name not in self.todo)
+
+    def is_up_to_date(self) -> bool:
+        return not self.full and not self.todo and not self.removed
+
+    def __str__(self) -> str:
+        if self.full:
+            return f"full rebuild of {len(self.todo)} inputs"
+        return f"{len(self.todo)} new or changed, {len(self.removed)} removed, {len(self.unchanged)} unchanged"
+
+
+def run_chunks(func: Callable[[List[str]], List[Any]], paths: List[str], workers: Optional[int], chunk_size: int) -> List[Any]:
+    """
+    Run a function over chunks of paths in a process pool, and concatenate the results.
+    """
+    if not paths:
+        return []
+    chunks = [paths[i:i + chunk_size] for i in range(0, len(paths), chunk_size)]
+    if len(chunks) == 1:
+        return func(chunks[0])
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return [result for results in executor.map(func, chunks) for result in results]
+
+
+def build_mapping(name: str, inputs: List[str], script: str, outputs: List[str], manifest: Dict[str, Any], full: bool) -> None:
+    """
+    Build a mapping step, by running its processing script whenever an input changed.
+    """
+    input_hashes = hash_inputs(inputs)
+    dependencies = text_hash(MANIFEST_VERSION, file_hash(os.path.join(SCRIPT_PATH, script)))
+    plan = Plan(manifest.get(name), input_hashes, dependencies, outputs, full)
+    if plan.is_up_to_date():
+        print(f"{name}: up to date")
+        return
+    runpy.run_path(os.path.join(SCRIPT_PATH, script), run_name="__main__")
+    manifest[name] = {
+        "dependencies": dependencies,
+        "inputs": {input_name: {"hash": digest} for input_name, digest in input_hashes.items()},
+        "outputs": hash_outputs(outputs),
+    }
+    print(f"{name}: {plan}")
+
+
+def build_view_table(manifest: Dict[str, Any], workers: Optional[int], chunk_size: int, full: bool) -> None:
+    """
+    Build the view table, projecting only new and changed levels.
+
+    The table holds a level per stage id, the first one in file name order when several files share it.
+    Files that are not levels, and levels shadowed by another file of the same stage id, are recorded in
+    the manifest with their stage id, and are projected again only if they change or come first.
+    """
+    import src.logic.calc_view as calc_view
+
+    name = "view_table"
+    paths = sorted(path for path in glob.glob(os.path.join(MAP_PATH, "*.json")) if not path.endswith("overview.json"))
+    input_hashes = hash_inputs(paths)
+    dependencies = text_hash(
+        MANIFEST_VERSION, file_hash(inspect.getsourcefile(calc_view)), file_hash(os.path.join(SCRIPT_PATH, "build_view_table.py")),
+        view_config().tolist(),
+    )
+    plan = Plan(manifest.get(name), input_hashes, dependencies, [VIEW_TABLE_PATH], full)
+    if plan.is_up_to_date():
+        print(f"{name}: up to date")
+        return
+    start = time.perf_counter()
+
+    # Stage id of every file, None if it is not a level, and the projection of the levels in the table
+    stage_ids: Dict[str, Optional[str]] = {file: plan.previous_inputs[file].get("stage_id") for file in plan.unchanged}
+    projected: Dict[str, Tuple[Tuple[int, int], np.ndarray, np.ndarray]] = {}
+    if not plan.full:
+        owners = {}
+        for file in sorted(plan.previous_inputs):
+            owners.setdefault(plan.previous_inputs[file].get("stage_id"), file)
+        with np.load(VIEW_TABLE_PATH) as data:
+            table = {key: data[key] for key in data.files}
+        for index, stage_id in enumerate(table["stage_ids"].tolist()):
+            owner = owners.get(stage_id)
+            if owner in stage_ids:
+                start_tile, end_tile = table["offsets"][index], table["offsets"][index + 1]
+                projected[owner] = (tuple(table["shapes"][index]), table["front"][start_tile:end_tile], table["side"][start_tile:end_tile])
+
+    def project(files: List[str]) -> None:
+        for file in files:
+            stage_ids[file] = None
+        results = run_chunks(project_chunk, [os.path.join(MAP_PATH, file) for file in files], workers, chunk_size)
+        for path, stage_id, shape, front, side in results:
+            stage_ids[os.path.basename(path)] = stage_id
+            projected[os.path.basename(path)] = (shape, front, side)
+
+    project(plan.todo)
+    owners = {}
+    for file in sorted(stage_ids):
+        if stage_ids[file] is not None:
+            owners.setdefault(stage_ids[file], file)
+    # A shadowed level comes first once the file it was shadowed by is removed or changes stage id
+    missing = sorted(file for file in owners.values() if file not in projected)
+    project(missing)
+
+    table = pack_table({stage_id: projected[file] for stage_id, file in owners.items()})
+    # Stored uncompressed, so that loading the table at startup is only a file read
+    np.savez(VIEW_TABLE_PATH, **table)
+    manifest[name] = {
+        "dependencies": dependencies,
+        "inputs": {file: {"hash": input_hashes[file], "stage_id": stage_ids[file]} for file in sorted(input_hashes)},
+        "outputs": hash_outputs([VIEW_TABLE_PATH]),
+    }
+    print(f"{name}: {plan}, {len(missing)} shadowed levels projected, {len(owners)} levels in {time.perf_counter() - start:.1f} seconds")
+
+
+def process_avatar_chunk(paths: List[str]) -> List[Tuple[str, Optional[np.ndarray]]]:
+    """
+    Process a chunk of avatars as src.cache does, None for images that can not be loaded.
+    """
+    from src.cache import process_avatar
+
+    results = []
+    for path in paths:
+        try:
+            results.append((os.path.basename(path), process_avatar(path)))
+        except FileNotFoundError:
+            results.append((os.path.basename(path), None))
+    return results
+
+
+def avatar_config() -> List[int]:
+    return [*imgconfig.AVATAR_STANDARD_SIZE, *imgconfig.AVATAR_CROP_SIZE]
+
+
+def build_avatar_pack(manifest: Dict[str, Any], workers: Optional[int], chunk_size: int, full: bool) -> None:
+    """
+    Build the avatar pack, processing only new and changed avatars.
+    """
+    from src.cache import process_avatar
+
+    name = "avatar_pack"
+    paths = sorted(glob.glob(os.path.join(AVATAR_PATH, "*.png")))
+    input_hashes = hash_inputs(paths)
+    dependencies = text_hash(MANIFEST_VERSION, inspect.getsource(process_avatar), avatar_config())
+    outputs = [AVATAR_PACK_PATH, AVATAR_PACK_INDEX_PATH]
+    plan = Plan(manifest.get(name), input_hashes, dependencies, outputs, full)
+    if plan.is_up_to_date():
+        print(f"{name}: up to date")
+        return
+    start = time.perf_counter()
+
+    avatars: Dict[str, np.ndarray] = {}
+    if not plan.full:
+        with open(AVATAR_PACK_INDEX_PATH, "r", encoding="utf-8") as file:
+            previous_names = json.load(file)["names"]
+        images = np.load(AVATAR_PACK_PATH)
+        unchanged = set(plan.unchanged)
+        avatars = {file: image for file, image in zip(previous_names, images) if file in unchanged}
+    failed = []
+    for file, image in run_chunks(process_avatar_chunk, [os.path.join(AVATAR_PATH, file) for file in plan.todo], workers, chunk_size):
+        if image is None:
+            failed.append(file)
+        else:
+            avatars[file] = image
+
+    names = sorted(avatars)
+    crop_width, crop_height = imgconfig.AVATAR_CROP_SIZE
+    images = np.stack([avatars[file] for file in names]) if names else np.zeros((0, crop_height, crop_width), dtype=np.uint8)
+    # A plain array, so that src.cache can memory map it
+    np.save(AVATAR_PACK_PATH, images)
+    with open(AVATAR_PACK_INDEX_PATH, "w", encoding="utf-8") as file:
+        json.dump({"names": names, "config": avatar_config()}, file, ensure_ascii=False, indent=1)
+    manifest[name] = {
+        "dependencies": dependencies,
+        # Avatars that failed to load are left out, so that they are tried again
+        "inputs": {file: {"hash": digest} for file, digest in input_hashes.items() if file not in failed},
+        "outputs": hash_outputs(outputs),
+    }
+    if failed:
+        print(f"{name}: could not load {', '.join(failed)}")
+    print(f"{name}: {plan}, {len(names)} avatars in {time.perf_counter() - start:.1f} seconds")
+
+
+def load_manifest() -> Dict[str, Any]:
+    if not os.path.exists(MANIFEST_PATH):
+        return {}
+    with open(MANIFEST_PATH, "r", encoding="utf-8") as file:
+        manifest = json.load(file)
+    return manifest["steps"] if manifest.get("version") == MANIFEST_VERSION else {}
+
+
+def save_manifest(manifest: Dict[str, Any]) -> None:
+    with open(MANIFEST_PATH, "w", encoding="utf-8") as file:
+        json.dump({"version": MANIFEST_VERSION, "steps": manifest}, file, ensure_ascii=False, indent=1, sort_keys=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the derived resources incrementally")
+    parser.add_argument("--workers", type=int, default=None, help="Number of worker processes. Defaults to the CPU count.")
+    parser.add_argument("--chunk-size", type=int, default=64, help="Number of levels or avatars per chunk.")
+    parser.add_argument("--full", action="store_true", help="Rebuild everything, ignoring the manifest.")
+    args = parser.parse_args()
+
+    manifest = load_manifest()
+    # The mappings come first, src.cache loads them on import
+    build_mapping("operator_mapping", [os.path.join(RESOURCE_PATH, "battle_data.json")], "process_battle_data.py",
+                  [os.path.join(RESOURCE_PATH, "operator_mapping.json")], manifest, args.full)
+    build_mapping("level_mapping", [os.path.join(MAP_PATH, "overview.json")], "process_overview.py",
+                  [os.path.join(RESOURCE_PATH, "level_code_mapping.json"), os.path.join(RESOURCE_PATH, "level_name_mapping.json")],
+                  manifest, args.full)
+    save_manifest(manifest)
+    build_view_table(manifest, args.workers, args.chunk_size, args.full)
+    save_manifest(manifest)
+    build_avatar_pack(manifest, args.workers, args.chunk_size, args.full)
+    save_manifest(manifest)
@@ -0,0 +1,129 @@
+"""
+Precompute the front and side view grids of every level under resource/map.
+
+Usage:
+    python script/build_view_table.py [--workers N] [--chunk-size N]
+
+The grids only depend on the level's view, width, height and heightType, and on ViewCalculationConfig,
+so they are projected offline in bulk: levels are split into chunks handled by a process pool, and each
+chunk is projected at once with a single einsum over all of its tiles.
+
+The result is written to resource/view_table.npz:
+    stage_ids: stage id of each level, sorted (level ids are shared by e.g. normal and emergency variants)
+    offsets:   index of the first tile of each level in the grids, plus the total tile count
+    shapes:    (height, width) of each level
+    front:     float32 (x, y) front view position of every tile, in ratio form, row by row
+    side:      float32 (x, y) side view position of every tile
+    config:    the ViewCalculationConfig constants used, to detect a stale table
+"""
+
+import argparse
+import glob
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from src.config import ViewCalculationConfig as viewconfig
+from src.logic.calc_view import get_view_matrix, get_map_points
+
+MAP_PATH = os.path.join("resource", "map")
+OUTPUT_PATH = os.path.join("resource", "view_table.npz")
+
+
+def view_config() -> np.ndarray:
+    return np.array([viewconfig.FROM_RATIO, viewconfig.TO_RATIO, viewconfig.NEAR, viewconfig.FAR], dtype=np.float64)
+
+
+def project_chunk(paths: List[str]) -> List[Tuple[str, str, Tuple[int, int], np.ndarray, np.ndarray]]:
+    """
+    Project the front and side views of a chunk of levels, with one einsum per view for all their tiles.
+
+    Returns:
+        The path, stage id, shape, front and side views of each level, files that are not levels are left out.
+    """
+    levels = []
+    level_paths = []
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as file:
+            level = json.load(file)
+        if isinstance(level, dict) and "tiles" in level and "view" in level:
+            levels.append(level)
+            level_paths.append(path)
+    if not levels:
+        return []
+
+    # Homogeneous map points of all tiles, and the level each tile belongs to
+    points = [get_map_points(level).reshape(-1, 3) for level in levels]
+    sizes = [len(level_points) for level_points in points]
+    points = np.concatenate(points)
+    points = np.concatenate([points, np.ones((len(points), 1))], axis=1)
+    owners = np.repeat(np.arange(len(levels)), sizes)
+
+    views = []
+    for side in (False, True):
+        matrices = np.stack([get_view_matrix(level, side) for level in levels])
+        view_points = np.einsum("nij,nj->ni", matrices[owners], points)
+        view_points = (view_points / view_points[:, 3:4] + 1) / 2
+        views.append(np.stack([view_points[:, 0], 1 - view_points[:, 1]], axis=1).astype(np.float32))
+
+    results = []
+    start = 0
+    for path, level, size in zip(level_paths, levels, sizes):
+        results.append((
+            path,
+            level["stageId"],
+            (level["height"], level["width"]),
+            views[0][start:start + size],
+            views[1][start:start + size],
+        ))
+        start += size
+    return results
+
+
+def pack_table(projected: Dict[str, Tuple[Tuple[int, int], np.ndarray, np.ndarray]]) -> Dict[str, np.ndarray]:
+    """
+    Pack the shape, front and side views of every stage id into the arrays of the table.
+    """
+    stage_ids = sorted(projected)
+    sizes = [len(projected[stage_id][1]) for stage_id in stage_ids]
+    return {
+        "stage_ids": np.array(stage_ids),
+        "offsets": np.concatenate([[0], np.cumsum(sizes)]).astype(np.int64),
+        "shapes": np.array([projected[stage_id][0] for stage_id in stage_ids], dtype=np.int32),
+        "front": np.concatenate([projected[stage_id][1] for stage_id in stage_ids]),
+        "side": np.concatenate([projected[stage_id][2] for stage_id in stage_ids]),
+        "config": view_config(),
+    }
+
+
+def build(workers: int, chunk_size: int) -> Dict[str, np.ndarray]:
+    paths = sorted(path for path in glob.glob(os.path.join(MAP_PATH, "*.json")) if not path.endswith("overview.json"))
+    chunks = [paths[i:i + chunk_size] for i in range(0, len(paths), chunk_size)]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        projected = {}
+        for results in executor.map(project_chunk, chunks):
+            for _, stage_id, shape, front, side in results:
+                if stage_id in projected:
+                    print(f"Duplicate stage id {stage_id}, keeping the first one")
+                    continue
+                projected[stage_id] = (shape, front, side)
+    return pack_table(projected)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Precompute the view grids of every level")
+    parser.add_argument("--workers", type=int, default=None, help="Number of worker processes. Defaults to the CPU count.")
+    parser.add_argument("--chunk-size", type=int, default=64, help="Number of levels per chunk.")
+    parser.add_argument("--output", type=str, default=OUTPUT_PATH, help="Output file.")
+    args = parser.parse_args()
+
+    table = build(args.workers, args.chunk_size)
+    # Stored uncompressed, so that loading the table at startup is only a file read
+    np.savez(args.output, **table)
+    print(f"Wrote {len(table['stage_ids'])} levels, {len(table['front'])} tiles to {args.output}")
@@ -0,0 +1,86 @@
+"""
+bench_cache.py
+Sweep through many levels and operators, as a long daemon or batch session does, and check that memory stays flat.
+
+Usage:
+    python -m src.benchmark.bench_cache [--levels N] [--opers N] [--unbounded]
+
+Every level of the sweep loads its map and the avatars of a few random operators through src.cache.
+The memory allocated by Python is traced with tracemalloc and sampled at regular intervals, along with
+the bytes accounted by the caches. Once the caches are full, the traced memory must not grow by more
+than the tolerance, otherwise the exit code is 1. With --unbounded, the caches never evict, which shows
+the growth the bounds prevent.
+"""
+
+import argparse
+import logging
+import math
+import random
+import time
+import tracemalloc
+
+from src.logger import logger
+import src.cache as cache
+
+SAMPLES = 10
+TOLERANCE = 0.1 # growth allowed after the caches are full, relative to their total budget
+
+
+def main(args: argparse.Namespace) -> int:
+    # Tokens and devices of the mapping have no avatars, which is logged as an error
+    logger.setLevel(logging.CRITICAL)
+    if args.unbounded:
+        cache.avatars.max_bytes = math.inf
+        cache.maps.max_bytes = math.inf
+    budget = cache.avatars.max_bytes + cache.maps.max_bytes
+
+    rng = random.Random(0)
+    levels = list(cache.LEVEL_CODE_MAPPING)
+    operators = list(cache.OPERATOR_MAPPING)
+    missing = 0
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    rows = []
+    for i in range(args.levels):
+        try:
+            cache.get_map_by_code(levels[i % len(levels)])
+        except (ValueError, FileNotFoundError):
+            missing += 1
+        for oper in rng.sample(operators, args.opers):
+            try:
+                cache.get_avatars(oper)
+            except (ValueError, FileNotFoundError):
+                missing += 1
+        if (i + 1) % max(1, args.levels // SAMPLES) == 0 or i + 1 == args.levels:
+            stats = cache.cache_stats()
+            rows.append((i + 1, tracemalloc.get_traced_memory()[0], stats["maps"], stats["avatars"]))
+    elapsed = time.perf_counter() - start
+    tracemalloc.stop()
+
+    print(f"{'levels':>7}{'traced KiB':>12}{'maps':>7}{'map KiB':>10}{'avatars':>9}{'avatar KiB':>12}{'evictions':>11}")
+    for levels_done, traced, maps, avatars in rows:
+        print(f"{levels_done:>7}{traced / 1024:>12.0f}{maps['entries']:>7}{maps['bytes'] / 1024:>10.0f}"
+              f"{avatars['entries']:>9}{avatars['bytes'] / 1024:>12.0f}{maps['evictions'] + avatars['evictions']:>11}")
+    maps, avatars = rows[-1][2], rows[-1][3]
+    print(f"{args.levels} levels in {elapsed:.1f} seconds, {missing} resources missing, hit rates: "
+          f"maps {maps['hit_rate'] or 0:.2f}, avatars {avatars['hit_rate'] or 0:.2f}")
+
+    # Memory from the first sample where both caches are full, i.e. have evicted
+    full = [traced for _, traced, maps, avatars in rows if maps["evictions"] and avatars["evictions"]]
+    if not full:
+        print("The caches never filled up, sweep more levels to check for flat memory")
+        return 0 if args.unbounded else 1
+    growth = max(full) - full[0]
+    flat = growth <= TOLERANCE * budget
+    print(f"Growth after the caches filled up: {growth / 1024:.0f} KiB, {'flat' if flat else 'NOT flat'}")
+    return 0 if flat else 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="PRTS+ cache memory benchmark")
+    parser.add_argument("--levels", type=int, default=1000, help="Number of levels of the sweep.")
+    parser.add_argument("--opers", type=int, default=8, help="Number of random operators loaded for every level.")
+    parser.add_argument("--unbounded", action="store_true", help="Never evict, to compare with the bounded caches.")
+    args = parser.parse_args()
+    raise SystemExit(main(args))
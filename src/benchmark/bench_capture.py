@@ -0,0 +1,94 @@
+"""
+bench_capture.py
+Benchmark a single capture of the union of the cost area and the deploy strip against separate captures.
+
+Usage:
+    python -m src.benchmark.bench_capture [--repeat N] [--grab-overhead MS] [--live]
+
+By default the frames are rendered by the simulated game window and served by a ReplayWindow, whose
+grab is a plain memory copy. A real BitBlt also pays a fixed cost per call for creating the device
+contexts and the bitmap, which --grab-overhead adds to every grab. With --live, the captures run
+against the running MuMu emulator instead.
+"""
+
+import argparse
+import logging
+import random
+import time
+from typing import Tuple
+
+import numpy as np
+
+from src.logger import logger
+from src.logic.game_time import GameTime
+# Importing the consumers registers the "cost" and "operator" ROIs
+from src.logic import analyze_time, locate_avatar  # noqa: F401
+from src.mumu.mumu_vision import capture_roi, capture_snapshot
+from src.mumu.mumu_window import set_window
+from src.mumu.mumu_simulator import ReplayWindow, SimulatedWindow
+from src.benchmark.stats import measure, summarize, format_table
+
+
+class OverheadWindow(ReplayWindow):
+    """
+    A ReplayWindow adding a fixed busy-wait to every grab, to model the setup cost of a BitBlt.
+    """
+    def __init__(self, frames, overhead_ms: float):
+        super().__init__(frames)
+        self.overhead = overhead_ms / 1000
+        self.grabbed_pixels = 0
+
+    def grab(self, rect: Tuple[int, int, int, int]) -> np.ndarray:
+        deadline = time.perf_counter() + self.overhead
+        while time.perf_counter() < deadline:
+            pass
+        self.grabbed_pixels += (rect[2] - rect[0]) * (rect[3] - rect[1])
+        return super().grab(rect)
+
+
+def separate() -> None:
+    capture_roi("cost")
+    capture_roi("operator")
+
+
+def union() -> None:
+    snapshot = capture_snapshot("cost", "operator")
+    capture_roi("cost", snapshot)
+    capture_roi("operator", snapshot)
+
+
+def main(args: argparse.Namespace) -> None:
+    logger.setLevel(logging.WARNING)
+    window = None
+    if not args.live:
+        simulator = SimulatedWindow([args.oper])
+        frames = []
+        for _ in range(args.count):
+            simulator.reset(GameTime(random.randint(0, 99), random.randint(0, GameTime.TICK_MAX - 1)))
+            frames.append(simulator.render())
+        window = OverheadWindow(frames, args.grab_overhead)
+        set_window(window)
+
+    results = {}
+    for name, func in (("separate", separate), ("union", union)):
+        if window is not None:
+            window.grabbed_pixels = 0
+        results[name] = summarize(measure(func, args.repeat))
+        if window is not None:
+            # Pixels grabbed per decision point, including the warmup call
+            print(f"{name}: {window.grabbed_pixels // (args.repeat + 1)} pixels grabbed per decision point")
+    set_window(None)
+    print(format_table(results))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="PRTS+ union capture benchmark")
+    parser.add_argument("--repeat", type=int, default=500, help="Number of measured decision points per variant.")
+    parser.add_argument("--count", type=int, default=10, help="Number of simulated frames.")
+    parser.add_argument("--grab-overhead", type=float, default=0.0, help="Fixed cost added to every simulated grab, in milliseconds.")
+    parser.add_argument("--oper", type=str, default="斑点", help="Operator used by the simulated game window.")
+    parser.add_argument("--live", action="store_true", help="Capture from the running MuMu emulator.")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed for the simulated frames.")
+    args = parser.parse_args()
+    random.seed(args.seed)
+    main(args)
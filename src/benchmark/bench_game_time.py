@@ -0,0 +1,104 @@
+"""
+bench_game_time.py
+Benchmark the slotted GameTime and Action against the frozen dataclasses they replaced.
+
+Usage:
+    python -m src.benchmark.bench_game_time [--iterations N]
+
+The legacy classes are reproduced here as they were. Every operation is timed in a tight loop and
+reported in nanoseconds per operation, along with the size of one instance.
+"""
+
+import argparse
+import dataclasses
+import sys
+import time
+from typing import Callable, ClassVar, Optional, Tuple
+
+from src.config import GameTimeConfig as config
+from src.logic.action import Action, ActionType, DirectionType
+from src.logic.game_time import GameTime
+
+
+@dataclasses.dataclass(order=True, frozen=True)
+class LegacyGameTime:
+    cost: int
+    tick: int
+
+    TICK_MAX: ClassVar[int] = config.TICK_MAX_DEFAULT
+
+    def __post_init__(self):
+        object.__setattr__(self, 'cost', self.cost + self.tick // self.TICK_MAX)
+        object.__setattr__(self, 'tick', self.tick % self.TICK_MAX)
+
+    def __add__(self, other: 'LegacyGameTime') -> 'LegacyGameTime':
+        total_cost = self.cost + other.cost + (self.tick + other.tick) // self.TICK_MAX
+        total_tick = (self.tick + other.tick) % self.TICK_MAX
+        return LegacyGameTime(total_cost, total_tick)
+
+
+@dataclasses.dataclass(order=True)
+class LegacyAction:
+    cost: Optional[int] = None
+    tick: Optional[int] = None
+    action_type: Optional[ActionType] = None
+    oper: Optional[str] = None
+    pos: Optional[str] = None
+    direction: Optional[DirectionType] = None
+    alias: Optional[str] = None
+    tile_pos: Optional[Tuple[int, int]] = None
+    avatar_pos: Optional[Tuple[float, float]] = None
+    view_pos_front: Optional[Tuple[float, float]] = None
+    view_pos_side: Optional[Tuple[float, float]] = None
+
+
+def per_operation(func: Callable[[], object], iterations: int) -> float:
+    """
+    Run an operation the given number of times and return the mean time per operation, in nanoseconds.
+    """
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - start) / iterations * 1e9
+
+
+def instance_size(instance: object) -> int:
+    size = sys.getsizeof(instance)
+    if hasattr(instance, "__dict__"):
+        size += sys.getsizeof(instance.__dict__)
+    return size
+
+
+def main(iterations: int) -> None:
+    legacy_now, legacy_threshold, legacy_target = LegacyGameTime(14, 27), LegacyGameTime(0, 5), LegacyGameTime(15, 10)
+    now, threshold, target = GameTime(14, 27), GameTime(0, 5), GameTime(15, 10)
+    bound = int(target) - int(threshold)
+
+    cases = [
+        ("construct", lambda: LegacyGameTime(14, 27), lambda: GameTime(14, 27)),
+        ("add", lambda: legacy_now + legacy_threshold, lambda: now + threshold),
+        ("compare", lambda: legacy_now < legacy_target, lambda: now < target),
+        # The check of wait_until_threshold, before and after precomputing the bound
+        ("loop check", lambda: legacy_now + legacy_threshold < legacy_target, lambda: now < bound),
+        ("action", lambda: LegacyAction(15, 0, ActionType.DEPLOY, "斑点", "D2", DirectionType.RIGHT),
+                   lambda: Action(15, 0, ActionType.DEPLOY, "斑点", "D2", DirectionType.RIGHT)),
+    ]
+
+    print(f"{'operation':<12}{'legacy ns':>12}{'slotted ns':>12}{'speedup':>10}")
+    for name, legacy, slotted in cases:
+        legacy_ns = per_operation(legacy, iterations)
+        slotted_ns = per_operation(slotted, iterations)
+        print(f"{name:<12}{legacy_ns:>12.1f}{slotted_ns:>12.1f}{legacy_ns / slotted_ns:>9.2f}x")
+
+    print(f"{'size':<12}{'legacy B':>12}{'slotted B':>12}")
+    print(f"{'GameTime':<12}{instance_size(legacy_now):>12d}{instance_size(now):>12d}")
+    legacy_action = LegacyAction(15, 0, ActionType.DEPLOY, "斑点", "D2", DirectionType.RIGHT)
+    action = Action(15, 0, ActionType.DEPLOY, "斑点", "D2", DirectionType.RIGHT)
+    print(f"{'Action':<12}{instance_size(legacy_action):>12d}{instance_size(action):>12d}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="PRTS+ GameTime and Action benchmark")
+    parser.add_argument("--iterations", type=int, default=200000, help="Number of iterations per operation.")
+    args = parser.parse_args()
+    main(args.iterations)
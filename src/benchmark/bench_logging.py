@@ -0,0 +1,87 @@
+"""
+bench_logging.py
+Benchmark the logging overhead per loop iteration, in normal and debug mode.
+
+Usage:
+    python -m src.benchmark.bench_logging [--iterations N]
+
+Compares eagerly formatted f-strings written synchronously to the console (the previous design)
+against lazy %-style arguments handed to the queue-based logger. Console output is redirected to
+os.devnull while measuring, so the numbers exclude the terminal itself; a real console only adds
+to the synchronous variant. The overhead is also shown relative to one hot loop iteration.
+"""
+
+import argparse
+import logging
+import os
+import time
+from typing import Callable
+
+from src.logger import logger, ch, log_queue, ColoredFormatter
+from src.logic.action import Action, ActionType, DirectionType
+from src.logic.game_time import GameTime
+
+
+def per_iteration(func: Callable[[], None], iterations: int) -> float:
+    """
+    Run a loop body the given number of times and return the mean time per iteration, in microseconds.
+    """
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def main(iterations: int, loop_ms: float) -> None:
+    action = Action(15, 0, ActionType.DEPLOY, "斑点", "D2", DirectionType.RIGHT)
+    game_time = GameTime(14, 27)
+    data_loc = (1, 1)
+
+    def eager():
+        logger.debug(f"Setting control {'cur_row'} to {game_time} at {data_loc}")
+        logger.info(f"Get action: {action}")
+
+    def lazy():
+        logger.debug("Setting control %s to %s at %s", 'cur_row', game_time, data_loc)
+        logger.info("Get action: %s", action)
+
+    # A synchronous logger, as it was before the queue-based design
+    sync_logger = logging.getLogger("BenchmarkSyncLogger")
+    sync_logger.propagate = False
+
+    with open(os.devnull, "w", encoding="utf-8") as devnull:
+        sync_handler = logging.StreamHandler(devnull)
+        sync_handler.setFormatter(ColoredFormatter('%(asctime)s - %(levelname)-7s - %(message)s'))
+        sync_logger.addHandler(sync_handler)
+
+        def eager_sync():
+            sync_logger.debug(f"Setting control {'cur_row'} to {game_time} at {data_loc}")
+            sync_logger.info(f"Get action: {action}")
+
+        original_stream = ch.setStream(devnull)
+        try:
+            print(f"{'mode':<8}{'variant':<28}{'us/iteration':>14}{'% of loop':>12}")
+            for mode, level in (("normal", logging.WARNING), ("debug", logging.DEBUG)):
+                logger.setLevel(level)
+                sync_logger.setLevel(level)
+                for variant, func in (
+                    ("f-string, synchronous", eager_sync),
+                    ("f-string, queue", eager),
+                    ("lazy %-style, queue", lazy),
+                ):
+                    overhead = per_iteration(func, iterations)
+                    print(f"{mode:<8}{variant:<28}{overhead:>14.3f}{overhead / (loop_ms * 10):>11.3f}%")
+            # Wait for the listener to drain the queue before restoring the console
+            while not log_queue.empty():
+                time.sleep(0.01)
+        finally:
+            ch.setStream(original_stream)
+            logger.setLevel(logging.DEBUG)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="PRTS+ logging overhead benchmark")
+    parser.add_argument("--iterations", type=int, default=100000, help="Number of loop iterations per variant.")
+    parser.add_argument("--loop-ms", type=float, default=5.0, help="Duration of one hot loop iteration (capture and OCR), for reference.")
+    args = parser.parse_args()
+    main(args.iterations, args.loop_ms)
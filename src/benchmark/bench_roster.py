@@ -0,0 +1,81 @@
+"""
+bench_roster.py
+Compare locating the operators of deploys by a search of the whole deploy strip with the roster tracker.
+
+Usage:
+    python -m src.benchmark.bench_roster [--deploys N] [--opers N]
+
+The deploy strip of the simulated game window holds the given number of operators. Every step locates
+a random operator of the strip twice, as perform_deploy does: before selecting its card, and once the
+card is raised by the selection. The operator is then deployed, and sometimes an operator deployed
+before is retreated back into the strip. Both methods locate the operator from the same snapshots, and
+must agree on its position.
+"""
+
+import argparse
+import logging
+import random
+import time
+
+from src.logger import logger
+from src.logic.action import Action
+from src.logic.locate_avatar import locate_avatar
+from src.logic.roster import roster
+from src.mumu.mumu_simulator import SimulatedWindow
+from src.mumu.mumu_vision import capture_snapshot
+from src.mumu.mumu_window import set_window
+from src.utils.metrics import metrics
+
+OPERS = ["斑点", "芬", "克洛丝", "炎熔", "米格鲁", "芙蓉", "安赛尔", "史都华德", "玫兰莎", "翎羽"]
+
+
+def main(args: argparse.Namespace) -> None:
+    logger.setLevel(logging.ERROR)
+    opers = OPERS[:args.opers]
+    window = SimulatedWindow(opers)
+    set_window(window)
+    rng = random.Random(0)
+    metrics.reset()
+
+    start = time.perf_counter()
+    roster.start(opers)
+    start_time = time.perf_counter() - start
+
+    search_time, roster_time, lookups, agreed = 0.0, 0.0, 0, 0
+    for _ in range(args.deploys):
+        if not window.strip:
+            window.strip.append(window.deployed.pop(0))
+        index = rng.randrange(len(window.strip))
+        oper = window.strip[index]
+        for selected in (None, index):
+            window.selected_card = selected
+            snapshot = capture_snapshot("operator")
+            searched, tracked = Action(oper=oper), Action(oper=oper)
+            start = time.perf_counter()
+            locate_avatar(searched, snapshot)
+            search_time += time.perf_counter() - start
+            start = time.perf_counter()
+            roster.locate(tracked, snapshot)
+            roster_time += time.perf_counter() - start
+            lookups += 1
+            agreed += searched.avatar_pos == tracked.avatar_pos
+        window.selected_card = None
+        window.deployed.append(window.strip.pop(index))
+        if window.deployed and rng.random() < 0.4:
+            window.strip.append(window.deployed.pop(rng.randrange(len(window.deployed))))
+
+    hits, misses = metrics.counter("roster_hits").value, metrics.counter("roster_misses").value
+    print(f"{len(opers)} operators matched at the start in {start_time * 1000:.2f} ms")
+    print(f"{lookups} lookups for {args.deploys} deploys, {agreed} agreeing, roster hits {hits}, misses {misses}, "
+          f"refreshes {metrics.counter('roster_refreshes').value}")
+    print(f"{'whole strip search':<20}{search_time / lookups * 1000:>8.3f} ms per lookup")
+    print(f"{'roster tracker':<20}{roster_time / lookups * 1000:>8.3f} ms per lookup ({search_time / roster_time:.1f}x)")
+    set_window(None)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="PRTS+ roster tracker benchmark")
+    parser.add_argument("--deploys", type=int, default=200, help="Number of deploys.")
+    parser.add_argument("--opers", type=int, default=len(OPERS), help="Number of operators in the deploy strip, up to 10.")
+    args = parser.parse_args()
+    main(args)
@@ -0,0 +1,149 @@
+"""
+bench_video_to_script.py
+Record a simulated battle as a video, transcribe it back with video_to_script, and compare with the script.
+
+Usage:
+    python -m src.benchmark.bench_video_to_script [--rounds N] [--fps N] [--workers N] [--keep FILE]
+
+The battle runs against the simulated game window on a recording VirtualClock, which writes a frame of
+the window to the video every 1 / fps seconds of virtual time. Every round deploys each operator, uses its
+skill and retreats it, one cost apart. The simulation records the game time at which it registered every
+input, which is the ground truth of the transcription. The throughput is reported in frames per second,
+along with the time an hour of footage at the same frame rate would take.
+"""
+
+import argparse
+import logging
+import os
+import tempfile
+import time
+from typing import List, Tuple
+
+import cv2
+
+from src.logger import logger
+from src.cache import get_map_by_code, get_view_grids
+from src.logic.action import Action, ActionType, DirectionType
+from src.logic.convert_pos import convert_position
+from src.logic.game_time import GameTime
+from src.logic.perform_action import perform_action, PerformLateError
+from src.mumu.mumu_simulator import SimulatedWindow
+from src.mumu.mumu_window import set_window
+from src.tools.video_to_script import extract_script
+from src.utils.clock import VirtualClock, set_clock
+
+MAP = "1-7"
+OPERS = [("斑点", "D2"), ("芬", "B5")]
+
+
+class RecordingClock(VirtualClock):
+    """
+    A virtual clock writing a frame of the window to a video whenever it passes a frame time.
+    """
+    def __init__(self, writer: cv2.VideoWriter, fps: float):
+        super().__init__()
+        self.writer = writer
+        self.interval = 1 / fps
+        self.next_frame = 0.0
+        self.window = None
+        self.frames = 0
+
+    def sleep(self, seconds: float) -> None:
+        end = self.time + max(seconds, 0)
+        while self.window is not None and self.next_frame <= end:
+            self.time = self.next_frame
+            self.writer.write(cv2.cvtColor(self.window.render(), cv2.COLOR_BGRA2BGR))
+            self.frames += 1
+            self.next_frame += self.interval
+        self.time = max(self.time, end)
+
+
+def build_script(rounds: int) -> List[Action]:
+    script = []
+    target = GameTime(11, 0)
+    for _ in range(rounds):
+        for oper, pos in OPERS:
+            for action_type in (ActionType.DEPLOY, ActionType.SKILL, ActionType.RETREAT):
+                script.append(Action(target.cost, target.tick, action_type, oper, pos, DirectionType.RIGHT))
+                target = target + GameTime(1, 0)
+    return script
+
+
+def record(path: str, rounds: int, fps: float) -> Tuple[List[Action], List[Tuple[str, str, GameTime]], int]:
+    """
+    Record a simulated battle.
+
+    Returns:
+        Tuple[List[Action], List[Tuple[str, str, GameTime]], int]: The script, the inputs registered by the simulation, and the number of frames.
+    """
+    map_data = get_map_by_code(MAP)
+    view_data_front, view_data_side = get_view_grids(map_data)
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), fps, (1280, 720))
+    clock = RecordingClock(writer, fps)
+    set_clock(clock)
+    window = SimulatedWindow([oper for oper, _ in OPERS], grab_seconds=0.005, level=map_data)
+    set_window(window)
+    clock.window = window
+
+    script = build_script(rounds)
+    events = []
+    try:
+        window.reset(GameTime(10, 0))
+        for action in script:
+            convert_position(action, map_data["height"], map_data["width"])
+            action.view_pos_front = view_data_front[action.tile_pos[1]][action.tile_pos[0]]
+            action.view_pos_side = view_data_side[action.tile_pos[1]][action.tile_pos[0]]
+            registered = len(window.events)
+            try:
+                perform_action(action, lambda: False)
+            except PerformLateError as e:
+                logger.warning("%s performed late: %s", action.action_type.name, e)
+            events.extend((kind, action.oper, game_time) for kind, _, game_time in window.events[registered:])
+        # Some footage after the last action
+        clock.sleep(1.0)
+    finally:
+        writer.release()
+        set_clock(None)
+        set_window(None)
+    return script, events, clock.frames
+
+
+def main(args: argparse.Namespace) -> None:
+    logger.setLevel(logging.WARNING)
+    path = args.keep or os.path.join(tempfile.mkdtemp(), "battle.mp4")
+    start = time.perf_counter()
+    script, events, frames = record(path, args.rounds, args.fps)
+    logger.warning("Recorded %s frames (%.1f seconds of footage) in %.1f seconds", frames, frames / args.fps, time.perf_counter() - start)
+
+    start = time.perf_counter()
+    actions = extract_script(path, MAP, [oper for oper, _ in OPERS], args.workers)
+    elapsed = time.perf_counter() - start
+
+    positions = {oper: pos for oper, pos in OPERS}
+    matched = 0
+    print(f"{'registered':<28}{'transcribed':<28}")
+    for i in range(max(len(events), len(actions))):
+        expected = f"{events[i][0]} {events[i][1]} {events[i][2].ticks}" if i < len(events) else "-"
+        found = "-"
+        if i < len(actions):
+            action = actions[i]
+            found = f"{action.action_type.name.lower()} {action.oper} {action.get_game_time().ticks} {action.pos}"
+            if i < len(events) and events[i][0] == action.action_type.name.lower() and events[i][1] == action.oper \
+                    and events[i][2].ticks == action.get_game_time().ticks and action.pos == positions[action.oper]:
+                matched += 1
+        print(f"{expected:<28}{found:<28}")
+    print(f"{matched} of {len(events)} registered inputs transcribed with the same operator, game time and position")
+    print(f"{frames} frames in {elapsed:.1f} seconds ({frames / elapsed:.0f} fps), "
+          f"an hour of {args.fps:.0f} fps footage would take {3600 * args.fps / (frames / elapsed) / 60:.1f} minutes")
+    if not args.keep:
+        os.remove(path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="PRTS+ video to script benchmark")
+    parser.add_argument("--rounds", type=int, default=4, help="Number of rounds of deploy, skill and retreat of every operator.")
+    parser.add_argument("--fps", type=float, default=60, help="Frame rate of the recording.")
+    parser.add_argument("--workers", type=int, default=None, help="Number of worker processes. Defaults to the number of cores.")
+    parser.add_argument("--keep", type=str, default=None, help="Keep the recording at this path.")
+    args = parser.parse_args()
+    main(args)
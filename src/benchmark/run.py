@@ -0,0 +1,254 @@
+"""
+run.py
+End-to-end benchmark suite for the executor, running against recorded frames or a simulated game window.
+
+Usage:
+    python -m src.benchmark.run [--frames DIR] [--baseline FILE] [--save-baseline] [--require-baseline]
+
+The frames directory holds screenshots of the whole game window (*.png) and optionally a labels.json,
+mapping each file name to its expected game time and the operators shown in the deploy strip:
+    {"0001.png": {"cost": 12, "tick": 5, "opers": ["斑点"]}}
+Without a frames directory, frames are rendered by the simulated game window instead.
+
+Timings depend on the machine, so no baseline is shipped: save one with --save-baseline on the machine the
+suite runs on, before the change to measure. Without a baseline, nothing is compared and this is reported
+after the results; with --require-baseline, the exit code is then 1.
+"""
+
+import argparse
+import glob
+import json
+import logging
+import os
+import random
+import sys
+import time
+import cv2
+import numpy as np
+from typing import Any, Callable, Dict, List, Tuple
+
+from src.logger import logger
+from src.config import GameRatioConfig as ratioconfig
+from src.config import ImageProcessingConfig as imgconfig
+from src.logic.action import Action, ActionType, DirectionType
+from src.logic.game_time import GameTime
+from src.logic.analyze_time import get_tick, get_cost, get_game_time, cost_bar_reader
+from src.logic.locate_avatar import locate_avatar
+from src.logic.game_state import get_game_state
+from src.logic.perform_action import perform_action, PerformLateError
+from src.logic.calc_view import transform_map_to_view
+from src.logic.convert_pos import convert_position
+from src.cache import get_map_by_code
+from src.mumu.mumu_vision import capture_game_window, capture_roi
+from src.mumu.mumu_window import set_window
+from src.mumu.mumu_simulator import ReplayWindow, SimulatedWindow
+from src.benchmark.stats import measure, summarize, load_baseline, save_baseline, compare_to_baseline, format_table
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+
+def load_frames(frames_dir: str) -> Tuple[List[np.ndarray], List[Dict[str, Any]]]:
+    """
+    Load recorded frames and their labels from a directory.
+    """
+    paths = sorted(glob.glob(os.path.join(frames_dir, "*.png")))
+    if not paths:
+        raise FileNotFoundError(f"No frames found in {frames_dir}")
+    labels_path = os.path.join(frames_dir, "labels.json")
+    labels = {}
+    if os.path.exists(labels_path):
+        with open(labels_path, "r", encoding="utf-8") as file:
+            labels = json.load(file)
+    frames = [cv2.imread(path, cv2.IMREAD_COLOR) for path in paths]
+    return frames, [labels.get(os.path.basename(path), {}) for path in paths]
+
+
+def render_frames(opers: List[str], count: int) -> Tuple[List[np.ndarray], List[Dict[str, Any]]]:
+    """
+    Render frames at random game times with the simulated game window.
+    """
+    window = SimulatedWindow(opers)
+    frames, labels = [], []
+    for _ in range(count):
+        game_time = GameTime(random.randint(0, 99), random.randint(0, GameTime.TICK_MAX - 1))
+        window.reset(game_time)
+        frames.append(window.render())
+        labels.append({"cost": game_time.cost, "tick": game_time.tick, "opers": list(opers)})
+    return frames, labels
+
+
+def cycle(window: ReplayWindow, func: Callable[[], Any]) -> Callable[[], Any]:
+    """
+    Wrap a stage so that every call runs on the next recorded frame.
+    """
+    def wrapper():
+        window.advance()
+        return func()
+    return wrapper
+
+
+def bench_stages(frames: List[np.ndarray], labels: List[Dict[str, Any]], repeat: int) -> Dict[str, Dict[str, float]]:
+    """
+    Benchmark each stage of reading the game state from a frame.
+    """
+    window = ReplayWindow(frames)
+    set_window(window)
+    results = {}
+
+    results["capture"] = summarize(measure(cycle(window, lambda: capture_game_window(ratioconfig.COST_AREA_RATIO)), repeat))
+    results["capture_strip"] = summarize(measure(cycle(window, lambda: capture_game_window(ratioconfig.OPERATOR_AREA_RATIO)), repeat))
+    # ROI captures convert directly into preallocated buffers, as used by get_game_time and locate_avatar
+    results["roi_cost"] = summarize(measure(cycle(window, lambda: capture_roi("cost")), repeat))
+    results["roi_strip"] = summarize(measure(cycle(window, lambda: capture_roi("operator")), repeat))
+    results["game_state"] = summarize(measure(cycle(window, get_game_state), repeat))
+
+    # Prepare the intermediate images once per frame, so that each stage is measured alone
+    cost_areas, binaries = [], []
+    window.index = 0
+    for _ in frames:
+        cost_areas.append(capture_game_window(ratioconfig.COST_AREA_RATIO))
+        binaries.append(capture_roi("cost").copy())
+        window.advance()
+
+    def nth(items):
+        index = [0]
+        def get():
+            index[0] = (index[0] + 1) % len(items)
+            return items[index[0]]
+        return get
+
+    next_area, next_binary, next_number = nth(cost_areas), nth(binaries), nth(binaries)
+    results["threshold"] = summarize(measure(
+        lambda: cv2.threshold(next_area(), imgconfig.WHITE_THRESHOLD, 255, cv2.THRESH_BINARY), repeat))
+    # Bypass the caches to measure the actual work
+    results["tick_last_row"] = summarize(measure(lambda: get_tick.__wrapped__(next_binary()[-1, :].tobytes()), repeat))
+    cost_bar_reader.reset()
+    results["tick"] = summarize(measure(lambda: cost_bar_reader.read(next_binary()), repeat))
+    ticks = [(binary, label["tick"]) for binary, label in zip(binaries, labels) if "tick" in label]
+    if ticks:
+        results["tick"]["accuracy"] = sum(cost_bar_reader.read(binary).tick == tick for binary, tick in ticks) / len(ticks)
+
+    def read_cost():
+        binary = next_number()
+        left = int(binary.shape[1] * ratioconfig.COST_NUMBER_AREA_RATIO[0])
+        upper = int(binary.shape[0] * ratioconfig.COST_NUMBER_AREA_RATIO[1])
+        right = int(binary.shape[1] * ratioconfig.COST_NUMBER_AREA_RATIO[2])
+        lower = int(binary.shape[0] * ratioconfig.COST_NUMBER_AREA_RATIO[3])
+        number = binary[upper:lower, left:right]
+        return get_cost.__wrapped__(number.tobytes(), number.shape[1], number.shape[0])
+    results["cost_ocr"] = summarize(measure(read_cost, repeat))
+
+    # Full game time reading, checked against the labels
+    correct, labelled = 0, 0
+    samples = []
+    for _ in range(max(repeat // len(frames), 1)):
+        for _ in labels:
+            window.advance()
+            label = labels[window.index]
+            start = time.perf_counter()
+            try:
+                game_time = get_game_time()
+            except Exception as e:
+                logger.warning(f"Failed to read game time of frame {window.index}: {e}")
+                game_time = None
+            samples.append((time.perf_counter() - start) * 1000)
+            if "cost" in label and "tick" in label:
+                labelled += 1
+                correct += game_time == GameTime(label["cost"], label["tick"])
+    results["game_time"] = summarize(samples)
+    if labelled:
+        results["game_time"]["accuracy"] = correct / labelled
+
+    # Avatar location, on frames with a known operator in the deploy strip
+    samples = []
+    for _ in range(max(repeat // len(frames), 1)):
+        for _ in labels:
+            window.advance()
+            label = labels[window.index]
+            if label.get("opers"):
+                action = Action(oper=label["opers"][0])
+                samples.extend(measure(lambda: locate_avatar(action), 1, warmup=0))
+    if samples:
+        results["avatar_locate"] = summarize(samples)
+    return results
+
+
+def bench_actions(oper: str, map_code: str, pos: str, repeat: int) -> Dict[str, Dict[str, float]]:
+    """
+    Benchmark full deploy, skill and retreat actions against the simulated game window.
+    """
+    map_data = get_map_by_code(map_code)
+    view_data_front = transform_map_to_view(map_data, False)
+    view_data_side = transform_map_to_view(map_data, True)
+
+    window = SimulatedWindow([oper])
+    set_window(window)
+    results = {}
+    for action_type in (ActionType.DEPLOY, ActionType.SKILL, ActionType.RETREAT):
+        samples, on_time = [], 0
+        for _ in range(repeat):
+            start_time = GameTime(10, 0)
+            window.reset(start_time)
+            target_time = start_time + GameTime(1, 0)
+            action = Action(target_time.cost, target_time.tick, action_type, oper, pos, DirectionType.RIGHT)
+            convert_position(action, map_data["height"], map_data["width"])
+            action.view_pos_front = view_data_front[action.tile_pos[1]][action.tile_pos[0]]
+            action.view_pos_side = view_data_side[action.tile_pos[1]][action.tile_pos[0]]
+
+            start = time.perf_counter()
+            try:
+                perform_action(action, lambda: False)
+                on_time += 1
+            except PerformLateError as e:
+                logger.warning(f"{action_type.name} performed late: {e}")
+            samples.append((time.perf_counter() - start) * 1000)
+        results[action_type.name.lower()] = summarize(samples)
+        results[action_type.name.lower()]["accuracy"] = on_time / repeat
+    return results
+
+
+def main(args: argparse.Namespace) -> int:
+    logger.setLevel(logging.WARNING)
+    random.seed(args.seed)
+
+    if args.frames:
+        frames, labels = load_frames(args.frames)
+    else:
+        frames, labels = render_frames([args.oper], args.count)
+    results = bench_stages(frames, labels, args.repeat)
+    if not args.skip_actions:
+        results.update(bench_actions(args.oper, args.map, args.pos, args.action_repeat))
+    set_window(None)
+
+    print(format_table(results))
+
+    if args.save_baseline:
+        save_baseline(args.baseline, results)
+        return 0
+    baseline = load_baseline(args.baseline)
+    if baseline is None:
+        print(f"No baseline at {args.baseline}, the results were NOT checked for regressions. "
+              f"Save one with --save-baseline before the change to measure.")
+        return 1 if args.require_baseline else 0
+    regressions = compare_to_baseline(results, baseline, args.tolerance)
+    for regression in regressions:
+        logger.error(f"Regression: {regression}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="PRTS+ benchmark suite")
+    parser.add_argument("--frames", type=str, help="Directory of recorded frames. Uses simulated frames if omitted.")
+    parser.add_argument("--count", type=int, default=30, help="Number of simulated frames.")
+    parser.add_argument("--repeat", type=int, default=200, help="Number of measured calls per stage.")
+    parser.add_argument("--action-repeat", type=int, default=5, help="Number of measured runs per action type.")
+    parser.add_argument("--skip-actions", action="store_true", help="Skip the full deploy/skill/retreat benchmarks.")
+    parser.add_argument("--oper", type=str, default="斑点", help="Operator used by the simulated game window.")
+    parser.add_argument("--map", type=str, default="1-7", help="Map code used for the action benchmarks.")
+    parser.add_argument("--pos", type=str, default="D2", help="Tile position used for the action benchmarks.")
+    parser.add_argument("--baseline", type=str, default=DEFAULT_BASELINE, help="Baseline file to compare against.")
+    parser.add_argument("--save-baseline", action="store_true", help="Store the results as the new baseline.")
+    parser.add_argument("--require-baseline", action="store_true", help="Fail if there is no baseline to compare against.")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative slowdown before reporting a regression.")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed for the simulated frames.")
+    sys.exit(main(parser.parse_args()))
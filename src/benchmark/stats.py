@@ -0,0 +1,112 @@
+import json
+import os
+import time
+import numpy as np
+from typing import Any, Callable, Dict, List, Optional
+
+from src.logger import logger
+
+__all__ = ["measure", "summarize", "load_baseline", "save_baseline", "compare_to_baseline", "format_table"]
+
+PERCENTILES = (50, 90, 99)
+
+
+def measure(func: Callable[[], Any], repeat: int, warmup: int = 1) -> List[float]:
+    """
+    Measure the latency of a function.
+
+    Args:
+        func: The function to measure, called without arguments.
+        repeat: The number of measured calls.
+        warmup: The number of unmeasured calls made beforehand.
+
+    Returns:
+        The latency of each measured call, in milliseconds.
+    """
+    for _ in range(warmup):
+        func()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    """
+    Summarize latency samples into count, mean, max and percentiles, all in milliseconds.
+    """
+    if not samples:
+        return {"count": 0}
+    values = np.asarray(samples, dtype=np.float64)
+    summary = {"count": int(values.size), "mean": float(values.mean()), "max": float(values.max())}
+    for p, value in zip(PERCENTILES, np.percentile(values, PERCENTILES)):
+        summary[f"p{p}"] = float(value)
+    return summary
+
+
+def load_baseline(path: str) -> Optional[Dict[str, Dict[str, float]]]:
+    if not os.path.exists(path):
+        logger.warning(f"Baseline file {path} not found, skipping comparison")
+        return None
+    with open(path, "r", encoding="utf-8") as file:
+        return json.load(file)
+
+
+def save_baseline(path: str, results: Dict[str, Dict[str, float]]) -> None:
+    with open(path, "w", encoding="utf-8") as file:
+        json.dump(results, file, ensure_ascii=False, indent=4)
+    logger.warning(f"Saved baseline to {path}")
+
+
+def compare_to_baseline(
+    results: Dict[str, Dict[str, float]],
+    baseline: Dict[str, Dict[str, float]],
+    tolerance: float,
+) -> List[str]:
+    """
+    Compare benchmark results against a baseline.
+
+    A stage regresses when its p50 or p90 latency is slower than the baseline by more than the
+    given tolerance, or when its accuracy is lower than the baseline.
+
+    Args:
+        results: The results of the current run, keyed by stage name.
+        baseline: The stored results, keyed by stage name.
+        tolerance: The allowed relative slowdown, e.g. 0.2 for 20%.
+
+    Returns:
+        A description of every regression found.
+    """
+    regressions = []
+    for stage, result in results.items():
+        if stage not in baseline:
+            continue
+        base = baseline[stage]
+        for key in ("p50", "p90"):
+            if key in result and key in base and result[key] > base[key] * (1 + tolerance):
+                regressions.append(f"{stage}: {key} {result[key]:.3f} ms > baseline {base[key]:.3f} ms")
+        if "accuracy" in result and "accuracy" in base and result["accuracy"] < base["accuracy"]:
+            regressions.append(f"{stage}: accuracy {result['accuracy']:.3f} < baseline {base['accuracy']:.3f}")
+    return regressions
+
+
+def format_table(results: Dict[str, Dict[str, float]]) -> str:
+    """
+    Format benchmark results as a plain text table.
+    """
+    columns = ["count", "mean"] + [f"p{p}" for p in PERCENTILES] + ["max", "accuracy"]
+    lines = [f"{'stage':<16}" + "".join(f"{column:>10}" for column in columns)]
+    for stage, result in results.items():
+        cells = []
+        for column in columns:
+            value = result.get(column)
+            if value is None:
+                cells.append(f"{'-':>10}")
+            elif column == "count":
+                cells.append(f"{value:>10d}")
+            else:
+                cells.append(f"{value:>10.3f}")
+        lines.append(f"{stage:<16}" + "".join(cells))
+    return "\n".join(lines)
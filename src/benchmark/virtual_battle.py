@@ -0,0 +1,135 @@
+"""
+virtual_battle.py
+Run a whole battle script against the simulated game window on a virtual clock, faster than real time.
+
+Usage:
+    python -m src.benchmark.virtual_battle [--actions N] [--grab-ms MS] [--autoenter] [--map CODE --oper NAME --pos TILE]
+
+Every wait of perform_action and auto_enter goes through utils.clock, and the simulated game window
+advances its game time with the same clock. With a VirtualClock, the waits cost nothing, so a script
+of hundreds of actions runs in seconds while the logic sees the same timing as in a real battle.
+
+The script cycles through deploy, skill and retreat actions of one operator. The gap to the previous
+action cycles through the edge cases of the thresholds: a single tick, around FRAME_THRESHOLD, around
+BULLET_THRESHOLD, and a full cost. Every action is checked twice: by perform_action itself, and against
+the game time at which the simulation registered the input. The exit code is 1 if any action is late,
+not registered, or registered at another game time than its target.
+"""
+
+import argparse
+import logging
+import time
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+from src.logger import logger
+from src.config import PerformActionConfig as actionconfig
+from src.cache import get_map_by_code, get_view_grids
+from src.logic.action import Action, ActionType, DirectionType
+from src.logic.auto_enter import auto_enter
+from src.logic.convert_pos import convert_position
+from src.logic.game_time import GameTime
+from src.logic.perform_action import perform_action, PerformLateError
+from src.mumu.mumu_simulator import SimulatedWindow
+from src.mumu.mumu_window import set_window
+from src.utils.clock import VirtualClock, get_clock, set_clock
+
+ACTION_TYPES = (ActionType.DEPLOY, ActionType.SKILL, ActionType.RETREAT)
+
+
+def edge_gaps() -> List[Tuple[str, int]]:
+    """
+    The gaps between two actions, in ticks, that exercise every branch of perform_action.
+    """
+    return [
+        ("1 tick", 1),
+        ("frame - 1", actionconfig.FRAME_THRESHOLD - 1),
+        ("frame", actionconfig.FRAME_THRESHOLD),
+        ("frame + 1", actionconfig.FRAME_THRESHOLD + 1),
+        ("bullet - 1", actionconfig.BULLET_THRESHOLD - 1),
+        ("bullet", actionconfig.BULLET_THRESHOLD),
+        ("bullet + 1", actionconfig.BULLET_THRESHOLD + 1),
+        ("1 cost", GameTime.TICK_MAX),
+    ]
+
+
+def build_script(oper: str, pos: str, start: GameTime, count: int) -> List[Tuple[str, Action]]:
+    """
+    Build a script of actions, each labelled with the gap to the previous action.
+    """
+    gaps = [gap for gap in edge_gaps() if gap[1] > 0]
+    script = []
+    target = start
+    for i in range(count):
+        label, gap = gaps[(i // len(ACTION_TYPES)) % len(gaps)]
+        target = target + gap
+        script.append((label, Action(target.cost, target.tick, ACTION_TYPES[i % len(ACTION_TYPES)], oper, pos, DirectionType.RIGHT)))
+    return script
+
+
+def main(args: argparse.Namespace) -> int:
+    logger.setLevel(logging.ERROR)
+    clock = VirtualClock()
+    set_clock(clock)
+    window = SimulatedWindow([args.oper], grab_seconds=args.grab_ms / 1000)
+    set_window(window)
+    map_data = get_map_by_code(args.map)
+    view_data_front, view_data_side = get_view_grids(map_data)
+
+    real_start = time.perf_counter()
+    if args.autoenter:
+        window.enter_lobby(GameTime(0, 0))
+        start = auto_enter()
+    else:
+        start = GameTime(10, 0)
+        window.reset(start)
+
+    results: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+    for label, action in build_script(args.oper, args.pos, start + GameTime(1, 0), args.actions):
+        convert_position(action, map_data["height"], map_data["width"])
+        action.view_pos_front = view_data_front[action.tile_pos[1]][action.tile_pos[0]]
+        action.view_pos_side = view_data_side[action.tile_pos[1]][action.tile_pos[0]]
+        target = action.get_game_time()
+        events = len(window.events)
+        result = results[label]
+        result["actions"] += 1
+        try:
+            perform_action(action, lambda: False)
+            result["on_time"] += 1
+        except PerformLateError as e:
+            logger.warning("%s performed late: %s", action.action_type.name, e)
+        # The simulation records the game time at which it registered the input
+        if len(window.events) > events:
+            result["registered"] += 1
+            result["registered_on_time"] += window.events[-1][2] == target
+
+    real = time.perf_counter() - real_start
+    virtual = get_clock().time
+    set_clock(None)
+    set_window(None)
+
+    print(f"{'gap':<12}{'actions':>9}{'on time':>9}{'registered':>12}{'reg. on time':>14}")
+    for label, _ in edge_gaps():
+        if label in results:
+            result = results[label]
+            print(f"{label:<12}{result['actions']:>9d}{result['on_time']:>9d}{result['registered']:>12d}{result['registered_on_time']:>14d}")
+    print(f"{args.actions} actions in {virtual:.1f} s of virtual time and {real:.1f} s of real time ({virtual / real:.1f}x)")
+
+    # Every action must be performed on time, registered by the game, and at its target game time
+    failed = [label for label, result in results.items()
+              if not result["actions"] == result["on_time"] == result["registered"] == result["registered_on_time"]]
+    if failed:
+        print(f"Late, unregistered or mistimed actions at the gaps: {', '.join(failed)}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="PRTS+ virtual time battle")
+    parser.add_argument("--actions", type=int, default=200, help="Number of actions in the script.")
+    parser.add_argument("--grab-ms", type=float, default=5.0, help="Virtual time taken by every capture, in milliseconds.")
+    parser.add_argument("--oper", type=str, default="斑点", help="Operator of the script.")
+    parser.add_argument("--map", type=str, default="1-7", help="Map code of the script.")
+    parser.add_argument("--pos", type=str, default="D2", help="Tile position of the script.")
+    parser.add_argument("--autoenter", action="store_true", help="Enter the battle from the start screen first.")
+    args = parser.parse_args()
+    raise SystemExit(main(args))
@@ -1,14 +1,19 @@
+import bisect
 import cv2
 import json
 import os
 import glob
 import numpy as np
-from typing import List, Dict, Any, Callable
+from typing import List, Dict, Any, Callable, Iterable, Optional, Tuple
 
 from src.logger import logger
 from src.config import ImageProcessingConfig as imgconfig
+from src.config import ViewCalculationConfig as viewconfig
+from src.config import CacheConfig as cacheconfig
+from src.logic.calc_view import transform_map_to_view
+from src.utils.lru import LRUCache
 
-__all__ = ["load_avatars", "get_avatars", "replace_avatar", "load_map_by_code", "get_map_by_code", "load_map_by_name", "get_map_by_name"]
+__all__ = ["load_avatars", "get_avatars", "replace_avatar", "prefetch_avatars", "unpin_avatars", "load_map_by_code", "get_map_by_code", "load_map_by_name", "get_map_by_name", "get_view_grids", "cache_stats"]
 
 RESOURCE_PATH = os.path.join(os.path.dirname(__file__), "..", "resource")
 
@@ -32,7 +37,7 @@ def load_mapping(mapping_file: str) -> Dict[str, str]:
         ) as file:
             return json.load(file)
     except FileNotFoundError:
-        logger.error(f"{mapping_file} not found")
+        logger.error("%s not found", mapping_file)
         raise FileNotFoundError(f"{mapping_file} not found")
 
 
@@ -60,7 +65,7 @@ def load_resource(
     """
     if resource_name not in resource_mapping:
         logger.error(
-            f"No resource found for name: {resource_name}, please check if the name is valid"
+            "No resource found for name: %s, please check if the name is valid", resource_name
         )
         raise ValueError(
             f"No resource found for name: {resource_name}, please check if the name is valid"
@@ -68,38 +73,49 @@ def load_resource(
     resource_filename = resource_mapping[resource_name]
     filepaths = glob.glob(f"{resource_path}/*{resource_filename}*")
     if not filepaths:
-        logger.error(f"No resource found for name: {resource_name}")
+        logger.error("No resource found for name: %s", resource_name)
         raise FileNotFoundError(f"No resource found for name: {resource_name}")
     try:
         return load_func(filepaths)
     except Exception as e:
-        logger.error(f"Error occurred when loading resource: {e}")
+        logger.error("Error occurred when loading resource: %s", e)
         raise
 
 
-def get_resource(resource_name: str, resource_dict: Dict[str, Any], load_func) -> Any:
+def get_resource(resource_name: str, resource_cache: LRUCache, load_func: Callable[[str], Any]) -> Any:
     """
-    Get a resource from a dictionary. If the resource is not in the dictionary, load it using a function.
+    Get a resource from a cache. If the resource is not in the cache, load it using a function and cache it.
 
     Args:
         resource_name: The name of the resource.
-        resource_dict: The dictionary where the resource is stored.
+        resource_cache: The cache where the resource is stored.
         load_func: The function to load the resource.
 
     Returns:
         The resource.
     """
-    if resource_name not in resource_dict:
-        load_func(resource_name)
-    return resource_dict[resource_name]
+    return resource_cache.get(resource_name, load_func)
 
 
 OPERATOR_MAPPING: Dict[str, str] = load_mapping("operator_mapping.json")
 LEVEL_CODE_MAPPING: Dict[str, str] = load_mapping("level_code_mapping.json")
 LEVEL_NAME_MAPPING: Dict[str, str] = load_mapping("level_name_mapping.json")
 
-avatars: Dict[str, List[np.ndarray]] = {}
-maps: Dict[str, Dict[str, Any]] = {}
+# Bounded, so that a long session through many levels and operators keeps a flat memory use
+avatars = LRUCache("avatars", cacheconfig.AVATAR_CACHE_BYTES)
+maps = LRUCache("maps", cacheconfig.MAP_CACHE_BYTES)
+
+# Precomputed view grids, built by script/build_view_table.py
+VIEW_TABLE_FILE = "view_table.npz"
+view_table: Optional[Dict[str, np.ndarray]] = None
+view_table_index: Dict[str, int] = {}
+
+# Preprocessed avatars, built by script/build_resources.py. The images are memory mapped, only the
+# avatars looked up are read, and copied into the avatar cache
+AVATAR_PACK_FILE = "avatar_pack.npy"
+AVATAR_PACK_INDEX_FILE = "avatar_pack.json"
+avatar_pack: Optional[np.ndarray] = None
+avatar_pack_names: List[str] = []
 
 
 def process_avatar(path: str) -> np.ndarray:
@@ -117,36 +133,89 @@ def process_avatar(path: str) -> np.ndarray:
     return avatar[starty : starty + cropy, startx : startx + cropx]
 
 
-def load_avatars(oper_name: str) -> None:
+# The load functions read the resource files, the get functions go through the caches
+
+
+def load_avatar_pack() -> None:
+    """
+    Map the preprocessed avatars, unless they are missing or built with other avatar sizes.
+    """
+    global avatar_pack, avatar_pack_names
+    # Empty rather than None, so that a missing pack is looked for once
+    crop_width, crop_height = imgconfig.AVATAR_CROP_SIZE
+    avatar_pack, avatar_pack_names = np.zeros((0, crop_height, crop_width), dtype=np.uint8), []
+    path, index_path = os.path.join(RESOURCE_PATH, AVATAR_PACK_FILE), os.path.join(RESOURCE_PATH, AVATAR_PACK_INDEX_FILE)
+    if not os.path.exists(path) or not os.path.exists(index_path):
+        logger.warning("%s not found, avatars will be processed from the images", AVATAR_PACK_FILE)
+        return
+    with open(index_path, "r", encoding="utf-8") as file:
+        index = json.load(file)
+    if index["config"] != [*imgconfig.AVATAR_STANDARD_SIZE, *imgconfig.AVATAR_CROP_SIZE]:
+        logger.warning("%s was built with other avatar sizes, avatars will be processed from the images", AVATAR_PACK_FILE)
+        return
+    images = np.load(path, mmap_mode="r")
+    if len(images) != len(index["names"]):
+        logger.warning("%s does not match %s, avatars will be processed from the images", AVATAR_PACK_FILE, AVATAR_PACK_INDEX_FILE)
+        return
+    # Sorted by the builder, so that the avatars of an operator are a range of names sharing its file name prefix
+    avatar_pack, avatar_pack_names = images, index["names"]
+    logger.info("Mapped avatar pack with %s avatars", len(avatar_pack_names))
+
+
+def load_packed_avatars(filename: str) -> List[np.ndarray]:
+    """
+    Read the avatars whose file names start with a file name of the operator mapping from the pack.
+    """
+    start = bisect.bisect_left(avatar_pack_names, filename)
+    end = start
+    while end < len(avatar_pack_names) and avatar_pack_names[end].startswith(filename):
+        end += 1
+    # Copies, so that the avatar cache owns and accounts for them instead of views of the mapped file
+    return [np.array(avatar_pack[i]) for i in range(start, end)]
+
+
+def load_avatars(oper_name: str) -> List[np.ndarray]:
     def load_func(paths: List[str]) -> List[np.ndarray]:
         return [process_avatar(path) for path in paths]
 
-    avatars[oper_name] = load_resource(
+    # The pack holds the same avatars as the images matched by load_resource, already processed
+    if avatar_pack is None:
+        load_avatar_pack()
+    if oper_name in OPERATOR_MAPPING:
+        packed = load_packed_avatars(OPERATOR_MAPPING[oper_name])
+        if packed:
+            logger.info("Loaded avatars for %s from the pack", oper_name)
+            return packed
+
+    oper_avatars = load_resource(
         oper_name, OPERATOR_MAPPING, os.path.join(RESOURCE_PATH, "avatar"), load_func
     )
-    logger.info(f"Loaded avatars for {oper_name}")
+    logger.info("Loaded avatars for %s", oper_name)
+    return oper_avatars
 
 
-def load_map_by_code(map_code: str) -> None:
+def load_map_by_code(map_code: str) -> Dict[str, Any]:
     def load_func(paths: List[str]) -> Dict[str, Any]:
         with open(paths[0], "r", encoding="utf-8") as file:
             return json.load(file)
 
-    maps[map_code] = load_resource(
+    map_data = load_resource(
         map_code, LEVEL_CODE_MAPPING, os.path.join(RESOURCE_PATH, "map"), load_func
     )
-    logger.info(f"Loaded map data for {map_code}")
+    logger.info("Loaded map data for %s", map_code)
+    return map_data
 
 
-def load_map_by_name(map_name: str) -> None:
+def load_map_by_name(map_name: str) -> Dict[str, Any]:
     def load_func(paths: List[str]) -> Dict[str, Any]:
         with open(paths[0], "r", encoding="utf-8") as file:
             return json.load(file)
 
-    maps[map_name] = load_resource(
+    map_data = load_resource(
         map_name, LEVEL_NAME_MAPPING, os.path.join(RESOURCE_PATH, "map"), load_func
     )
-    logger.info(f"Loaded map data for {map_name}")
+    logger.info("Loaded map data for %s", map_name)
+    return map_data
 
 
 def get_avatars(oper_name: str) -> List[np.ndarray]:
@@ -165,6 +234,87 @@ def replace_avatar(oper_name: str, avatar: np.ndarray) -> None:
     avatars[oper_name] = [avatar]
 
 
+def prefetch_avatars(oper_names: Iterable[str], pin: bool = False) -> None:
+    """
+    Load the avatars of operators ahead of their first use, e.g. of all operators of a script before the battle.
+
+    Operators without avatars are skipped with a warning, they fail when used as before.
+
+    Args:
+        oper_names: The names of the operators.
+        pin: Whether to keep the avatars cached until unpin_avatars is called.
+    """
+    for oper_name in oper_names:
+        if pin:
+            avatars.pin([oper_name])
+        try:
+            avatars.prefetch([oper_name], load_avatars)
+        except (ValueError, FileNotFoundError) as e:
+            logger.warning("Failed to prefetch avatars of %s: %s", oper_name, e)
+
+
+def unpin_avatars() -> None:
+    """
+    Let all pinned avatars be evicted again.
+    """
+    avatars.unpin()
+
+
+def cache_stats() -> Dict[str, Dict[str, Any]]:
+    """
+    Get the size, hit, miss and eviction counts of the avatar and map caches.
+    """
+    return {"avatars": avatars.stats(), "maps": maps.stats()}
+
+
+def load_view_table() -> None:
+    """
+    Load the precomputed view grids, unless they are missing or built with other view constants.
+    """
+    global view_table
+    view_table = {}
+    path = os.path.join(RESOURCE_PATH, VIEW_TABLE_FILE)
+    if not os.path.exists(path):
+        logger.warning("%s not found, view grids will be computed", VIEW_TABLE_FILE)
+        return
+    with np.load(path) as data:
+        table = {key: data[key] for key in data.files}
+    config = np.array([viewconfig.FROM_RATIO, viewconfig.TO_RATIO, viewconfig.NEAR, viewconfig.FAR])
+    if not np.array_equal(table["config"], config):
+        logger.warning("%s was built with other view constants, view grids will be computed", VIEW_TABLE_FILE)
+        return
+    view_table = table
+    view_table_index.update((str(stage_id), index) for index, stage_id in enumerate(table["stage_ids"]))
+    logger.info("Loaded view table with %s levels", len(view_table_index))
+
+
+def get_view_grids(level: Dict[str, Any]) -> Tuple[List[List[Tuple[float, float]]], List[List[Tuple[float, float]]]]:
+    """
+    Get the front and side view grids of a map, as returned by transform_map_to_view.
+
+    The grids are looked up in the precomputed view table, and only computed if the map is not in it.
+
+    Args:
+        level: The map data.
+
+    Returns:
+        The front and side view grids.
+    """
+    if view_table is None:
+        load_view_table()
+    index = view_table_index.get(level.get("stageId"))
+    if index is None or tuple(view_table["shapes"][index]) != (level["height"], level["width"]):
+        return transform_map_to_view(level, False), transform_map_to_view(level, True)
+
+    start, end = view_table["offsets"][index], view_table["offsets"][index + 1]
+    grids = []
+    for view in ("front", "side"):
+        points = view_table[view][start:end].astype(np.float64).reshape(level["height"], level["width"], 2).tolist()
+        grids.append([[tuple(point) for point in row] for row in points])
+    logger.info("Looked up view grids, size: %sx%s", level["height"], level["width"])
+    return grids[0], grids[1]
+
+
 if __name__ == "__main__":
     # Usage and Testing
     avatars = get_avatars("弦惊")
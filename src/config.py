@@ -2,10 +2,17 @@ class MuMuEmulatorConfig:
     DEFAULT_COORDINATES = 0x00640064
     WINDOW_NAME = "MuMu模拟器12"
     SUB_WINDOW_NAME = "MuMuPlayer"
+    WM_MOUSEMOVE = 0x0200
+    WM_LBUTTONDOWN = 0x0201
+    WM_LBUTTONUP = 0x0202
     WM_XBUTTONDOWN = 0x020B
     WM_XBUTTONUP = 0x020C
     XBUTTON1 = 0x00010000
     XBUTTON2 = 0x00020000
+    MK_LBUTTON = 0x0001
+    SCHEDULER_SPIN_TIME = 0.002 # the last part of a timed wait between inputs is spun instead of slept
+    SCHEDULER_MAX_SPIN_TIME = 0.02 # upper bound of the spin time, when it adapts to a coarse OS sleep
+    GEOMETRY_TTL = 1.0 # seconds before the cached window size is checked again
 
 class GameRatioConfig:
     COST_AREA_RATIO = (0.906, 0.685, 1, 0.755) # (left, top, right, bottom)
@@ -21,6 +28,9 @@ class GameRatioConfig:
     DEPLOY_DRAG_RATIO = 0.03
     DEPLOY_DELTA_RATIO = 0.02
     OPERATOR_SELECTED_RATIO = 0.9
+    BUTTON_AREA_RATIO = 0.03 # half size of the area probed around a button
+    PAUSE_ICON_AREA_RATIO = (0.925, 0.04, 0.955, 0.1) # (left, top, right, bottom)
+    FIELD_PROBE_RATIO = (0.1, 0.45, 0.9, 0.46) # (left, top, right, bottom), a thin strip across the field
 
 class ImageProcessingConfig:
     WHITE_THRESHOLD = 160
@@ -29,6 +39,13 @@ class ImageProcessingConfig:
     AVATAR_CROP_SIZE = (60, 60)
     OCR_CONFIDENCE_THRESHOLD = 60
     TEMPLATE_MATCH_THRESHOLD = 0.8
+    BUTTON_CHANGE_THRESHOLD = 30 # mean absolute difference in gray level for a button to count as changed
+    PAUSE_ICON_MIN_FILL = 0.02 # minimum ratio of white pixels for the pause icon to be present
+    FIELD_DIM_RATIO = 0.75 # field brightness relative to the running baseline, below which the field is dimmed
+    COST_BAR_SEARCH_ROWS = 6 # bottom rows of the cost area searched for the cost bar
+    COST_BAR_MIN_FILL = 0.1 # minimum filled ratio of the last row to locate the cost bar
+    COST_BAR_ROW_TOLERANCE = 0.1 # maximum difference in filled ratio between rows of the cost bar
+    ROSTER_CHANGE_THRESHOLD = 8 # mean absolute difference in gray level of a column of the deploy strip for its cards to be searched again
 
 class ViewCalculationConfig:
     FROM_RATIO = 9 / 16
@@ -44,4 +61,38 @@ class PerformActionConfig:
     FRAME_THRESHOLD = 2
     MINIMUM_WAITTIME = 0.02
     FRAME_WAITTIME = 0.1
-    GENERAL_WAITTIME = 0.3
\ No newline at end of file
+    GENERAL_WAITTIME = 0.3
+    VERIFY_TIMEOUT = 1.0 # maximum time to wait for an action outcome to show up
+    VERIFY_INTERVAL = 0.02 # time between two checks of an action outcome
+    VERIFY_STRICT = False # raise an error instead of a warning when an action outcome is not detected
+    STATE_TIMEOUT = 1.0 # maximum time to wait for the game to reach an expected state
+    SETTLE_MIN_WAITTIME = 0.1 # time for a pausing input to show on screen, before a paused frame is trusted
+    AUTO_ENTER_TIMEOUT = 60 # maximum time for the battle to start after clicking the start button
+    AUTO_ENTER_INTERVAL = 0.05 # time between two checks of the loading screen
+    AUTO_ENTER_TICK_INTERVAL = 0.002 # time between two reads of the cost bar once the battle started
+    AUTO_ENTER_TICK = 1 # tick at which to pause the game after entering
+
+class DiagnosticsConfig:
+    OUTPUT_DIR = "diagnostics" # relative to the Excel file
+    TRACE_ENABLED = True
+    METRICS_HISTORY_FILE = "metrics_history.jsonl"
+    FLIGHT_RECORDER_COST_FRAMES = 120 # about 1 second of polling the game time
+    FLIGHT_RECORDER_OPERATOR_FRAMES = 16
+    FLIGHT_RECORDER_DEFAULT_FRAMES = 16
+
+class CacheConfig:
+    AVATAR_CACHE_BYTES = 4 * 1024 * 1024 # memory budget of the loaded avatars, about 500 operators
+    MAP_CACHE_BYTES = 8 * 1024 * 1024 # memory budget of the loaded maps, about 300 levels
+
+class DaemonConfig:
+    ADDRESS = ("127.0.0.1", 47800) # local address the daemon listens on
+    AUTHKEY = b"PRTS+" # shared key of the daemon and its clients, only guards against stray connections
+
+class VideoToScriptConfig:
+    CHUNK_SECONDS = 30 # length of video analyzed by a worker process at a time
+    CHUNK_OVERLAP_SECONDS = 2 # video before a chunk decoded again, to pick up the state of the game at its start
+    BASELINE_SAMPLES = 50 # frames sampled across the video for the field brightness of a running game
+    STRIP_SCALE = 8 # downscaling of the deploy strip compared between frames
+    STRIP_CHANGE_THRESHOLD = 6 # mean absolute difference in gray level of the downscaled strip to analyze a frame in full
+    FIELD_SCALE = 8 # downscaling of the field compared before and after a deploy
+    FIELD_CHANGE_THRESHOLD = 40 # difference in gray level of a field pixel to count as changed by a deploy
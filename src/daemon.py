@@ -0,0 +1,210 @@
+"""
+daemon.py
+Keep PRTS+ resident between battles, and run battles requested by clients over a local connection.
+
+Usage:
+    python -m src.main --daemon [--debug]                         start the daemon
+    python -m src.daemon run --xlsm FILE [--autoenter] [--no-wait] run a battle
+    python -m src.daemon ping                                      check the daemon
+    python -m src.daemon stop                                      stop the daemon
+
+A cold start imports OpenCV, NumPy and Tesseract, loads the mappings, the view table and the OCR model,
+and connects to the emulator before the first action. The daemon does all of this once: the caches, the
+OCR engine and the window connection stay in memory, and every requested battle starts with them warm.
+
+Requests and replies are dicts sent over a multiprocessing.connection on DaemonConfig.ADDRESS:
+    {"cmd": "run", "xlsm": path, "autoenter": bool, "wait": bool}
+        -> {"ok": True, "first_action_ms": float, "seconds": float, ...} once the battle ended,
+           or {"ok": True} right away without "wait"
+    {"cmd": "ping"} -> {"ok": True, "busy": bool, "runs": int, "uptime": float}
+    {"cmd": "stop"} -> {"ok": True}, the daemon exits after the running battle, if any
+Every failure is replied as {"ok": False, "error": message}. Only one battle runs at a time.
+
+Every battle runs on the thread of its request, in a COM apartment of its own: the Excel instance of
+the battle is created in it, and dropped before the apartment is closed, so no COM object of Excel is
+used from another thread.
+
+Both the daemon and a cold start record the time from the request to the first action in the
+"first_action_ms" metric, which ends up in the run summary and the metrics history for comparison.
+"""
+
+import argparse
+import gc
+import logging
+import os
+import threading
+import time
+from multiprocessing.connection import Client, Connection, Listener
+from typing import Any, Dict
+
+from src.logger import logger
+from src.config import DaemonConfig as config
+from src.config import DiagnosticsConfig as diagconfig
+
+__all__ = ["serve", "request"]
+
+
+class Daemon:
+    """
+    The resident process: warms everything up once, then serves requests until stopped.
+    """
+    def __init__(self, debug: bool = False):
+        self.debug = debug
+        self.started = time.time()
+        self.runs = 0
+        self.run_lock = threading.Lock()
+        self.stopping = threading.Event()
+
+    def warm_up(self) -> None:
+        """
+        Load everything a battle needs before its first action, except the script itself.
+        """
+        start = time.perf_counter()
+        from src.cache import load_avatar_pack, load_view_table
+        from src.logic.analyze_time import get_ocr_api
+        import src.main  # noqa: F401, imports everything a battle uses
+        load_view_table()
+        load_avatar_pack()
+        get_ocr_api()
+        self.connect_window()
+        logger.warning("Daemon warmed up in %.3f seconds", time.perf_counter() - start)
+
+    def connect_window(self) -> None:
+        """
+        Connect to the emulator, or reconnect if the window was closed since the last battle.
+        """
+        from src.mumu.mumu_window import get_window, set_window
+        try:
+            get_window().get_rect()
+        except Exception as e:
+            logger.warning("Game window not available: %s", e)
+            set_window(None)
+
+    def run(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Run a battle. The caller holds the run lock.
+        """
+        import pythoncom
+        from src.excel import Excel
+        from src.main import main
+        from src.mumu.mumu_window import window_geometry
+        from src.utils.metrics import metrics
+
+        requested_at = request["requested_at"]
+        file_path = os.path.abspath(request["xlsm"])
+        self.connect_window()
+        window_geometry.invalidate()
+        # COM objects can only be used in the apartment they were created in
+        pythoncom.CoInitialize()
+        try:
+            main(file_path, self.debug, request.get("autoenter", False), diagconfig.TRACE_ENABLED,
+                 interactive=False, requested_at=requested_at)
+        finally:
+            # The next battle reads the workbook again, from its own apartment
+            Excel.forget(file_path)
+            gc.collect()  # release its COM objects before closing the apartment
+            pythoncom.CoUninitialize()
+            self.runs += 1
+        first_action = metrics.summary().get("first_action_ms", {})
+        return {"ok": True, "first_action_ms": first_action.get("max"), "seconds": time.time() - requested_at}
+
+    def handle(self, conn: Connection) -> None:
+        """
+        Serve the requests of a single client connection.
+        """
+        with conn:
+            try:
+                request = conn.recv()
+                request["requested_at"] = time.time()
+                cmd = request.get("cmd")
+                if cmd == "ping":
+                    conn.send({"ok": True, "busy": self.run_lock.locked(), "runs": self.runs, "uptime": time.time() - self.started})
+                elif cmd == "stop":
+                    self.stopping.set()
+                    conn.send({"ok": True})
+                    # Wake up the accept loop
+                    Client(config.ADDRESS, authkey=config.AUTHKEY).close()
+                elif cmd == "run":
+                    if self.stopping.is_set() or not self.run_lock.acquire(blocking=False):
+                        conn.send({"ok": False, "error": "The daemon is busy or stopping."})
+                        return
+                    try:
+                        if not request.get("wait", True):
+                            conn.send({"ok": True})
+                        reply = self.run(request)
+                        if request.get("wait", True):
+                            conn.send(reply)
+                    finally:
+                        self.run_lock.release()
+                else:
+                    conn.send({"ok": False, "error": f"Unknown command {cmd}."})
+            except (EOFError, OSError) as e:
+                logger.warning("Client connection lost: %s", e)
+            except Exception as e:
+                logger.error("Request failed: %s", e)
+                try:
+                    conn.send({"ok": False, "error": f"{type(e).__name__}: {e}"})
+                except OSError:
+                    pass
+
+    def serve_forever(self) -> None:
+        with Listener(config.ADDRESS, authkey=config.AUTHKEY) as listener:
+            logger.warning("Daemon listening on %s:%s", *config.ADDRESS)
+            while not self.stopping.is_set():
+                try:
+                    conn = listener.accept()
+                except Exception as e:
+                    # e.g. a client with a wrong key
+                    logger.warning("Rejected a connection: %s", e)
+                    continue
+                if self.stopping.is_set():
+                    conn.close()
+                    break
+                threading.Thread(target=self.handle, args=(conn,), daemon=True).start()
+            # Let a running battle finish
+            with self.run_lock:
+                logger.warning("Daemon stopped after %s runs", self.runs)
+
+
+def serve(debug: bool = False) -> None:
+    """
+    Warm up and serve requests until a stop request.
+    """
+    logger.setLevel(logging.DEBUG if debug else logging.WARNING)
+    daemon = Daemon(debug)
+    daemon.warm_up()
+    daemon.serve_forever()
+
+
+def request(message: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Send a request to the daemon and wait for its reply.
+
+    Raises:
+        ConnectionRefusedError: If the daemon is not running.
+    """
+    with Client(config.ADDRESS, authkey=config.AUTHKEY) as conn:
+        conn.send(message)
+        return conn.recv()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="PRTS+ daemon client")
+    parser.add_argument("cmd", choices=["run", "ping", "stop"], help="The request to send.")
+    parser.add_argument("--xlsm", type=str, help="The Excel file of the battle to run.")
+    parser.add_argument("--autoenter", action="store_true", help="Enter the battle automatically.")
+    parser.add_argument("--no-wait", action="store_true", help="Return once the battle started instead of when it ended.")
+    args = parser.parse_args()
+
+    message = {"cmd": args.cmd}
+    if args.cmd == "run":
+        if not args.xlsm:
+            parser.error("run requires --xlsm")
+        message.update(xlsm=os.path.abspath(args.xlsm), autoenter=args.autoenter, wait=not args.no_wait)
+    try:
+        reply = request(message)
+    except ConnectionRefusedError:
+        print("The daemon is not running, start it with: python -m src.main --daemon")
+        raise SystemExit(1)
+    print(reply)
+    raise SystemExit(0 if reply.get("ok") else 1)
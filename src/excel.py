@@ -4,24 +4,15 @@ import functools
 import os
 import dataclasses
 
-from src.logic.action import Action, ActionType, DirectionType
-from src.utils.singleton import Singleton
+from src.logic.action import Action, ActionType
+from src.logic.decode_action import ACTION_COLUMN_NAME_MAPPING, RowDecoder
+from src.utils.singleton import KeyedSingleton
 from src.utils.error_to_log import ErrorToLog
 from src.logger import logger
-from src.utils.typecheck import get_optional_type
+from src.utils.metrics import metrics
 
 __all__ = ['Excel']
 
-ACTION_COLUMN_NAME_MAPPING = {
-    '费用': 'cost',
-    '帧数': 'tick',
-    '操作': 'action_type',
-    '干员': 'oper',
-    '坐标': 'pos',
-    '朝向': 'direction',
-    '简称': 'alias',
-}
-
 @dataclasses.dataclass(order=True)
 class StatusColor:
     SUCCESS: int = 0x77FF77 # green
@@ -29,7 +20,8 @@ class StatusColor:
     FAILURE: int = 0x7777FF # red
 
 # Note: All excel index should be 0-based in the code, adding 1 when interacting with Excel
-class Excel(metaclass=Singleton):
+# Note: There is one instance per file path, so that several battles can run from different files
+class Excel(metaclass=KeyedSingleton):
     def __init__(self, file_path):
         self.file_path = file_path
         self.excel = None
@@ -40,10 +32,12 @@ class Excel(metaclass=Singleton):
         self._own_workbook = False
         self.column_loc = {}
         self.data_loc = {}
+        self.actions = None
         self.current_row = 1
         self._connect()
         self._locate_data()
         self._signal_start()
+        self._decode_actions()
         self._reset_cells()
     
     def _connect(self):
@@ -60,18 +54,18 @@ class Excel(metaclass=Singleton):
         
         self.workbook = None
         for wb in self.excel.Workbooks:
-            logger.debug(f"Checking workbook: {os.path.normpath(os.path.abspath(wb.FullName))}")
+            logger.debug("Checking workbook: %s", os.path.normpath(os.path.abspath(wb.FullName)))
             if os.path.normpath(os.path.abspath(wb.FullName)) == self.file_path:
                 self.workbook = wb
                 break
 
         if self.workbook is None:
-            logger.warning(f"Excel file not found, opening {self.file_path}")
+            logger.warning("Excel file not found, opening %s", self.file_path)
             try:
                 self.workbook = self.excel.Workbooks.Open(self.file_path)
                 self._own_workbook = True
             except com_error:
-                logger.error(f"Failed to open {self.file_path}")
+                logger.error("Failed to open %s", self.file_path)
                 self._close()
                 raise
         try:
@@ -82,13 +76,14 @@ class Excel(metaclass=Singleton):
             self._close()
             raise
 
-        logger.info(f"Connected to Excel file: {self.file_path}, workbook owned: {self._own_workbook}, excel owned: {self._own_excel}")
+        logger.info("Connected to Excel file: %s, workbook owned: %s, excel owned: %s", self.file_path, self._own_workbook, self._own_excel)
     
     def connection_handler(func):
         @functools.wraps(func)
         def wrapper(excel_instance, *args, **kwargs):
             try:
-                return func(excel_instance, *args, **kwargs)
+                with metrics.timer("excel_com_ms"):
+                    return func(excel_instance, *args, **kwargs)
             except com_error as e:
                 logger.error("Excel connection lost.")
                 raise ErrorToLog(f"Excel连接出错。\n{e}")
@@ -105,7 +100,7 @@ class Excel(metaclass=Singleton):
         self.column_loc['settings'] = self.locate_column('设置')
 
         settings_col = self.column_loc['settings']
-        logger.debug(f"Settings column: {settings_col}")
+        logger.debug("Settings column: %s", settings_col)
         self.data_loc['map_code'] = (self.locate_row(settings_col, '关卡代号'), settings_col + 1)
         self.data_loc['map_name'] = (self.locate_row(settings_col, '关卡全名'), settings_col + 1)
         self.data_loc['max_tick'] = (self.locate_row(settings_col, '每费帧数'), settings_col + 1)
@@ -119,6 +114,14 @@ class Excel(metaclass=Singleton):
         self.data_loc['cur_row'] = (1, 1) # B2 cell
         self.data_loc['err_log'] = (2, 1) # B3 cell
     
+    def _decode_actions(self):
+        # Decode the whole script at once, so that invalid rows are known before the battle starts
+        with metrics.timer("excel_decode_ms"):
+            self.actions = RowDecoder(self.column_loc).decode_table(self.data)
+        end = self.actions.first_invalid(self.current_row)
+        logger.info("Decoded %s actions from row %s, script ends at row %s: %s",
+                    end - self.current_row, self.current_row + 1, end + 1, self.actions.error(end))
+
     def _signal_start(self):
         if not self.is_paused():
             self.set_control_value('cur_status', '运行中')
@@ -131,7 +134,7 @@ class Excel(metaclass=Singleton):
     def _reset_cells(self):
         last_row = len(self.data)
         # Clear all cells in column '当前执行' and '运行结果'
-        logger.debug(f"Clearing cells from {self.current_row + 1} to {last_row} in column '当前执行'({self.column_loc['cur_exec'] + 1}) and '运行结果'({self.column_loc['result'] + 1})")
+        logger.debug("Clearing cells from %s to %s in column '当前执行'(%s) and '运行结果'(%s)", self.current_row + 1, last_row, self.column_loc['cur_exec'] + 1, self.column_loc['result'] + 1)
         self.record_sheet.Range(self.record_sheet.Cells(self.current_row + 1, self.column_loc['cur_exec'] + 1), 
                                 self.record_sheet.Cells(last_row, self.column_loc['cur_exec'] + 1)).Value = None
         self.record_sheet.Range(self.record_sheet.Cells(self.current_row + 1, self.column_loc['result'] + 1), 
@@ -144,7 +147,7 @@ class Excel(metaclass=Singleton):
         if self.workbook is not None and self._own_workbook:
             self.workbook.Close(SaveChanges=save_changes)
             self.workbook = None
-            logger.info(f"Closed Excel file: {self.file_path}")
+            logger.info("Closed Excel file: %s", self.file_path)
         if self.excel is not None and self._own_excel:
             self.excel.Quit()
             self.excel = None
@@ -174,7 +177,7 @@ class Excel(metaclass=Singleton):
     
     @connection_handler
     def set_control_value(self, control_name, value):
-        logger.debug(f"Setting control {control_name} to {value} at {self.data_loc[control_name]}")
+        logger.debug("Setting control %s to %s at %s", control_name, value, self.data_loc[control_name])
         self.control_sheet.Cells(self.data_loc[control_name][0] + 1, self.data_loc[control_name][1] + 1).Value = value
     
     @connection_handler
@@ -190,35 +193,24 @@ class Excel(metaclass=Singleton):
     def show_error(self, message) -> None:
         self.set_control_value('err_log', message)
     
-    def get_current_action(self):
-        logger.info(f"Getting current action at row {self.current_row}")
-        if self.current_row >= len(self.data):
-            return Action()
+    def get_current_action(self) -> Action:
+        logger.info("Getting current action at row %s", self.current_row)
         return self.get_action(self.current_row)
-    
-    def load_cell_with_type(self, row, col, cell_type):
-        try:
-            cell_value = self.data[row][col]
-            if cell_value is None:
-                return None
-            
-            actual_type = get_optional_type(cell_type)
-            return actual_type(cell_value) if actual_type else None
-        except (ValueError, TypeError) as err:
-            logger.warning(f"Failed to load cell ({row}, {col}) with type {cell_type} due to error {err}")
-            return None
-    
-    def get_action(self, row):
-        action_data = {}
-        for field in dataclasses.fields(Action):
-            col = self.column_loc.get(field.name)
-            if col is not None:
-                cell_value = self.load_cell_with_type(row, col, field.type)
-                action_data[field.name] = cell_value
-        action = Action(**action_data)
-        logger.info(f"Get action: {action}")
+
+    def get_action(self, row) -> Action:
+        action = self.actions.get(row)
+        logger.info("Get action: %s", action)
         return action
 
+    def get_action_error(self, row):
+        """Get the reason why the action of a row is invalid, or None if it is valid."""
+        return self.actions.error(row)
+
+    def get_deployed_operators(self):
+        """Get the operators deployed by the script, from the current row to its end."""
+        end = self.actions.first_invalid(self.current_row)
+        return {action.oper for action in self.actions.actions[self.current_row:end] if action.action_type == ActionType.DEPLOY}
+
     @connection_handler
     def set_result(self, result: StatusColor):
         self.record_sheet.Cells(self.current_row + 1, self.column_loc['result'] + 1).Interior.Color = result
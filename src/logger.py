@@ -1,4 +1,7 @@
+import atexit
 import logging
+import logging.handlers
+import queue
 from enum import Enum
 
 class LogLevelColor(Enum):
@@ -16,6 +19,22 @@ class ColoredFormatter(logging.Formatter):
         color = LogLevelColor[levelname].value if levelname in LogLevelColor.__members__ else LogLevelColor.RESET.value
         return f'{color}{message}{LogLevelColor.RESET.value}'
 
+class PreparedQueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record):
+        # Only merge the arguments into the message, since they may be mutated after the call returns
+        # Formatting, timestamps and colors are left to the listener thread
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+# Skip collecting record fields that are never formatted
+logging.logThreads = False
+logging.logProcesses = False
+logging.logMultiprocessing = False
+
 logger = logging.getLogger("DebugLogger")
 logger.setLevel(logging.DEBUG)
 
@@ -25,11 +44,24 @@ ch.setLevel(logging.DEBUG)
 formatter = ColoredFormatter('%(asctime)s - %(levelname)-7s - %(message)s')
 ch.setFormatter(formatter)
 
-logger.addHandler(ch)
+# Note: The logger only puts records into a queue, the console is written by a background thread,
+# so that console I/O never blocks the frame-critical loops. Use lazy %-style arguments,
+# so that disabled records cost no formatting at all.
+log_queue = queue.SimpleQueue()
+qh = PreparedQueueHandler(log_queue)
+qh.setLevel(logging.DEBUG)
+
+listener = logging.handlers.QueueListener(log_queue, ch, respect_handler_level=True)
+listener.start()
+
+# Flush the remaining records on exit
+atexit.register(listener.stop)
+
+logger.addHandler(qh)
 
 if __name__ == "__main__":
     logger.debug("Debug message")
     logger.info("Info message")
     logger.warning("Warning message")
     logger.error("Error message")
-    logger.critical("Critical message")
\ No newline at end of file
+    logger.critical("Critical message")
@@ -1,8 +1,9 @@
 import dataclasses
 from enum import Enum
-from typing import Tuple, Optional
+from typing import Any, Callable, List, Tuple, Optional
 
-from src.utils.typecheck import is_valid_type
+from src.utils.typecheck import compile_type_check
+from src.utils.slots import add_slots
 from src.logic.game_time import GameTime
 from src.logger import logger
 
@@ -21,6 +22,7 @@ class DirectionType(Enum):
     NONE = "无"
 
 
+@add_slots
 @dataclasses.dataclass(order=True)
 class Action:
     cost: Optional[int] = None
@@ -39,22 +41,41 @@ class Action:
         return GameTime(self.cost, self.tick)
 
     def is_valid(self) -> bool:
-        for field in dataclasses.fields(self):
-            value = getattr(self, field.name)
-            if not is_valid_type(value, field.type):
-                logger.warning(f"Invalid field: {field.name}={value}")
-                return False
+        return self.validate() is None
+
+    def validate(self) -> Optional[str]:
+        """
+        Check the action, field types first, then the fields required by its type.
+
+        Returns:
+            Optional[str]: The reason why the action is invalid, or None if it is valid.
+        """
+        for name, check in _field_checks():
+            value = getattr(self, name)
+            if not check(value):
+                logger.warning("Invalid field: %s=%s", name, value)
+                return f"invalid field {name}={value!r}"
         if self.cost is None or self.cost < 0:
-            return False
+            return "missing or negative cost"
         if self.tick is None or self.tick < 0:
-            return False
+            return "missing or negative tick"
         if self.action_type is None:
-            return False
+            return "missing action type"
         if self.oper is None and self.pos is None:
-            return False
+            return "missing operator and position"
         if self.action_type == ActionType.DEPLOY:
             if self.pos is None:
-                return False
+                return "missing deploy position"
             if self.direction is None:
-                return False
-        return True
+                return "missing deploy direction"
+        return None
+
+
+_FIELD_CHECKS: Optional[List[Tuple[str, Callable[[Any], bool]]]] = None
+
+def _field_checks() -> List[Tuple[str, Callable[[Any], bool]]]:
+    # The field types are resolved into checkers once, instead of on every validation
+    global _FIELD_CHECKS
+    if _FIELD_CHECKS is None:
+        _FIELD_CHECKS = [(field.name, compile_type_check(field.type)) for field in dataclasses.fields(Action)]
+    return _FIELD_CHECKS
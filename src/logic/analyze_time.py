@@ -1,15 +1,18 @@
-import cv2
 from PIL import Image
 import numpy as np
 import tesserocr
 from functools import lru_cache
+from typing import NamedTuple, Optional, Tuple
 
 from src.config import GameRatioConfig as ratioconfig
 from src.config import ImageProcessingConfig as imgconfig
 from src.logic.game_time import GameTime
-from src.mumu.mumu_vision import capture_game_window
+from src.mumu.mumu_vision import CaptureMode, Snapshot, register_roi, capture_roi
 from src.utils.error_to_log import ErrorToLog
 from src.logger import logger
+from src.utils.trace import tracer
+from src.utils.metrics import metrics
+from src.utils.flight_recorder import flight_recorder
 
 @lru_cache(maxsize=120)
 def get_tick(cost_bar_area_bytes: bytes) -> int:
@@ -34,6 +37,124 @@ def get_tick(cost_bar_area_bytes: bytes) -> int:
     # Scale the white_ratio to the range 0 to GameTime.TICK_MAX - 1 and round to the nearest integer
     return round(white_ratio * (GameTime.TICK_MAX - 1))
 
+class CostBarReading(NamedTuple):
+    """
+    A reading of the cost bar.
+
+    Attributes:
+        tick (int): The current game tick, between 0 and GameTime.TICK_MAX - 1.
+        progress (float): How far the bar has advanced within the current tick, between 0 and 1.
+                          Assuming the bar fills linearly, the next tick starts after (1 - progress) ticks.
+    """
+    tick: int
+    progress: float
+
+class CostBarReader:
+    """
+    Read the game tick from the thresholded cost area, with sub-tick precision.
+
+    The rows and the left edge of the cost bar are located once per session, from the first frame
+    where the bar is visibly filled. Afterwards every frame is read from a column profile over all bar
+    rows, so that noise in a single row does not shift the tick. Until the bar is located, only the last
+    row is read, as in get_tick.
+
+    Usage:
+        reading = cost_bar_reader.read(binary_cost_area)
+    """
+    def __init__(self):
+        self.reset()
+
+    def reset(self) -> None:
+        """Forget the located cost bar, e.g. when a new session starts."""
+        self.rows: Optional[slice] = None
+        self.left: int = 0
+        self.shape: Optional[Tuple[int, int]] = None
+
+    def locate(self, cost_area: np.ndarray) -> bool:
+        """
+        Locate the cost bar in a thresholded cost area image.
+
+        Returns:
+            bool: Whether the cost bar was located. It can not be located while the bar is (nearly) empty.
+        """
+        search = cost_area[-imgconfig.COST_BAR_SEARCH_ROWS:] == 255
+        count = np.count_nonzero(search, axis=1)
+
+        # The filled part of a bar row is a single run of white pixels, starting from the left edge of the bar
+        lefts = np.argmax(search, axis=1)
+        columns = np.arange(search.shape[1])
+        runs = np.argmin(search | (columns < lefts[:, None]), axis=1) - lefts
+        runs[search.all(axis=1)] = search.shape[1] - lefts[search.all(axis=1)]
+        candidates = np.flatnonzero(
+            (count >= imgconfig.COST_BAR_MIN_FILL * search.shape[1])
+            & (runs >= count * (1 - imgconfig.COST_BAR_ROW_TOLERANCE))
+        )
+        if len(candidates) == 0:
+            return False
+
+        # The bar is the band of rows around the lowest clean row, which are filled about as far
+        reference = candidates[-1]
+        matching = np.abs(count - count[reference]) <= imgconfig.COST_BAR_ROW_TOLERANCE * search.shape[1]
+        top, bottom = reference, reference + 1
+        while top > 0 and matching[top - 1]:
+            top -= 1
+        while bottom < len(matching) and matching[bottom]:
+            bottom += 1
+        offset = cost_area.shape[0] - search.shape[0]
+        self.rows = slice(int(offset + top), int(offset + bottom))
+        self.left = int(lefts[reference])
+        self.shape = cost_area.shape
+        logger.debug("Located cost bar at rows %s, starting from column %s", self.rows, self.left)
+        return True
+
+    def read(self, cost_area: np.ndarray) -> CostBarReading:
+        """
+        Read the game tick from a thresholded cost area image.
+
+        Args:
+            cost_area (np.ndarray): The black and white image of the cost area.
+
+        Returns:
+            CostBarReading: The current tick and the progress within it.
+        """
+        if self.shape != cost_area.shape:
+            self.reset()
+        if self.rows is None and not self.locate(cost_area):
+            bar = cost_area[-1:]
+            left = 0
+        else:
+            bar = cost_area[self.rows]
+            left = self.left
+
+        # Fraction of bar rows which are filled, per column
+        profile = np.count_nonzero(bar[:, left:], axis=0) / bar.shape[0]
+
+        # The fill edge is where most rows stop being filled, refined by the partially filled column after it
+        edge = int(np.count_nonzero(profile >= 0.5))
+        if edge < len(profile):
+            edge += profile[edge]
+        position = edge / len(profile) * (GameTime.TICK_MAX - 1)
+
+        # Ticks are rounded as in get_tick, so a tick spans half a tick to either side of its bar position
+        tick = min(int(position + 0.5), GameTime.TICK_MAX - 1)
+        return CostBarReading(tick, min(max(position - tick + 0.5, 0.0), 1.0))
+
+cost_bar_reader = CostBarReader()
+
+cost_roi = register_roi("cost", ratioconfig.COST_AREA_RATIO, CaptureMode.BINARY)
+
+_ocr_api = None
+
+def get_ocr_api() -> tesserocr.PyTessBaseAPI:
+    """
+    Get the Tesseract engine, created on first use and kept for the life of the process,
+    as loading the model takes far longer than a single recognition.
+    """
+    global _ocr_api
+    if _ocr_api is None:
+        _ocr_api = tesserocr.PyTessBaseAPI(lang='arknights_digit', psm=tesserocr.PSM.SINGLE_WORD)
+    return _ocr_api
+
 @lru_cache(maxsize=120)
 def get_cost(cost_number_area_bytes: bytes, width: int, height: int) -> int:
     """
@@ -54,12 +175,12 @@ def get_cost(cost_number_area_bytes: bytes, width: int, height: int) -> int:
     cost_number_area = Image.frombytes('L', (width, height), cost_number_area_bytes)
 
     # Use Tesseract to perform OCR on the cost number area with a pretrained model for Arknights digit recognition
-    with tesserocr.PyTessBaseAPI(lang='arknights_digit', psm=tesserocr.PSM.SINGLE_WORD) as api:
-        api.SetImage(cost_number_area)
-        cost = api.GetUTF8Text()
-        confidence = api.MeanTextConf()
-        if confidence < imgconfig.OCR_CONFIDENCE_THRESHOLD:
-            raise ErrorToLog(f"无法识别当前费用。")
+    api = get_ocr_api()
+    api.SetImage(cost_number_area)
+    cost = api.GetUTF8Text()
+    confidence = api.MeanTextConf()
+    if confidence < imgconfig.OCR_CONFIDENCE_THRESHOLD:
+        raise ErrorToLog(f"无法识别当前费用。")
 
     # Filter out any non-digit characters from the OCR result
     cost = "".join(filter(str.isdigit, cost))
@@ -72,33 +193,56 @@ def get_cost(cost_number_area_bytes: bytes, width: int, height: int) -> int:
 
     return cost
 
-def get_game_time() -> GameTime:
+@tracer.wrap("get_game_time")
+def read_game_time(snapshot: Optional[Snapshot] = None) -> Tuple[GameTime, float]:
+    """
+    Get the current game time from the game window, along with the progress within the current tick.
+
+    Args:
+        snapshot (Snapshot, optional): A snapshot containing the "cost" ROI, used instead of a fresh capture.
+
+    Returns:
+        Tuple[GameTime, float]: The current game time, and the progress within the current tick between 0 and 1.
+    """
+    with metrics.timer("get_game_time_ms"):
+        # Capture the cost area, converted to black and white at native resolution
+        cost_area_img = capture_roi("cost", snapshot)
+        frame_info = flight_recorder.record("cost", cost_roi.gray)
+
+        # Get the tick count from the cost bar
+        with tracer.span("tick"):
+            tick, progress = cost_bar_reader.read(cost_area_img)
+
+        # Get the cost from the number displayed in the cost number area
+        # Convert the image data to bytes for caching in get_cost function
+        left = int(cost_area_img.shape[1] * ratioconfig.COST_NUMBER_AREA_RATIO[0])
+        upper = int(cost_area_img.shape[0] * ratioconfig.COST_NUMBER_AREA_RATIO[1])
+        right = int(cost_area_img.shape[1] * ratioconfig.COST_NUMBER_AREA_RATIO[2])
+        lower = int(cost_area_img.shape[0] * ratioconfig.COST_NUMBER_AREA_RATIO[3])
+
+        with tracer.span("ocr") as span:
+            cost_number_area = cost_area_img[upper:lower, left:right]
+            cache_hits = get_cost.cache_info().hits
+            cost = get_cost(cost_number_area.tobytes(), cost_number_area.shape[1], cost_number_area.shape[0])
+            span.args["cost"] = cost
+        metrics.counter("ocr_cache_hit" if get_cost.cache_info().hits > cache_hits else "ocr_cache_miss").inc()
+    
+    game_time = GameTime(cost, tick)
+    frame_info["game_time"] = game_time
+    frame_info["progress"] = progress
+    return game_time, progress
+
+def get_game_time(snapshot: Optional[Snapshot] = None) -> GameTime:
     """
     Get the current game time from the game window.
+
+    Args:
+        snapshot (Snapshot, optional): A snapshot containing the "cost" ROI, used instead of a fresh capture.
     
     Returns:
         GameTime: The current game time.
     """
-    # Capture the game window and convert to grayscale and then to black and white
-    cost_area_img = capture_game_window(ratio=ratioconfig.COST_AREA_RATIO)
-    _, cost_area_img = cv2.threshold(cost_area_img, imgconfig.WHITE_THRESHOLD, 255, cv2.THRESH_BINARY)
-
-    # Get the tick count from the last row of pixels in the cost bar area
-    # Convert the image data to bytes for caching in get_tick function
-    cost_bar_area = cost_area_img[-1, :]
-    tick = get_tick(cost_bar_area.tobytes())
-
-    # Get the cost from the number displayed in the cost number area
-    # Convert the image data to bytes for caching in get_cost function
-    left = int(cost_area_img.shape[1] * ratioconfig.COST_NUMBER_AREA_RATIO[0])
-    upper = int(cost_area_img.shape[0] * ratioconfig.COST_NUMBER_AREA_RATIO[1])
-    right = int(cost_area_img.shape[1] * ratioconfig.COST_NUMBER_AREA_RATIO[2])
-    lower = int(cost_area_img.shape[0] * ratioconfig.COST_NUMBER_AREA_RATIO[3])
-
-    cost_number_area = cost_area_img[upper:lower, left:right]
-    cost = get_cost(cost_number_area.tobytes(), cost_number_area.shape[1], cost_number_area.shape[0])
-    
-    return GameTime(cost, tick)
+    return read_game_time(snapshot)[0]
 
 if __name__ == "__main__":
     # Usage and testing
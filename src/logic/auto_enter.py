@@ -1,39 +1,97 @@
-import time
 from typing import Callable
 
 from src.logger import logger
 from src.config import GameRatioConfig as ratioconfig
 from src.config import PerformActionConfig as actionconfig
 from src.logic.game_time import GameTime
-from src.logic.analyze_time import get_game_time
+from src.logic.analyze_time import get_game_time, cost_bar_reader
+from src.logic.game_state import GameState, PAUSED_STATES, get_game_state, wait_for_state
 from src.mumu.mumu_controller import mouseclick
-import time
+from src.mumu.mumu_vision import capture_roi
+from src.utils.error_to_log import ErrorToLog
+from src.utils.trace import tracer
+from src.utils.metrics import metrics
+from src.utils import clock
 
-def auto_enter() -> None:
+# States in which the battle HUD is shown, i.e. the battle has started
+BATTLE_STATES = (GameState.RUNNING, GameState.BULLET_TIME, GameState.PAUSED)
+
+def poll_until(condition: Callable[[], bool], interval: float, deadline: float) -> int:
+    """
+    Check a condition at a bounded rate until it holds.
+
+    Args:
+        condition (Callable[[], bool]): The condition to check.
+        interval (float): The minimum time between two checks, in seconds.
+        deadline (float): The clock.now() value after which to give up.
+
+    Returns:
+        int: The number of checks made.
+
+    Raises:
+        ErrorToLog: If the deadline passed before the condition held.
+    """
+    polls = 0
+    while True:
+        next_poll = clock.now() + interval
+        polls += 1
+        if condition():
+            return polls
+        if clock.now() > deadline:
+            logger.error("Auto enter timed out")
+            raise ErrorToLog("自动进入关卡超时。")
+        clock.sleep(next_poll - clock.now())
+
+@tracer.wrap("auto_enter")
+def auto_enter(timeout: float = actionconfig.AUTO_ENTER_TIMEOUT) -> GameTime:
+    """
+    Start the battle, pause it right after the time starts to flow, and switch the game speed to 2x.
+
+    The loading screen and the battle start are detected with the game state probes, and the tick with
+    the cost bar alone, so no OCR runs while waiting.
+
+    Returns:
+        GameTime: The game time at which the game was paused.
+
+    Raises:
+        ErrorToLog: If the battle did not start within the timeout.
+    """
     logger.info("Auto enter started")
+    start = clock.now()
+    deadline = start + timeout
+
     # First click the start button
     mouseclick(ratioconfig.START_BUTTON_RATIO)
-    time.sleep(actionconfig.GENERAL_WAITTIME)
 
-    # Try to pause as long as the time started to flow
-    while True:
-        try:
-            game_time = get_game_time()
-            if game_time.tick > 0:
-                break
-        except Exception as e:
-            pass
+    # Wait for the loading screen to end, i.e. the battle HUD to show up
+    with tracer.span("loading", interval=actionconfig.AUTO_ENTER_INTERVAL) as span, tracer.quiet():
+        span.args["polls"] = poll_until(lambda: get_game_state() in BATTLE_STATES, actionconfig.AUTO_ENTER_INTERVAL, deadline)
+    metrics.histogram("auto_enter_loading_ms", "ms").record((clock.now() - start) * 1000)
+    logger.info("Battle started after %.3f seconds", clock.now() - start)
+
+    # Try to pause as soon as the time reached the entry tick
+    cost_bar_reader.reset()
+    with tracer.span("wait_for_tick", tick=actionconfig.AUTO_ENTER_TICK) as span, tracer.quiet():
+        span.args["polls"] = poll_until(
+            lambda: cost_bar_reader.read(capture_roi("cost")).tick >= actionconfig.AUTO_ENTER_TICK,
+            actionconfig.AUTO_ENTER_TICK_INTERVAL,
+            deadline,
+        )
 
     # Now pause
     mouseclick(ratioconfig.PAUSE_BUTTON_RATIO)
-    logger.info(f"Sent pause signal at time {game_time}")
-    time.sleep(actionconfig.GENERAL_WAITTIME)
-    logger.info(f"Successfully paused at time {get_game_time()}")
+    if wait_for_state(PAUSED_STATES) not in PAUSED_STATES:
+        logger.warning("The game did not show as paused after entering")
+    game_time = get_game_time()
+    metrics.histogram("auto_enter_tick", "tick").record(game_time.tick)
+    logger.info("Successfully paused at time %s, entry tick %s", game_time, game_time.tick)
 
     # Switch game speed to 2x
     mouseclick(ratioconfig.SPEED_BUTTON_RATIO)
-    time.sleep(actionconfig.GENERAL_WAITTIME)
-    logger.info(f"Switched game speed to 2x")
+    clock.sleep(actionconfig.GENERAL_WAITTIME)
+    logger.info("Switched game speed to 2x")
+    return game_time
 
 if __name__ == "__main__":
+    # Usage and testing
     auto_enter()
@@ -1,26 +1,28 @@
+import cv2
 import numpy as np
 import math
-from typing import List, Tuple, Dict, Any
+from typing import List, Optional, Tuple, Dict, Any
 
 from src.logger import logger
 from src.config import ViewCalculationConfig as viewconfig
+from src.config import ImageProcessingConfig as imgconfig
 
-def transform_map_to_view(level: Dict[str, Any], side: bool) -> List[List[Tuple[float, float]]]:
+def get_view_matrix(level: Dict[str, Any], side: bool) -> np.ndarray:
     """
-    Transforms a map to a view based on the given parameters.
+    Build the matrix projecting map coordinates to clip coordinates, for the front or side view of a map.
 
     Parameters:
     level (dict): The map data.
+    side (bool): Whether to use the side view.
 
     Returns:
-    list: A 2D list of tuples representing the transformed map points in ratio form.
+    np.ndarray: The 4x4 projection matrix.
     """
     DEGREE = math.pi / 180
     try:
-        height, width = level["height"], level["width"]
         x, y, z = level["view"][1 if side else 0]
     except KeyError as e:
-        logger.error(f"Error loading map data: {e}")
+        logger.error("Error loading map data: %s", e)
         raise KeyError(f"Error loading map data: {e}")
 
     # Matrix for transforming map coordinates to view coordinates
@@ -53,30 +55,129 @@ def transform_map_to_view(level: Dict[str, Any], side: bool) -> List[List[Tuple[
 
     # Final transformation matrix
     if side:
-        final_matrix = perspective_matrix @ rotate_x_matrix @ rotate_y_matrix @ transform_matrix.copy()
+        return perspective_matrix @ rotate_x_matrix @ rotate_y_matrix @ transform_matrix
     else:
-        final_matrix = perspective_matrix @ rotate_x_matrix @ transform_matrix.copy()
-
-    # Transform each map point to view point
-    out_pos = []
-    for i in range(height):
-        tmp_pos = []
-        for j in range(width):
-            tile = level["tiles"][i][j]
-            map_point = np.array([
-                j - (width - 1) / 2.0, 
-                (height - 1) / 2.0 - i, 
-                tile["heightType"] * -0.4, 
-                1])
-            view_point = final_matrix @ map_point
-            view_point = view_point / view_point[3]
-            view_point = (view_point + 1) / 2
-            tmp_pos.append((view_point[0], 1 - view_point[1]))
-        out_pos.append(tmp_pos)
-
-    logger.info(f"Transformed map to view, size: {height}x{width}")
+        return perspective_matrix @ rotate_x_matrix @ transform_matrix
+
+def project_points(matrix: np.ndarray, points: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Project map points to view points in ratio form.
+
+    Parameters:
+    matrix (np.ndarray): The projection matrix from get_view_matrix.
+    points (np.ndarray): Map points of shape (..., 3).
+
+    Returns:
+    Tuple[np.ndarray, np.ndarray]: The (x, y) view points in ratio form of shape (..., 2),
+                                   and the depth of each point of shape (...), larger is farther.
+    """
+    homogeneous = np.concatenate([points, np.ones(points.shape[:-1] + (1,))], axis=-1)
+    view_points = homogeneous @ matrix.T
+    view_points = view_points / view_points[..., 3:4]
+    view_points = (view_points + 1) / 2
+    return np.stack([view_points[..., 0], 1 - view_points[..., 1]], axis=-1), view_points[..., 2]
+
+def get_map_points(level: Dict[str, Any]) -> np.ndarray:
+    """
+    Get the map coordinates of the center of every tile's top face, of shape (height, width, 3).
+    """
+    height, width = level["height"], level["width"]
+    rows, columns = np.mgrid[0:height, 0:width]
+    height_types = np.array([[tile["heightType"] for tile in row] for row in level["tiles"]], dtype=np.float64)
+    return np.stack([columns - (width - 1) / 2.0, (height - 1) / 2.0 - rows, height_types * -0.4], axis=-1)
+
+def transform_map_to_view(level: Dict[str, Any], side: bool) -> List[List[Tuple[float, float]]]:
+    """
+    Transforms a map to a view based on the given parameters.
+
+    Parameters:
+    level (dict): The map data.
+
+    Returns:
+    list: A 2D list of tuples representing the transformed map points in ratio form.
+    """
+    try:
+        height, width = level["height"], level["width"]
+    except KeyError as e:
+        logger.error("Error loading map data: %s", e)
+        raise KeyError(f"Error loading map data: {e}")
+    final_matrix = get_view_matrix(level, side)
+
+    # Transform all map points to view points at once
+    view_points, _ = project_points(final_matrix, get_map_points(level))
+    out_pos = [[(float(x), float(y)) for x, y in row] for row in view_points]
+
+    logger.info("Transformed map to view, size: %sx%s", height, width)
     return out_pos
 
+class TileIndex:
+    """
+    Inverse of the view transformation: find the tile under a screen point.
+
+    The top face of every tile is projected and rasterized into an image of tile ids at standard
+    resolution, nearer tiles drawn over farther ones. A lookup is then a single pixel read,
+    and batched lookups are a single fancy-indexing operation.
+
+    Usage:
+        index = TileIndex(level, side=False)
+        index.lookup((0.5, 0.5))  # (x, y) tile position, or None
+        index.lookup_many(np.array([[0.5, 0.5], [0.1, 0.9]]))  # array of tile positions, -1 where none
+    """
+    def __init__(self, level: Dict[str, Any], side: bool, size: Tuple[int, int] = imgconfig.SCREEN_STANDARD_SIZE):
+        self.width, self.height = level["width"], level["height"]
+        self.size = size
+        centers = get_map_points(level)
+
+        # Corners of the top face of every tile, of shape (height, width, 4, 3)
+        offsets = np.array([[-0.5, -0.5, 0], [0.5, -0.5, 0], [0.5, 0.5, 0], [-0.5, 0.5, 0]])
+        corners, _ = project_points(get_view_matrix(level, side), centers[:, :, None, :] + offsets)
+        _, depths = project_points(get_view_matrix(level, side), centers)
+        polygons = np.round(corners * size).astype(np.int32)
+
+        # Draw the farthest tiles first, so that nearer (and higher) tiles cover them
+        self.ids = np.full((size[1], size[0]), -1, dtype=np.int32)
+        for flat in np.argsort(depths, axis=None)[::-1]:
+            row, column = divmod(int(flat), self.width)
+            cv2.fillConvexPoly(self.ids, polygons[row, column], int(flat))
+
+    def lookup(self, pos: Tuple[float, float]) -> Optional[Tuple[int, int]]:
+        """
+        Find the tile under a screen point.
+
+        Parameters:
+        pos (Tuple[float, float]): The (x, y) screen point in ratio form.
+
+        Returns:
+        Optional[Tuple[int, int]]: The (x, y) tile position, as in Action.tile_pos, or None if no tile is there.
+        """
+        x, y = int(pos[0] * self.size[0]), int(pos[1] * self.size[1])
+        if not (0 <= x < self.size[0] and 0 <= y < self.size[1]):
+            return None
+        tile_id = int(self.ids[y, x])
+        if tile_id < 0:
+            return None
+        row, column = divmod(tile_id, self.width)
+        return (column, row)
+
+    def lookup_many(self, positions: np.ndarray) -> np.ndarray:
+        """
+        Find the tiles under an array of screen points.
+
+        Parameters:
+        positions (np.ndarray): The (x, y) screen points in ratio form, of shape (n, 2).
+
+        Returns:
+        np.ndarray: The (x, y) tile positions of shape (n, 2), -1 where no tile is there.
+        """
+        positions = np.asarray(positions, dtype=np.float64)
+        pixels = (positions * self.size).astype(np.int64)
+        inside = (pixels[:, 0] >= 0) & (pixels[:, 0] < self.size[0]) & (pixels[:, 1] >= 0) & (pixels[:, 1] < self.size[1])
+        tile_ids = np.full(len(positions), -1, dtype=np.int64)
+        tile_ids[inside] = self.ids[pixels[inside, 1], pixels[inside, 0]]
+        result = np.stack([tile_ids % self.width, tile_ids // self.width], axis=-1)
+        result[tile_ids < 0] = -1
+        return result
+
 if __name__ == "__main__":
     # Usage and Testing
     from src.cache import get_map_by_code
@@ -86,4 +187,12 @@ if __name__ == "__main__":
     # the left most deployable position
     logger.info(f"Left most deployable position with side view: {res[3][1]}")
     res = transform_map_to_view(map, False)
-    logger.info(f"Left most deployable position with front view: {res[3][1]}")
\ No newline at end of file
+    logger.info(f"Left most deployable position with front view: {res[3][1]}")
+
+    # The tile under each projected tile center should be the tile itself
+    index = TileIndex(map, False)
+    logger.info(f"Tile under {res[3][1]}: {index.lookup(res[3][1])}")
+    centers = np.array([pos for row in res for pos in row])
+    found = index.lookup_many(centers)
+    expected = np.array([(x, y) for y in range(map["height"]) for x in range(map["width"])])
+    logger.info(f"Batched lookup: {np.mean(np.all(found == expected, axis=1)):.1%} of tile centers found")
\ No newline at end of file
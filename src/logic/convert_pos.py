@@ -1,4 +1,6 @@
 
+from typing import Tuple
+
 from src.logic.action import Action
 
 def convert_position(action: Action, height: int, width: int) -> Action:
@@ -12,6 +14,13 @@ def convert_position(action: Action, height: int, width: int) -> Action:
         action.tile_pos = None
     return action
 
+def convert_tile(tile_pos: Tuple[int, int], height: int) -> str:
+    """
+    Convert numerical representation back to chess board representation, the inverse of convert_position
+    For example, under height 7: (1, 3) -> D2, (4, 4) -> C5, (6, 1) -> F7
+    """
+    return f"{chr(ord('A') + height - 1 - tile_pos[1])}{tile_pos[0] + 1}"
+
 if __name__ == "__main__":
     # Usage and testing
     action = Action(pos="D2")
@@ -19,4 +28,5 @@ if __name__ == "__main__":
     action = Action(pos="C5")
     print(convert_position(action, 7, 11)) # Action(pos='C5', tile_pos=(2, 4))
     action = Action(pos="F7")
-    print(convert_position(action, 7, 11)) # Action(pos='F7', tile_pos=(0, 5))
\ No newline at end of file
+    print(convert_position(action, 7, 11)) # Action(pos='F7', tile_pos=(0, 5))
+    print(convert_tile((1, 3), 7), convert_tile((4, 4), 7), convert_tile((6, 1), 7)) # D2 C5 F7
@@ -0,0 +1,178 @@
+"""
+decode_action.py
+This module decodes the rows of the battle record sheet into actions.
+
+A RowDecoder is compiled once from the Action field types and the located columns: every column is
+paired with a converter built for its field, so decoding a row is a plain loop over a few (name, column,
+converter) triples without any type reflection. The whole sheet is decoded in one pass into an
+ActionTable, which also holds the reason why each invalid row is invalid.
+"""
+
+import copy
+import dataclasses
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from src.logger import logger
+from src.logic.action import Action
+from src.utils.typecheck import compile_converter
+
+# Header of each action column of the battle record sheet "作战记录", in sheet order
+ACTION_COLUMN_NAME_MAPPING = {
+    '费用': 'cost',
+    '帧数': 'tick',
+    '操作': 'action_type',
+    '干员': 'oper',
+    '坐标': 'pos',
+    '朝向': 'direction',
+    '简称': 'alias',
+}
+
+class RowDecoder:
+    """
+    Decode rows of the sheet data into actions.
+
+    Args:
+        column_loc (Dict[str, int]): The 0-based column of each Action field found in the sheet.
+                                     Other keys are ignored.
+
+    Usage:
+        decoder = RowDecoder(column_loc)
+        action, error = decoder.decode(data[row])
+    """
+    def __init__(self, column_loc: Dict[str, int]):
+        self.columns: List[Tuple[str, int, Callable[[Any], Any]]] = [
+            (field.name, column_loc[field.name], compile_converter(field.type))
+            for field in dataclasses.fields(Action)
+            if column_loc.get(field.name) is not None
+        ]
+
+    def decode(self, row: Sequence[Any]) -> Tuple[Action, Optional[str]]:
+        """
+        Decode a single row. A cell that can not be converted is left as None, and only makes the row invalid
+        if its field is required by the action, e.g. a direction is only required by a deploy.
+
+        Returns:
+            Tuple[Action, Optional[str]]: The action, and the reason why it is invalid, or None if it is valid.
+        """
+        action_data = {}
+        failures = []
+        for name, col, convert in self.columns:
+            value = row[col] if col < len(row) else None
+            try:
+                action_data[name] = convert(value)
+            except (ValueError, TypeError) as err:
+                action_data[name] = None
+                failures.append(f"invalid {name} {value!r}: {err}")
+        action = Action(**action_data)
+        error = action.validate()
+        if failures:
+            if error is None:
+                # Cells of fields the action does not use, e.g. a direction on a skill row
+                logger.warning("Ignored cells of the action at %s:%s: %s", action.cost, action.tick, "; ".join(failures))
+            else:
+                error = f"{error} ({'; '.join(failures)})"
+        return action, error
+
+    def decode_table(self, data: Sequence[Sequence[Any]], start: int = 1) -> "ActionTable":
+        """
+        Decode all rows of the sheet data in one pass.
+
+        Args:
+            data (Sequence[Sequence[Any]]): The sheet data, e.g. UsedRange.Value.
+            start (int, optional): The first row holding an action, i.e. the row after the header.
+        """
+        actions = [Action()] * start
+        errors: List[Optional[str]] = ["header"] * start
+        for row in data[start:]:
+            action, error = self.decode(row)
+            actions.append(action)
+            errors.append(error)
+        return ActionTable(actions, errors)
+
+@dataclasses.dataclass
+class ActionTable:
+    """
+    The decoded actions of a sheet, indexed by the 0-based row.
+
+    Attributes:
+        actions (List[Action]): The action of each row.
+        errors (List[Optional[str]]): The reason why each row is invalid, or None for a valid row.
+    """
+    actions: List[Action]
+    errors: List[Optional[str]]
+
+    def __len__(self) -> int:
+        return len(self.actions)
+
+    def get(self, row: int) -> Action:
+        """
+        Get a copy of the action of a row, which the caller is free to modify. Rows past the end are empty actions.
+        """
+        if row >= len(self.actions):
+            return Action()
+        return copy.copy(self.actions[row])
+
+    def error(self, row: int) -> Optional[str]:
+        """
+        Get the reason why the action of a row is invalid, or None if it is valid.
+        """
+        if row >= len(self.errors):
+            return "past the end of the sheet"
+        return self.errors[row]
+
+    def first_invalid(self, start: int) -> int:
+        """
+        Get the first row from start whose action is invalid, i.e. where the script ends.
+        """
+        for row in range(start, len(self.errors)):
+            if self.errors[row] is not None:
+                return row
+        return len(self.errors)
+
+if __name__ == "__main__":
+    # Usage and testing
+    import time
+    header = ("费用", "帧数", "操作", "干员", "坐标", "朝向", "简称")
+    column_loc = {"cost": 0, "tick": 1, "action_type": 2, "oper": 3, "pos": 4, "direction": 5, "alias": 6}
+    data = [header] + [
+        (10.0, 5.0, "部署", "斑点", "D2", "右", None),
+        (12.0, 0.0, "技能", "斑点", None, None, None),
+        ("abc", 0.0, "撤退", "斑点", None, None, None),
+        (15.0, 3.0, "跳舞", "斑点", None, None, None),
+        (16.0, 0.0, "技能", "斑点", None, "斜", None),
+    ] * 400
+
+    decoder = RowDecoder(column_loc)
+    table = decoder.decode_table(data)
+    for row in range(1, 6):
+        logger.info(f"Row {row}: {table.get(row)}, error: {table.error(row)}")
+    logger.info(f"First invalid row from 1: {table.first_invalid(1)}")
+
+    # Compare with the per-cell reflection used before
+    from src.utils.typecheck import get_optional_type, is_valid_type
+    def reflect(row):
+        action_data = {}
+        for field in dataclasses.fields(Action):
+            col = column_loc.get(field.name)
+            if col is not None:
+                try:
+                    value = row[col]
+                    actual_type = get_optional_type(field.type)
+                    action_data[field.name] = None if value is None else actual_type(value)
+                except (ValueError, TypeError):
+                    action_data[field.name] = None
+        action = Action(**action_data)
+        all(is_valid_type(getattr(action, field.name), field.type) for field in dataclasses.fields(action))
+        return action
+
+    import logging
+    logger.setLevel(logging.ERROR)
+    start = time.perf_counter()
+    for row in data[1:]:
+        reflect(row)
+    reflected = time.perf_counter() - start
+    start = time.perf_counter()
+    decoder = RowDecoder(column_loc)
+    decoder.decode_table(data)
+    decoded = time.perf_counter() - start
+    print(f"{len(data) - 1} rows: reflection {reflected * 1000:.2f} ms, compiled decoder {decoded * 1000:.2f} ms")
@@ -0,0 +1,192 @@
+"""
+game_state.py
+This module classifies the state of the battle from a few pixel probes of the game window.
+
+The pause button shows two bars while the game runs and a play triangle while it is paused. Without the
+battle HUD, a menu covers the field. While an operator is selected in a running game (bullet time), the
+field is dimmed. Only the pause icon and a thin strip across the field are captured, so a classification
+takes well under a millisecond besides the capture.
+"""
+
+import time
+import numpy as np
+from enum import Enum
+from typing import Iterable, Optional
+
+from src.logger import logger
+from src.config import GameRatioConfig as ratioconfig
+from src.config import ImageProcessingConfig as imgconfig
+from src.config import PerformActionConfig as actionconfig
+from src.mumu.mumu_vision import CaptureMode, Snapshot, register_roi, capture_roi
+from src.mumu.mumu_controller import esc
+from src.utils.error_to_log import ErrorToLog
+from src.utils.trace import tracer
+from src.utils.metrics import metrics
+from src.utils import clock
+
+class GameState(Enum):
+    RUNNING = "running"
+    PAUSED = "paused"
+    BULLET_TIME = "bullet_time"
+    MENU = "menu"
+    UNKNOWN = "unknown"
+
+# States in which the game time does not flow
+PAUSED_STATES = (GameState.PAUSED, GameState.MENU)
+
+register_roi("pause_icon", ratioconfig.PAUSE_ICON_AREA_RATIO, CaptureMode.BINARY)
+register_roi("field_probe", ratioconfig.FIELD_PROBE_RATIO, CaptureMode.GRAY)
+
+class GameStateClassifier:
+    """
+    Classify the state of the battle from the pause icon and the field brightness.
+
+    The field brightness is compared to a baseline, the brightest field seen while the game was running
+    in this session. Until a running game was seen, a missing pause icon is reported as UNKNOWN
+    rather than MENU, e.g. on the loading screen.
+
+    Usage:
+        state = game_state_classifier.classify()
+    """
+    def __init__(self):
+        self.reset()
+
+    def reset(self) -> None:
+        """Forget the field brightness baseline, e.g. when a new session starts."""
+        self.baseline: Optional[float] = None
+
+    def icon_shows_bars(self, icon: np.ndarray) -> Optional[bool]:
+        """
+        Check the pause icon.
+
+        Returns:
+            Optional[bool]: True for the pause bars (running), False for the play triangle (paused),
+                            None if there is no icon.
+        """
+        profile = np.count_nonzero(icon, axis=0)
+        if profile.sum() < imgconfig.PAUSE_ICON_MIN_FILL * icon.size:
+            return None
+        # The bars are two runs of filled columns with a gap in between, the triangle is a single run
+        filled = np.concatenate([[False], profile > profile.max() / 4])
+        runs = np.count_nonzero(filled[1:] & ~filled[:-1])
+        return runs >= 2
+
+    def classify(self, snapshot: Optional[Snapshot] = None) -> GameState:
+        """
+        Classify the current state of the battle.
+
+        Args:
+            snapshot (Snapshot, optional): A snapshot containing the "pause_icon" and "field_probe" ROIs.
+
+        Returns:
+            GameState: The current state.
+        """
+        with metrics.timer("game_state_ms"):
+            bars = self.icon_shows_bars(capture_roi("pause_icon", snapshot))
+            if bars is None:
+                return GameState.UNKNOWN if self.baseline is None else GameState.MENU
+            if not bars:
+                return GameState.PAUSED
+
+            brightness = float(np.mean(capture_roi("field_probe", snapshot)))
+            if self.baseline is None or brightness > self.baseline:
+                self.baseline = brightness
+            if brightness < self.baseline * imgconfig.FIELD_DIM_RATIO:
+                return GameState.BULLET_TIME
+            return GameState.RUNNING
+
+game_state_classifier = GameStateClassifier()
+
+def get_game_state(snapshot: Optional[Snapshot] = None) -> GameState:
+    """
+    Get the current state of the battle.
+    """
+    return game_state_classifier.classify(snapshot)
+
+def wait_for_state(states: Iterable[GameState], timeout: float = actionconfig.STATE_TIMEOUT) -> GameState:
+    """
+    Poll the state of the battle until it is one of the given states, or until the timeout.
+
+    Returns:
+        GameState: The last classified state, which is one of the given states unless the timeout passed.
+    """
+    states = tuple(states)
+    start = clock.now()
+    with tracer.span("wait_for_state", states=",".join(state.value for state in states)) as span, tracer.quiet():
+        while True:
+            state = get_game_state()
+            if state in states or clock.now() - start >= timeout:
+                break
+            clock.sleep(actionconfig.VERIFY_INTERVAL)
+        span.args["state"] = state.value
+    metrics.histogram("state_wait_ms", "ms").record((clock.now() - start) * 1000)
+    return state
+
+def ensure_paused() -> GameState:
+    """
+    Make sure the game is paused, pausing it again if it is running.
+
+    Returns:
+        GameState: The state of the paused game, or UNKNOWN if it can not be classified.
+
+    Raises:
+        ErrorToLog: If the game could not be paused.
+    """
+    state = get_game_state()
+    if state in PAUSED_STATES:
+        return state
+    if state == GameState.UNKNOWN:
+        logger.debug("Could not classify the game state, assuming the game is paused")
+        return state
+    if state in (GameState.RUNNING, GameState.BULLET_TIME):
+        metrics.counter("state_recoveries").inc()
+        logger.warning("Expected the game to be paused, but it is %s, pausing again", state.value)
+        esc()
+        state = wait_for_state(PAUSED_STATES)
+    if state not in PAUSED_STATES + (GameState.UNKNOWN,):
+        logger.error("Failed to pause the game, the game is %s", state.value)
+        raise ErrorToLog("无法暂停游戏。")
+    return state
+
+def settle_paused() -> GameState:
+    """
+    Wait until the game is paused, after sending an input that pauses it.
+
+    This replaces a fixed settle time: it returns as soon as the game shows as paused, and pauses again
+    if it does not. The captured frame may still predate the input for a moment, e.g. show the game
+    paused before an input that resumes it briefly, so polling starts after a minimum settle time. If
+    the state can not be classified, it falls back to the fixed settle time.
+
+    Returns:
+        GameState: The state of the paused game, or UNKNOWN.
+    """
+    clock.sleep(actionconfig.SETTLE_MIN_WAITTIME)
+    state = wait_for_state(PAUSED_STATES + (GameState.UNKNOWN,))
+    if state == GameState.UNKNOWN:
+        clock.sleep(actionconfig.GENERAL_WAITTIME - actionconfig.SETTLE_MIN_WAITTIME)
+    elif state not in PAUSED_STATES:
+        state = ensure_paused()
+    return state
+
+if __name__ == "__main__":
+    # Usage and testing
+    from src.mumu.mumu_window import set_window
+    from src.mumu.mumu_simulator import SimulatedWindow
+    from src.mumu.mumu_controller import pause, mouseclick
+
+    set_window(SimulatedWindow(["斑点"]))
+    logger.info(f"Initial state: {get_game_state()}")
+    pause()
+    logger.info(f"After pause(): {wait_for_state([GameState.RUNNING])}")
+    mouseclick(ratioconfig.LAST_OPER_RATIO)
+    logger.info(f"After selecting an operator: {wait_for_state([GameState.BULLET_TIME])}")
+    logger.info(f"ensure_paused(): {ensure_paused()}")
+
+    # Time the classification alone, on a snapshot captured beforehand
+    from src.mumu.mumu_vision import capture_snapshot
+    snapshot = capture_snapshot("pause_icon", "field_probe")
+    start = time.perf_counter()
+    for _ in range(1000):
+        game_state_classifier.classify(snapshot)
+    logger.info(f"Classification: {(time.perf_counter() - start):.3f} ms per frame")
+    logger.info(metrics.format_table())
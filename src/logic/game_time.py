@@ -1,34 +1,43 @@
-from dataclasses import dataclass
-from typing import ClassVar
+from typing import ClassVar, Union
 
 from src.config import GameTimeConfig as config
 
-@dataclass(order=True, frozen=True)
 class GameTime:
     """
     Represents game time in Arknights, including cost and ticks.
 
+    A game time is stored as a single integer, the total number of ticks, so comparing and adding game
+    times is plain integer arithmetic. Game times also compare with and add plain ints, counted in ticks,
+    which lets hot loops precompute their bounds as ints. Game times are immutable.
+
     Attributes:
         cost (int): The in-game cost.
-        tick (int): The current tick count.
+        tick (int): The current tick count, between 0 and TICK_MAX - 1.
+        ticks (int): The total number of ticks, i.e. cost * TICK_MAX + tick.
 
     Class Attributes:
-        TICK_MAX (int): The maximum value of ticks. Can be set globally.
+        TICK_MAX (int): The maximum value of ticks. Can be set globally, before any game time is created,
+                        as the total ticks of existing game times are not rescaled.
 
     Methods:
         set_tick_max: Set the global maximum value of ticks.
-        __add__: Add two GameTime instances.
-        __sub__: Subtract one GameTime instance from another.
+        from_ticks: Create a game time from a total number of ticks.
+        __add__: Add two GameTime instances, or a number of ticks.
+        __sub__: Subtract one GameTime instance, or a number of ticks, from another.
     """
-    cost: int
-    tick: int
+    __slots__ = ("_ticks",)
 
     TICK_MAX: ClassVar[int] = config.TICK_MAX_DEFAULT
 
-    def __post_init__(self):
-        # Ensure the ticks are within the valid range
-        object.__setattr__(self, 'cost', self.cost + self.tick // self.TICK_MAX)
-        object.__setattr__(self, 'tick', self.tick % self.TICK_MAX)
+    def __init__(self, cost: int, tick: int):
+        self._ticks = cost * self.TICK_MAX + tick
+
+    @classmethod
+    def from_ticks(cls, ticks: int) -> 'GameTime':
+        """Create a game time from a total number of ticks."""
+        game_time = cls.__new__(cls)
+        game_time._ticks = ticks
+        return game_time
 
     @classmethod
     def set_tick_max(cls, max_value: int):
@@ -36,21 +45,92 @@ class GameTime:
         if max_value <= 0:
             raise ValueError("TICK_MAX must be a positive integer.")
         cls.TICK_MAX = max_value
-    
+
     @classmethod
     def get_tick_max(cls) -> int:
         """Get the global maximum tick value."""
         return cls.TICK_MAX
 
-    def __add__(self, other: 'GameTime') -> 'GameTime':
-        total_cost = self.cost + other.cost + (self.tick + other.tick) // self.TICK_MAX
-        total_tick = (self.tick + other.tick) % self.TICK_MAX
-        return GameTime(total_cost, total_tick)
+    @property
+    def cost(self) -> int:
+        return self._ticks // self.TICK_MAX
+
+    @property
+    def tick(self) -> int:
+        return self._ticks % self.TICK_MAX
+
+    @property
+    def ticks(self) -> int:
+        return self._ticks
+
+    def __int__(self) -> int:
+        return self._ticks
+
+    def __repr__(self) -> str:
+        cost, tick = divmod(self._ticks, self.TICK_MAX)
+        return f"GameTime(cost={cost}, tick={tick})"
+
+    def __reduce__(self):
+        return (GameTime.from_ticks, (self._ticks,))
+
+    def __hash__(self) -> int:
+        return hash(self._ticks)
+
+    def __eq__(self, other: Union['GameTime', int]) -> bool:
+        if isinstance(other, GameTime):
+            return self._ticks == other._ticks
+        if isinstance(other, int):
+            return self._ticks == other
+        return NotImplemented
+
+    def __lt__(self, other: Union['GameTime', int]) -> bool:
+        if isinstance(other, GameTime):
+            return self._ticks < other._ticks
+        if isinstance(other, int):
+            return self._ticks < other
+        return NotImplemented
+
+    def __le__(self, other: Union['GameTime', int]) -> bool:
+        if isinstance(other, GameTime):
+            return self._ticks <= other._ticks
+        if isinstance(other, int):
+            return self._ticks <= other
+        return NotImplemented
+
+    def __gt__(self, other: Union['GameTime', int]) -> bool:
+        if isinstance(other, GameTime):
+            return self._ticks > other._ticks
+        if isinstance(other, int):
+            return self._ticks > other
+        return NotImplemented
+
+    def __ge__(self, other: Union['GameTime', int]) -> bool:
+        if isinstance(other, GameTime):
+            return self._ticks >= other._ticks
+        if isinstance(other, int):
+            return self._ticks >= other
+        return NotImplemented
+
+    def __add__(self, other: Union['GameTime', int]) -> 'GameTime':
+        if isinstance(other, GameTime):
+            return GameTime.from_ticks(self._ticks + other._ticks)
+        if isinstance(other, int):
+            return GameTime.from_ticks(self._ticks + other)
+        return NotImplemented
+
+    __radd__ = __add__
+
+    def __sub__(self, other: Union['GameTime', int]) -> 'GameTime':
+        if isinstance(other, GameTime):
+            return GameTime.from_ticks(self._ticks - other._ticks)
+        if isinstance(other, int):
+            return GameTime.from_ticks(self._ticks - other)
+        return NotImplemented
 
-    def __sub__(self, other: 'GameTime') -> 'GameTime':
-        total_cost = self.cost - other.cost + (self.tick - other.tick) // self.TICK_MAX
-        total_tick = (self.tick - other.tick) % self.TICK_MAX
-        return GameTime(total_cost, total_tick)
+    def __rsub__(self, other: int) -> 'GameTime':
+        if isinstance(other, int):
+            return GameTime.from_ticks(other - self._ticks)
+        return NotImplemented
 
 if __name__ == "__main__":
     GameTime.set_tick_max(30)
@@ -66,3 +146,6 @@ if __name__ == "__main__":
     print(f"time1 < time2 = {time1 < time2}")
     print(f"time1 == time2 = {time1 == time2}")
     print(f"time1 > time2 = {time1 > time2}")
+    print(f"time1 + 25 = {time1 + 25}")
+    print(f"time1 < 1510 = {time1 < 1510}")
+    print(f"int(time1) = {int(time1)}")
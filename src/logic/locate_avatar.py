@@ -1,40 +1,90 @@
 import cv2
+import numpy as np
+from typing import List, Optional, Tuple
 
 from src.cache import get_avatars, replace_avatar
 from src.logic.action import Action
-from src.mumu.mumu_vision import capture_game_window
+from src.mumu.mumu_vision import CaptureMode, Snapshot, register_roi, capture_roi
 from src.logger import logger
 from src.config import GameRatioConfig as ratioconfig
 from src.config import ImageProcessingConfig as imgconfig
 from src.utils.error_to_log import ErrorToLog
+from src.utils.trace import tracer
+from src.utils.metrics import metrics
+from src.utils.flight_recorder import flight_recorder
 
-def locate_avatar(action: Action) -> None:
-    """
-    Locate the exact location of the avatar on game screen. Modify the action object in place.
+register_roi("operator", ratioconfig.OPERATOR_AREA_RATIO, CaptureMode.STANDARD)
+
+def match_avatar(avatars: List[np.ndarray], strip: np.ndarray, left: int = 0, right: Optional[int] = None) -> Tuple[float, Optional[Tuple[int, int]], Optional[np.ndarray]]:
     """
-    avatars = get_avatars(action.oper)
-    oper_area_img = capture_game_window(ratioconfig.OPERATOR_AREA_RATIO)
+    Find the best match of an operator's avatars in the deploy strip, or in a range of its columns.
+
+    Args:
+        avatars (List[np.ndarray]): The avatars of the operator.
+        strip (np.ndarray): The "operator" ROI.
+        left (int, optional): The first column searched.
+        right (int, optional): The column after the last one searched. Defaults to the width of the strip.
 
+    Returns:
+        Tuple[float, Optional[Tuple[int, int]], Optional[np.ndarray]]: The score, the top-left position in the strip
+                                                                      and the avatar of the best match.
+    """
+    left = max(left, 0)
+    area = strip[:, left:right]
     max_val, max_pos, max_avatar = 0, None, None
     for avatar in avatars:
-        matched = cv2.matchTemplate(oper_area_img, avatar, cv2.TM_CCOEFF_NORMED)
+        if area.shape[0] < avatar.shape[0] or area.shape[1] < avatar.shape[1]:
+            continue
+        matched = cv2.matchTemplate(area, avatar, cv2.TM_CCOEFF_NORMED)
         _, val, _, pos = cv2.minMaxLoc(matched)
         if val > max_val:
-            max_val, max_pos, max_avatar = val, pos, avatar
+            max_val, max_pos, max_avatar = val, (pos[0] + left, pos[1]), avatar
+    return max_val, max_pos, max_avatar
+
+def avatar_ratio(pos: Tuple[int, int], avatar: np.ndarray) -> Tuple[float, float]:
+    """
+    Convert the top-left position of an avatar in the deploy strip to the position of its center, in ratio.
+    """
+    return (
+        ratioconfig.OPERATOR_AREA_RATIO[0] + (pos[0] + avatar.shape[1] / 2) / imgconfig.SCREEN_STANDARD_SIZE[0],
+        ratioconfig.OPERATOR_AREA_RATIO[1] + (pos[1] + avatar.shape[0] / 2) / imgconfig.SCREEN_STANDARD_SIZE[1],
+    )
+
+@tracer.wrap("locate_avatar")
+def locate_avatar(action: Action, snapshot: Optional[Snapshot] = None) -> Tuple[int, int]:
+    """
+    Locate the exact location of the avatar on game screen. Modify the action object in place.
+
+    Args:
+        action (Action): The action whose operator is located.
+        snapshot (Snapshot, optional): A snapshot containing the "operator" ROI, used instead of a fresh capture.
+
+    Returns:
+        Tuple[int, int]: The top-left position of the avatar in the deploy strip.
+    """
+    avatars = get_avatars(action.oper)
+    oper_area_img = capture_roi("operator", snapshot)
+    frame_info = flight_recorder.record("operator", oper_area_img, oper=action.oper)
+
+    with tracer.span("template_match", oper=action.oper, templates=len(avatars)) as span:
+        max_val, max_pos, max_avatar = match_avatar(avatars, oper_area_img)
+        span.args["score"] = max_val
+    frame_info["score"], frame_info["pos"] = max_val, max_pos
+    metrics.histogram("template_match_score").record(max_val)
+    metrics.histogram("template_match_margin").record(max_val - imgconfig.TEMPLATE_MATCH_THRESHOLD)
     
     if max_val < imgconfig.TEMPLATE_MATCH_THRESHOLD:
-        logger.error(f"Could not find a good matching avatar for {action.oper}, with max_val: {max_val}")
+        logger.error("Could not find a good matching avatar for %s, with max_val: %s", action.oper, max_val)
         raise ErrorToLog(f"未在待部署区找到干员{action.oper}。")
     
     if len(avatars) > 1:
-        logger.info(f"Found best matching avatar for {action.oper}")
+        logger.info("Found best matching avatar for %s", action.oper)
         replace_avatar(action.oper, max_avatar)
     
     # Add the avatar position to the action, in ratio
-    avatar_ratio_x = ratioconfig.OPERATOR_AREA_RATIO[0] + (max_pos[0] + max_avatar.shape[1] / 2) / imgconfig.SCREEN_STANDARD_SIZE[0]
-    avatar_ratio_y = ratioconfig.OPERATOR_AREA_RATIO[1] + (max_pos[1] + max_avatar.shape[0] / 2) / imgconfig.SCREEN_STANDARD_SIZE[1]
-    action.avatar_pos = (avatar_ratio_x, avatar_ratio_y)
-    logger.info(f"Avatar position of {action.oper} found at: {max_pos}, max_val: {max_val}")
+    action.avatar_pos = avatar_ratio(max_pos, max_avatar)
+    logger.info("Avatar position of %s found at: %s, max_val: %s", action.oper, max_pos, max_val)
+    return max_pos
 
 if __name__ == "__main__":
     # Usage and testing
@@ -6,8 +6,15 @@ from src.config import GameRatioConfig as ratioconfig
 from src.config import PerformActionConfig as actionconfig
 from src.logic.action import Action, ActionType, DirectionType
 from src.logic.game_time import GameTime
-from src.logic.locate_avatar import locate_avatar
+from src.logic.roster import roster
+from src.logic.verify_action import confirm_deploy, capture_button, confirm_button
+from src.logic.game_state import ensure_paused, settle_paused
 from src.logic.analyze_time import get_game_time
+from src.utils.trace import tracer
+from src.utils.metrics import metrics
+from src.utils import clock
+from src.mumu.mumu_vision import capture_snapshot
+from src.mumu.mumu_scheduler import scheduler
 from src.mumu.mumu_controller import (
     pause,
     esc,
@@ -39,16 +46,31 @@ class UserPausedError(Exception):
     pass
 
 
+def sleep(seconds: float) -> None:
+    """
+    Sleep for the given time, recorded as a span in the trace.
+    """
+    with tracer.span("sleep", seconds=seconds):
+        clock.sleep(seconds)
+
+
 def wait_until_threshold(
     target_time: GameTime, threshold: GameTime, user_paused: Callable[[], bool]
 ) -> None:
-    while get_game_time() + threshold < target_time:
-        if user_paused():
-            # Pause the game first
-            esc()
-            raise UserPausedError()
-
-
+    with tracer.span("wait_until_threshold", target_time=target_time, threshold=threshold) as span, tracer.quiet():
+        iterations = 0
+        # Compare against the bound in total ticks, instead of adding game times on every read
+        bound = int(target_time) - int(threshold)
+        while get_game_time() < bound:
+            iterations += 1
+            if user_paused():
+                # Pause the game first
+                esc()
+                raise UserPausedError()
+        span.args["iterations"] = iterations
+
+
+@tracer.wrap("perform_deploy")
 def perform_deploy(
     action: Action,
     user_paused: Callable[[], bool],
@@ -60,55 +82,57 @@ def perform_deploy(
     # First, Proceed until we reach the frame threshold
     if get_game_time() + BULLET_THRESHOLD < target_time:
         # When we have too much time, first resume, then enter bullet time when appropriate
-        logger.debug(f"Too much time, resuming and entering bullet time")
+        logger.debug("Too much time, resuming and entering bullet time")
         pause()
         wait_until_threshold(target_time, BULLET_THRESHOLD, user_paused)
         mouseclick(ratioconfig.LAST_OPER_RATIO)
-        time.sleep(actionconfig.GENERAL_WAITTIME)
+        sleep(actionconfig.GENERAL_WAITTIME)
         wait_until_threshold(target_time, FRAME_THRESHOLD, user_paused)
         esc()
-        time.sleep(actionconfig.GENERAL_WAITTIME)
+        settle_paused()
     elif get_game_time() + FRAME_THRESHOLD < target_time:
         # When we are within the bullet threshold, directly enter bullet time, then resume
-        logger.debug(f"Within bullet threshold, entering bullet time")
+        logger.debug("Within bullet threshold, entering bullet time")
         mouseclick(ratioconfig.LAST_OPER_RATIO)
-        time.sleep(actionconfig.GENERAL_WAITTIME)
+        sleep(actionconfig.GENERAL_WAITTIME)
         pause()
         wait_until_threshold(target_time, FRAME_THRESHOLD, user_paused)
         esc()
-        time.sleep(actionconfig.GENERAL_WAITTIME)
+        settle_paused()
     else:
         # When we are already within the frame threshold, directly enter bullet time, and don't resume at all
-        logger.debug(f"Within frame threshold, entering bullet time")
+        logger.debug("Within frame threshold, entering bullet time")
         mouseclick(ratioconfig.LAST_OPER_RATIO)
-        time.sleep(actionconfig.GENERAL_WAITTIME)
+        sleep(actionconfig.GENERAL_WAITTIME)
 
     # Note: Pause invariant: Here the game is paused
     # and also, we have selected the last operator to be under bullet time
     # Now, proceed frame by frame until we reach the target time
-    while get_game_time() < target_time:
-        pause()
-        time.sleep(actionconfig.FRAME_WAITTIME)
-        esc()
-        if user_paused():
-            raise UserPausedError()
-        time.sleep(actionconfig.GENERAL_WAITTIME)
+    # The deploy strip is grabbed along with the cost area, so the final frame also serves locating the avatar
+    with tracer.span("frame_by_frame"):
+        snapshot = capture_snapshot("cost", "operator")
+        while get_game_time(snapshot) < target_time:
+            scheduler.pulse("frame", pause, esc, actionconfig.FRAME_WAITTIME)
+            if user_paused():
+                raise UserPausedError()
+            settle_paused()
+            snapshot = capture_snapshot("cost", "operator")
 
     # Finally, do the action
-    # Find the avatar position
-    locate_avatar(action)
+    # Find the avatar position, from the card of the operator tracked since the start of the battle
+    roster.locate(action, snapshot)
 
     # Check if we have actually already selected the operator
     # This may happen when the target operator is the last operator
     if action.avatar_pos[1] < ratioconfig.OPERATOR_SELECTED_RATIO:
-        logger.debug(f"Operator {action.oper} is already selected")
+        logger.debug("Operator %s is already selected", action.oper)
     else:
         # Select the operator
         mouseclick(action.avatar_pos)
-        time.sleep(actionconfig.GENERAL_WAITTIME)
+        sleep(actionconfig.GENERAL_WAITTIME)
 
         # Now the operator is selected, find avatar position again since it may have changed
-        locate_avatar(action)
+        roster.locate(action)
 
     # Calculate the middle position for dragging
     middle_pos = (
@@ -122,26 +146,27 @@ def perform_deploy(
     if user_paused():
         raise UserPausedError()
 
-    # Deploy the operator
-    pause()
-    mousedown(action.avatar_pos)
-    mousemove(middle_pos)
-    time.sleep(actionconfig.MINIMUM_WAITTIME)
-    esc()
-    time.sleep(actionconfig.GENERAL_WAITTIME)
+    # Deploy the operator, the game runs from pause() until esc()
+    scheduler.run("drag", [
+        (0, pause),
+        (0, lambda: mousedown(action.avatar_pos)),
+        (0, lambda: mousemove(middle_pos)),
+        (actionconfig.MINIMUM_WAITTIME, esc),
+    ])
+    settle_paused()
 
     # Check if we are on time
     actual_time = get_game_time()
     if actual_time != target_time:
         logger.warning(
-            f"Game time mismatch, performed action at {actual_time} instead of {target_time}"
+            "Game time mismatch, performed action at %s instead of %s", actual_time, target_time
         )
 
     # Do the rest of the deploy
     mousemove((action.view_pos_side[0], action.view_pos_side[1] + ratioconfig.DEPLOY_DELTA_RATIO))
-    time.sleep(actionconfig.GENERAL_WAITTIME)
+    sleep(actionconfig.GENERAL_WAITTIME)
     mouseup((action.view_pos_side[0], action.view_pos_side[1] + ratioconfig.DEPLOY_DELTA_RATIO))
-    time.sleep(actionconfig.GENERAL_WAITTIME)
+    sleep(actionconfig.GENERAL_WAITTIME)
 
     # Set the direction
     dir_pos = None
@@ -167,16 +192,19 @@ def perform_deploy(
         )
     if dir_pos:
         mousedown(action.view_pos_side)
-        time.sleep(actionconfig.GENERAL_WAITTIME)
+        sleep(actionconfig.GENERAL_WAITTIME)
         mousemove(dir_pos)
-        time.sleep(actionconfig.GENERAL_WAITTIME)
+        sleep(actionconfig.GENERAL_WAITTIME)
         mouseup(dir_pos)
-        time.sleep(actionconfig.GENERAL_WAITTIME)
+
+    # Settle until the operator left the deploy strip, which also confirms the deploy
+    confirm_deploy(action)
 
     # Note: Pause invariant: Here the game is paused
     return actual_time
 
 
+@tracer.wrap("perform_skill_or_retreat")
 def perform_skill_or_retreat(
     action: Action,
     user_paused: Callable[[], bool],
@@ -188,52 +216,52 @@ def perform_skill_or_retreat(
     # First, Proceed until we reach the bullet threshold
     if get_game_time() + BULLET_THRESHOLD < target_time:
         # When we have too much time, first resume, then enter bullet time when appropriate
-        logger.debug(f"Too much time, resuming and entering bullet time")
+        logger.debug("Too much time, resuming and entering bullet time")
         pause()
         wait_until_threshold(target_time, BULLET_THRESHOLD, user_paused)
         mouseclick(action.view_pos_front)
-        time.sleep(actionconfig.GENERAL_WAITTIME)
+        sleep(actionconfig.GENERAL_WAITTIME)
         wait_until_threshold(target_time, FRAME_THRESHOLD, user_paused)
         esc()
-        time.sleep(actionconfig.GENERAL_WAITTIME)
+        settle_paused()
     elif get_game_time() + FRAME_THRESHOLD < target_time:
         # When we are within the bullet threshold, resume and enter bullet time, quickly
-        logger.debug(f"Within bullet threshold, entering bullet time")
+        logger.debug("Within bullet threshold, entering bullet time")
         pause()
         mouseclick(action.view_pos_front)
-        time.sleep(actionconfig.GENERAL_WAITTIME)
+        sleep(actionconfig.GENERAL_WAITTIME)
         wait_until_threshold(target_time, FRAME_THRESHOLD, user_paused)
         esc()
-        time.sleep(actionconfig.GENERAL_WAITTIME)
+        settle_paused()
     else:
         # When we are already within the frame threshold, enter side view first, then try to click
         # Note: Here the click may fail, since it is not guaranteed that the operator can be selected from side view
         # Ex. the leftmost deployable position in the middle row of 1-7
-        logger.debug(f"Within frame threshold, entering side view")
+        logger.debug("Within frame threshold, entering side view")
         mouseclick(ratioconfig.LAST_OPER_RATIO)
-        time.sleep(actionconfig.GENERAL_WAITTIME)
-        pause()
-        mouseclick(action.view_pos_side)
-        time.sleep(actionconfig.MINIMUM_WAITTIME)
-        esc()
-        time.sleep(actionconfig.GENERAL_WAITTIME)
+        sleep(actionconfig.GENERAL_WAITTIME)
+        scheduler.run("side_click", [
+            (0, pause),
+            (0, lambda: mouseclick(action.view_pos_side)),
+            (actionconfig.MINIMUM_WAITTIME, esc),
+        ])
+        settle_paused()
 
     # Note: Pause invariant: Here the game is paused
     # and also, we have selected the target operator to be under bullet time
     # Now, proceed frame by frame until we reach the target time
-    while get_game_time() < target_time:
-        pause()
-        time.sleep(actionconfig.FRAME_WAITTIME)
-        esc()
-        if user_paused():
-            raise UserPausedError()
-        time.sleep(actionconfig.GENERAL_WAITTIME)
+    with tracer.span("frame_by_frame"):
+        while get_game_time() < target_time:
+            scheduler.pulse("frame", pause, esc, actionconfig.FRAME_WAITTIME)
+            if user_paused():
+                raise UserPausedError()
+            settle_paused()
 
     # Check if we are on time
     actual_time = get_game_time()
     if actual_time != target_time:
         logger.warning(
-            f"Game time mismatch, performed action at {actual_time} instead of {target_time}"
+            "Game time mismatch, performed action at %s instead of %s", actual_time, target_time
         )
 
     # Final check if user paused
@@ -241,48 +269,63 @@ def perform_skill_or_retreat(
         raise UserPausedError()
 
     # Finally, do the action
-    # time.sleep(actionconfig.GENERAL_WAITTIME)
+    # Settle until the clicked button changed state, which also confirms the action
+    button = capture_button(action)
     if action.action_type == ActionType.SKILL:
         mouseclick(ratioconfig.SKILL_RATIO)
-        time.sleep(actionconfig.GENERAL_WAITTIME)
     elif action.action_type == ActionType.RETREAT:
         mouseclick(ratioconfig.RETREAT_RATIO)
-        time.sleep(actionconfig.GENERAL_WAITTIME)
     else:
         raise ValueError(f"Invalid action type: {action.action_type}")
+    confirm_button(action, button)
 
     # Note: Pause invariant: Here the game is paused
     return actual_time
 
 
 def perform_action(action: Action, user_paused: Callable[[], bool]) -> None:
-    logger.debug(f"Performing action: {action}")
-    # Note: Pause invariant: Here the game is paused
+    logger.debug("Performing action: %s", action)
+    # Note: Pause invariant: Here the game is paused, recover if it is not
+    ensure_paused()
 
     BULLET_THRESHOLD = GameTime(0, actionconfig.BULLET_THRESHOLD)
     FRAME_THRESHOLD = GameTime(0, actionconfig.FRAME_THRESHOLD)
 
     actual_time = action.get_game_time()
-    if action.action_type == ActionType.DEPLOY:
-        actual_time = perform_deploy(action, user_paused, BULLET_THRESHOLD, FRAME_THRESHOLD)
-    elif (
-        action.action_type == ActionType.SKILL
-        or action.action_type == ActionType.RETREAT
-    ):
-        actual_time = perform_skill_or_retreat(
-            action, user_paused, BULLET_THRESHOLD, FRAME_THRESHOLD
-        )
-    else:
-        raise ValueError(f"Invalid action type: {action.action_type}")
+    with tracer.span(
+        "perform_action",
+        action_type=action.action_type,
+        oper=action.oper,
+        scheduled_time=action.get_game_time(),
+    ) as span:
+        if action.action_type == ActionType.DEPLOY:
+            actual_time = perform_deploy(action, user_paused, BULLET_THRESHOLD, FRAME_THRESHOLD)
+        elif (
+            action.action_type == ActionType.SKILL
+            or action.action_type == ActionType.RETREAT
+        ):
+            actual_time = perform_skill_or_retreat(
+                action, user_paused, BULLET_THRESHOLD, FRAME_THRESHOLD
+            )
+        else:
+            raise ValueError(f"Invalid action type: {action.action_type}")
+        span.args["actual_time"] = actual_time
+
+    # Record how many ticks late the action was
+    late_time = actual_time - action.get_game_time()
+    metrics.histogram("ticks_late", "tick").record(late_time.ticks)
 
     # Note: Pause invariant: Here the game is paused
     if actual_time == action.get_game_time():
-        logger.info(f"Performed action: {action}")
+        metrics.counter("actions_on_time").inc()
+        logger.info("Performed action: %s", action)
     elif actual_time > action.get_game_time():
-        logger.warning(f"Performed action: {action} (not on time)")
+        metrics.counter("actions_late").inc()
+        logger.warning("Performed action: %s (not on time)", action)
         raise PerformLateError(get_game_time(), action.get_game_time())
     else:
-        logger.error(f"Performed action: {action} (unexpected time)")
+        metrics.counter("actions_early").inc()
+        logger.error("Performed action: %s (unexpected time)", action)
         raise PerformLateError(get_game_time(), action.get_game_time())
 
 
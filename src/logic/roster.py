@@ -0,0 +1,179 @@
+"""
+roster.py
+This module tracks which card of the deploy strip belongs to which operator during a battle.
+
+At the start of the battle, all operators of the script are matched against the deploy strip at once, and
+the position of every card found is kept. Before each lookup, the strip is compared column by column to the
+one of the previous lookup. The cards in changed columns, e.g. after a deploy, a retreat, a selection or a
+redeploy timer, may have moved or left, and cards of operators not in the strip may have come in: for each
+of these operators, the changed columns are kept as the span where its card is to be searched, on its next
+lookup. Locating an operator for a deploy is then a lookup of its card, confirmed by matching its avatar in
+a window around it, or a search of the few changed columns, instead of a search of the whole strip. When
+neither finds the operator, it is searched as before by locate_avatar.
+"""
+
+import cv2
+import numpy as np
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from src.logger import logger
+from src.cache import get_avatars, replace_avatar
+from src.config import ImageProcessingConfig as imgconfig
+from src.logic.action import Action
+from src.logic.locate_avatar import avatar_ratio, locate_avatar, match_avatar
+from src.mumu.mumu_vision import Snapshot, capture_roi, capture_snapshot
+from src.utils.trace import tracer
+from src.utils.metrics import metrics
+
+class RosterTracker:
+    """
+    Keep the card position of every operator of the script in the deploy strip.
+
+    Attributes:
+        opers (List[str]): The tracked operators.
+        slots (Dict[str, Tuple[int, int]]): The top-left position of the avatar of every operator found in
+                                           the strip, in the coordinates of the "operator" ROI.
+        spans (Dict[str, Tuple[int, int]]): The columns where the card of an operator without a slot may have
+                                           come in since its last search, as (left, right).
+
+    Usage:
+        roster.start(["斑点", "芬"])
+        roster.locate(action)
+    """
+    def __init__(self):
+        self.reset()
+
+    def reset(self) -> None:
+        """Forget all operators and cards, e.g. when a new battle starts."""
+        self.opers: List[str] = []
+        self.slots: Dict[str, Tuple[int, int]] = {}
+        self.spans: Dict[str, Tuple[int, int]] = {}
+        self.reference: Optional[np.ndarray] = None
+
+    def _overlaps(self, oper: str, pos: Tuple[int, int]) -> bool:
+        # Two operators can not share a card
+        width = imgconfig.AVATAR_CROP_SIZE[0]
+        return any(abs(pos[0] - slot[0]) < width for other, slot in self.slots.items() if other != oper)
+
+    def _search(self, opers: Iterable[str], strip: np.ndarray, left: int = 0, right: Optional[int] = None) -> None:
+        """
+        Search operators in a range of columns of the strip, the best matches taking their cards first.
+        """
+        candidates = []
+        for oper in opers:
+            avatars = get_avatars(oper)
+            score, pos, avatar = match_avatar(avatars, strip, left, right)
+            if score >= imgconfig.TEMPLATE_MATCH_THRESHOLD:
+                candidates.append((score, oper, pos, avatar, len(avatars)))
+        for score, oper, pos, avatar, templates in sorted(candidates, key=lambda candidate: candidate[0], reverse=True):
+            if self._overlaps(oper, pos):
+                continue
+            self.slots[oper] = pos
+            if templates > 1:
+                replace_avatar(oper, avatar)
+
+    @tracer.wrap("roster_start")
+    def start(self, opers: Iterable[str], snapshot: Optional[Snapshot] = None) -> None:
+        """
+        Match all operators against the deploy strip, e.g. at the start of the battle.
+
+        Args:
+            opers (Iterable[str]): The operators of the script. Operators without avatars are left out.
+            snapshot (Snapshot, optional): A snapshot containing the "operator" ROI, used instead of a fresh capture.
+        """
+        self.reset()
+        for oper in dict.fromkeys(opers):
+            try:
+                get_avatars(oper)
+            except (ValueError, FileNotFoundError) as e:
+                logger.warning("Not tracking %s: %s", oper, e)
+                continue
+            self.opers.append(oper)
+        strip = capture_roi("operator", snapshot)
+        self._search(self.opers, strip)
+        self.reference = strip.copy()
+        logger.info("Found %s of %s operators in the deploy strip: %s", len(self.slots), len(self.opers), self.slots)
+
+    def refresh(self, strip: np.ndarray) -> None:
+        """
+        Update the cards from a new capture of the strip, keeping the changed columns as the span to search
+        for the operators whose cards may have moved, left or come in.
+        """
+        width = imgconfig.AVATAR_CROP_SIZE[0]
+        if self.reference is None or self.reference.shape != strip.shape:
+            left, right = 0, strip.shape[1]
+        else:
+            changed = np.flatnonzero(cv2.absdiff(strip, self.reference).mean(axis=0) > imgconfig.ROSTER_CHANGE_THRESHOLD)
+            if not len(changed):
+                return
+            left, right = int(changed[0]), int(changed[-1]) + 1
+        for oper in [oper for oper, pos in self.slots.items() if pos[0] < right and pos[0] + width > left]:
+            del self.slots[oper]
+        # A card partly in the changed columns may stick out of them by up to its width
+        left, right = max(left - width, 0), min(right + width, strip.shape[1])
+        for oper in self.opers:
+            if oper not in self.slots:
+                span = self.spans.get(oper, (left, right))
+                self.spans[oper] = (min(span[0], left), max(span[1], right))
+        self.reference = strip.copy()
+        metrics.counter("roster_refreshes").inc()
+
+    @tracer.wrap("roster_locate")
+    def locate(self, action: Action, snapshot: Optional[Snapshot] = None) -> None:
+        """
+        Locate the avatar of the action's operator in the deploy strip, like locate_avatar. Modify the action object in place.
+
+        Args:
+            action (Action): The action whose operator is located.
+            snapshot (Snapshot, optional): A snapshot containing the "operator" ROI, used instead of a fresh capture.
+
+        Raises:
+            ErrorToLog: If the operator is not in the deploy strip.
+        """
+        if snapshot is None:
+            snapshot = capture_snapshot("operator")
+        strip = capture_roi("operator", snapshot)
+        self.refresh(strip)
+
+        span = self.spans.pop(action.oper, None)
+        if action.oper not in self.slots and span is not None:
+            self._search([action.oper], strip, *span)
+        pos = self.slots.get(action.oper)
+        if pos is not None:
+            # Confirm the card where it was, allowing for a selected card being raised
+            margin = imgconfig.AVATAR_CROP_SIZE[0] // 4
+            score, found, avatar = match_avatar(get_avatars(action.oper), strip, pos[0] - margin, pos[0] + imgconfig.AVATAR_CROP_SIZE[0] + margin)
+            if score >= imgconfig.TEMPLATE_MATCH_THRESHOLD:
+                self.slots[action.oper] = found
+                action.avatar_pos = avatar_ratio(found, avatar)
+                metrics.counter("roster_hits").inc()
+                logger.info("Avatar position of %s confirmed at: %s, score: %s", action.oper, found, score)
+                return
+
+        metrics.counter("roster_misses").inc()
+        found = locate_avatar(action, snapshot)
+        if action.oper not in self.opers:
+            self.opers.append(action.oper)
+        if not self._overlaps(action.oper, found):
+            self.slots[action.oper] = found
+
+roster = RosterTracker()
+
+if __name__ == "__main__":
+    # Usage and testing
+    import time
+    from src.mumu.mumu_window import set_window
+    from src.mumu.mumu_simulator import SimulatedWindow
+
+    opers = ["斑点", "芬", "克洛丝", "炎熔"]
+    window = SimulatedWindow(opers)
+    set_window(window)
+    roster.start(opers)
+    logger.info(f"Slots: {roster.slots}")
+    action = Action(oper="芬")
+    start_time = time.time()
+    roster.locate(action)
+    logger.info(f"Avatar position found at: {action.avatar_pos}, time taken: {time.time() - start_time:.4f} seconds")
+    window.strip.remove("斑点")
+    roster.locate(action)
+    logger.info(f"After a deploy, slots: {roster.slots}, avatar position: {action.avatar_pos}")
@@ -0,0 +1,157 @@
+"""
+verify_action.py
+This module confirms the outcome of deploy, skill and retreat actions from the game window.
+
+Every detector is a cheap check over a snapshot of a few small ROIs, polled until the outcome shows up.
+A settle-wait after an action can therefore end as soon as the outcome is detected, instead of sleeping
+for a fixed time, and an action that silently failed is reported.
+"""
+
+import cv2
+import numpy as np
+from typing import Callable, Optional, Tuple
+
+from src.logger import logger
+from src.cache import get_avatars
+from src.config import GameRatioConfig as ratioconfig
+from src.config import ImageProcessingConfig as imgconfig
+from src.config import PerformActionConfig as actionconfig
+from src.logic.action import Action, ActionType
+from src.mumu.mumu_vision import CaptureMode, Snapshot, register_roi, capture_roi, capture_snapshot
+from src.utils.error_to_log import ErrorToLog
+from src.utils.trace import tracer
+from src.utils.metrics import metrics
+from src.utils import clock
+
+def button_ratio(pos: Tuple[float, float]) -> Tuple[float, float, float, float]:
+    """
+    Get the area probed around a button, as a (left, top, right, bottom) ratio.
+    """
+    size = ratioconfig.BUTTON_AREA_RATIO
+    return (max(pos[0] - size, 0), max(pos[1] - size, 0), min(pos[0] + size, 1), min(pos[1] + size, 1))
+
+register_roi("skill_button", button_ratio(ratioconfig.SKILL_RATIO), CaptureMode.GRAY)
+register_roi("retreat_button", button_ratio(ratioconfig.RETREAT_RATIO), CaptureMode.GRAY)
+
+def avatar_gone(action: Action) -> Callable[[Snapshot], bool]:
+    """
+    Detect that the avatar of the action's operator left the deploy strip.
+
+    Only the column of the strip where the avatar was located is searched, so that a selected
+    (raised) card is still found, but the rest of the strip is not matched at all.
+    """
+    avatar = get_avatars(action.oper)[0]
+    center = int((action.avatar_pos[0] - ratioconfig.OPERATOR_AREA_RATIO[0]) * imgconfig.SCREEN_STANDARD_SIZE[0])
+    margin = avatar.shape[1] // 4
+    left = max(center - avatar.shape[1] // 2 - margin, 0)
+    right = center + avatar.shape[1] // 2 + margin
+
+    def detect(snapshot: Snapshot) -> bool:
+        strip = capture_roi("operator", snapshot)
+        column = strip[:, left:min(right, strip.shape[1])]
+        if column.shape[0] < avatar.shape[0] or column.shape[1] < avatar.shape[1]:
+            return True
+        _, score, _, _ = cv2.minMaxLoc(cv2.matchTemplate(column, avatar, cv2.TM_CCOEFF_NORMED))
+        return score < imgconfig.TEMPLATE_MATCH_THRESHOLD
+    return detect
+
+def button_changed(roi_name: str, reference: np.ndarray) -> Callable[[Snapshot], bool]:
+    """
+    Detect that the area around a button changed, compared to a reference taken before clicking it.
+    """
+    def detect(snapshot: Snapshot) -> bool:
+        current = capture_roi(roi_name, snapshot)
+        return current.shape != reference.shape or cv2.norm(current, reference, cv2.NORM_L1) / reference.size > imgconfig.BUTTON_CHANGE_THRESHOLD
+    return detect
+
+def wait_for_outcome(kind: str, detect: Callable[[Snapshot], bool], *rois: str, timeout: float = actionconfig.VERIFY_TIMEOUT) -> Optional[float]:
+    """
+    Poll a detector until it reports the outcome of an action, or until the timeout.
+
+    Args:
+        kind (str): The kind of outcome, used in the trace and the metrics.
+        detect (Callable[[Snapshot], bool]): The detector.
+        rois (str): The ROIs needed by the detector, captured together on every poll.
+        timeout (float, optional): The maximum time to wait, in seconds.
+
+    Returns:
+        Optional[float]: The detection latency in seconds, or None if the outcome was not detected.
+    """
+    start = clock.now()
+    with tracer.span("verify", kind=kind) as span, tracer.quiet():
+        polls = 0
+        while True:
+            polls += 1
+            if detect(capture_snapshot(*rois)):
+                latency = clock.now() - start
+                span.args["latency"] = latency
+                metrics.histogram(f"verify_{kind}_ms", "ms").record(latency * 1000)
+                return latency
+            if clock.now() - start >= timeout:
+                span.args["polls"] = polls
+                return None
+            clock.sleep(actionconfig.VERIFY_INTERVAL)
+
+def report_outcome(kind: str, action: Action, latency: Optional[float]) -> bool:
+    """
+    Record whether the outcome of an action was detected, warning or raising if it was not.
+
+    Raises:
+        ErrorToLog: If the outcome was not detected and VERIFY_STRICT is set.
+    """
+    if latency is not None:
+        metrics.counter("actions_confirmed").inc()
+        logger.debug("Confirmed %s of %s after %.3f seconds", kind, action.oper, latency)
+        return True
+    metrics.counter("actions_unconfirmed").inc()
+    logger.warning("Could not confirm %s of %s", kind, action.oper)
+    if actionconfig.VERIFY_STRICT:
+        raise ErrorToLog(f"未能确认干员{action.oper}的操作是否成功。")
+    return False
+
+def confirm_deploy(action: Action) -> bool:
+    """
+    Wait until the deployed operator left the deploy strip.
+
+    Returns:
+        bool: Whether the deploy was confirmed.
+    """
+    return report_outcome("deploy", action, wait_for_outcome("deploy", avatar_gone(action), "operator"))
+
+def capture_button(action: Action) -> Tuple[str, np.ndarray]:
+    """
+    Capture the button of a skill or retreat action before clicking it, as the reference for confirm_button.
+    """
+    roi_name = "skill_button" if action.action_type == ActionType.SKILL else "retreat_button"
+    return roi_name, capture_roi(roi_name).copy()
+
+def confirm_button(action: Action, button: Tuple[str, np.ndarray]) -> bool:
+    """
+    Wait until the clicked skill or retreat button changed state.
+
+    Args:
+        action (Action): The skill or retreat action.
+        button (Tuple[str, np.ndarray]): The reference from capture_button.
+
+    Returns:
+        bool: Whether the action was confirmed.
+    """
+    kind = action.action_type.name.lower()
+    roi_name, reference = button
+    return report_outcome(kind, action, wait_for_outcome(kind, button_changed(roi_name, reference), roi_name))
+
+if __name__ == "__main__":
+    # Usage and testing
+    from src.logic.action import DirectionType
+    from src.logic.locate_avatar import locate_avatar
+    from src.mumu.mumu_window import set_window
+    from src.mumu.mumu_simulator import SimulatedWindow
+
+    window = SimulatedWindow(["斑点"])
+    set_window(window)
+    action = Action(10, 0, ActionType.DEPLOY, "斑点", "D2", DirectionType.RIGHT)
+    locate_avatar(action)
+    logger.info(f"Deploy confirmed before deploying: {confirm_deploy(action)}")
+    window.strip.clear()
+    logger.info(f"Deploy confirmed after deploying: {confirm_deploy(action)}")
+    logger.info(metrics.format_table())
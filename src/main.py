@@ -1,36 +1,73 @@
+import time
+# When this module started loading, before the heavy imports, as the reference for a cold start
+START_TIME = time.time()
+
 import argparse
 import logging
+import os
 
 from src.logger import logger
 from src.excel import Excel, StatusColor
 from src.config import PerformActionConfig as actionconfig
+from src.config import DiagnosticsConfig as diagconfig
 from src.logic.perform_action import perform_action, PerformLateError, UserPausedError
-from src.logic.calc_view import transform_map_to_view
 from src.logic.game_time import GameTime
 from src.logic.action import ActionType
-from src.cache import get_map_by_code, get_map_by_name
+from src.cache import get_map_by_code, get_map_by_name, get_view_grids, prefetch_avatars, unpin_avatars, cache_stats
 from src.utils.error_to_log import ErrorToLog
 from src.logic.convert_pos import convert_position
 from src.logic.auto_enter import auto_enter
+from src.logic.analyze_time import cost_bar_reader
+from src.logic.game_state import game_state_classifier
+from src.logic.roster import roster
+from src.utils.trace import tracer
+from src.utils.metrics import metrics
+from src.utils.flight_recorder import flight_recorder
+
+def get_diagnostics_path(file_path, filename):
+    # Diagnostics are stored next to the Excel file
+    return os.path.join(os.path.dirname(os.path.abspath(file_path)), diagconfig.OUTPUT_DIR, filename)
+
+def dump_flight_recorder(file_path, filename, **info):
+    # Never let a failing dump hide the original error
+    try:
+        flight_recorder.dump(get_diagnostics_path(file_path, filename), **info)
+    except Exception as e:
+        logger.warning("Failed to dump flight recorder: %s", e)
 
-def main(file_path, debug, autoenter):
+def main(file_path, debug, autoenter, trace=diagconfig.TRACE_ENABLED, interactive=True, requested_at=None):
     # Set the logger level
     if debug:
         logger.setLevel(logging.DEBUG)
     else:
         logger.setLevel(logging.WARNING)
 
+    # Enable tracing if needed, one trace file per run
+    run_id = time.strftime("%Y%m%d_%H%M%S")
+    metrics.reset()
+    flight_recorder.clear()
+    cost_bar_reader.reset()
+    game_state_classifier.reset()
+    roster.reset()
+    if trace:
+        tracer.clear()
+        tracer.enable()
+
     try:
         # Establish the connection to the Excel file
-        logger.info(f"Excel file path: {file_path}")
+        logger.info("Excel file path: %s", file_path)
         excel = Excel(file_path)
     except Exception as e:
-        logger.error(f"Error occurred: {e}")
-        # Wait for key press to exit
-        logger.info("Press any key to exit.")
-        input()
+        logger.error("Error occurred: %s", e)
+        tracer.disable()
+        if interactive:
+            # Wait for key press to exit
+            logger.info("Press any key to exit.")
+            input()
         raise
 
+    # Read with the other settings below, and used again for the metrics history
+    map_code, map_name = None, None
     try:
         # Define the check pause closure
         def is_paused():
@@ -51,19 +88,19 @@ def main(file_path, debug, autoenter):
             GameTime.set_tick_max(max_tick)
         if wait_time1 is not None:
             actionconfig.MINIMUM_WAITTIME = wait_time1
-            logger.debug(f"Set minimum wait time to {actionconfig.MINIMUM_WAITTIME}")
+            logger.debug("Set minimum wait time to %s", actionconfig.MINIMUM_WAITTIME)
         if wait_time2 is not None:
             actionconfig.FRAME_WAITTIME = wait_time2
-            logger.debug(f"Set frame wait time to {actionconfig.FRAME_WAITTIME}")
+            logger.debug("Set frame wait time to %s", actionconfig.FRAME_WAITTIME)
         if wait_time3 is not None:
             actionconfig.GENERAL_WAITTIME = wait_time3
-            logger.debug(f"Set general wait time to {actionconfig.GENERAL_WAITTIME}")
+            logger.debug("Set general wait time to %s", actionconfig.GENERAL_WAITTIME)
         if bullet_threshold is not None:
             actionconfig.BULLET_THRESHOLD = bullet_threshold
-            logger.debug(f"Set bullet threshold to {actionconfig.BULLET_THRESHOLD}")
+            logger.debug("Set bullet threshold to %s", actionconfig.BULLET_THRESHOLD)
         if frame_threshold is not None:
             actionconfig.FRAME_THRESHOLD = frame_threshold
-            logger.debug(f"Set frame threshold to {actionconfig.FRAME_THRESHOLD}")
+            logger.debug("Set frame threshold to %s", actionconfig.FRAME_THRESHOLD)
 
         # Load map
         if map_name is not None:
@@ -73,8 +110,10 @@ def main(file_path, debug, autoenter):
         else:
             logger.error("No map specified.")
             raise ErrorToLog("未指定关卡。")
-        view_data_front = transform_map_to_view(map_data, False)
-        view_data_side = transform_map_to_view(map_data, True)
+        view_data_front, view_data_side = get_view_grids(map_data)
+
+        # Load the avatars of the operators of the script before the battle, and keep them for the whole run
+        prefetch_avatars(excel.get_deployed_operators(), pin=True)
 
         map_height, map_width = map_data["height"], map_data["width"]
 
@@ -86,13 +125,17 @@ def main(file_path, debug, autoenter):
         if autoenter and not excel.is_paused():
             auto_enter()
 
+        # Identify the cards of all operators of the script in the deploy strip at once
+        roster.start(excel.get_deployed_operators())
+
         # Main loop
         while not excel.is_paused():
             action = excel.get_current_action()
 
-            # Check if the action is valid
-            if not action.is_valid():
-                logger.warning(f"Invalid action: {action}")
+            # Check if the action is valid, as found when decoding the script
+            error = excel.get_action_error(excel.current_row)
+            if error is not None:
+                logger.warning("Invalid action: %s (%s)", action, error)
                 logger.info("Terminating the program")
                 break
 
@@ -104,49 +147,93 @@ def main(file_path, debug, autoenter):
                 operator_loc[action.oper] = action.tile_pos
                 if action.alias is not None:
                     operator_loc[action.alias] = action.tile_pos
-                logger.info(f"Memorized {action.oper} location at {operator_loc[action.oper]}")
+                logger.info("Memorized %s location at %s", action.oper, operator_loc[action.oper])
             else:
                 if action.tile_pos is None:
                     action.tile_pos = operator_loc[action.oper]
-                    logger.info(f"Auto set {action.oper} location to {action.tile_pos}")
+                    logger.info("Auto set %s location to %s", action.oper, action.tile_pos)
             
             # Tackle alias if needed
             if action.alias is not None:
                 operator_alias[action.alias] = action.oper
-                logger.info(f"Memorized {action.alias} as an alias of {action.oper}")
+                logger.info("Memorized %s as an alias of %s", action.alias, action.oper)
             
             if action.oper in operator_alias.keys():
-                logger.info(f"Detected alias, replace {action.oper} with {operator_alias[action.oper]}")
+                logger.info("Detected alias, replace %s with %s", action.oper, operator_alias[action.oper])
                 action.oper = operator_alias[action.oper]
 
             # Fetch view position
             action.view_pos_front = view_data_front[action.tile_pos[1]][action.tile_pos[0]]
             action.view_pos_side = view_data_side[action.tile_pos[1]][action.tile_pos[0]]
             
+            # Record how long it took from the request to the first action
+            if requested_at is not None:
+                metrics.histogram("first_action_ms", "ms").record((time.time() - requested_at) * 1000)
+                logger.info("First action %.3f seconds after the request", time.time() - requested_at)
+                requested_at = None
+
             # Perform the action
-            try:
-                perform_action(action, is_paused)
-                excel.set_result(StatusColor.SUCCESS)
-            except PerformLateError as e:
-                excel.set_result(StatusColor.WARNING)
-                if e.actual_time > e.scheduled_time + GameTime(1, 0):
-                    raise ErrorToLog(f"当前操作晚了超过一费。疑似发生错误。请求人工接管。")
-            except UserPausedError as e:
-                raise ErrorToLog("用户停止。", False)
-            except Exception as e:
-                excel.set_result(StatusColor.FAILURE)
-                raise
+            with tracer.span("action", row=excel.current_row + 1, scheduled_time=action.get_game_time()) as span:
+                try:
+                    perform_action(action, is_paused)
+                    excel.set_result(StatusColor.SUCCESS)
+                    span.args["actual_time"] = action.get_game_time()
+                except PerformLateError as e:
+                    excel.set_result(StatusColor.WARNING)
+                    span.args["actual_time"] = e.actual_time
+                    dump_flight_recorder(
+                        file_path, f"flight_{run_id}_row{excel.current_row + 1}.npz",
+                        reason="late", row=excel.current_row + 1, action=action,
+                        scheduled_time=e.scheduled_time, actual_time=e.actual_time,
+                    )
+                    if e.actual_time > e.scheduled_time + GameTime(1, 0):
+                        raise ErrorToLog(f"当前操作晚了超过一费。疑似发生错误。请求人工接管。")
+                except UserPausedError as e:
+                    raise ErrorToLog("用户停止。", False)
+                except Exception as e:
+                    excel.set_result(StatusColor.FAILURE)
+                    raise
 
             excel.next_action()
     except ErrorToLog as e:
-        logger.error(f"Error occurred: {e}")
+        logger.error("Error occurred: %s", e)
         excel.show_error(f"{e}")
+        if e.isError:
+            dump_flight_recorder(file_path, f"flight_{run_id}_error.npz", reason="error", row=excel.current_row + 1, error=e)
     except Exception as e:
-        logger.error(f"Error occurred: {e}")
+        logger.error("Error occurred: %s", e)
         excel.show_error(f"未定义错误：{e}")
+        dump_flight_recorder(file_path, f"flight_{run_id}_error.npz", reason="error", row=excel.current_row + 1, error=e)
     finally:
-        excel.set_paused()
-        if debug:
+        try:
+            excel.set_paused()
+        except Exception as e:
+            # e.g. the workbook was closed during the battle
+            logger.warning("Failed to set the script paused: %s", e)
+        unpin_avatars()
+
+        # Summarize the metrics of this run, and keep them for trend analysis
+        if logger.isEnabledFor(logging.INFO):
+            logger.info("Run summary:\n%s", metrics.format_table())
+            logger.info("Cache stats: %s", cache_stats())
+        # Never let failing diagnostics hide the original error, nor leave tracing on for the next run
+        try:
+            metrics.append_history(
+                get_diagnostics_path(file_path, diagconfig.METRICS_HISTORY_FILE),
+                run_id=run_id, file_path=file_path, map_code=map_code, map_name=map_name,
+            )
+        except Exception as e:
+            logger.warning("Failed to append the metrics history: %s", e)
+        if trace:
+            trace_path = get_diagnostics_path(file_path, f"trace_{run_id}.json")
+            try:
+                tracer.export(trace_path)
+                logger.info("Trace written to %s", trace_path)
+            except Exception as e:
+                logger.warning("Failed to write the trace: %s", e)
+            finally:
+                tracer.disable()
+        if debug and interactive:
             # Wait for key press to exit
             logger.info("Press any key to exit.")
             input()
@@ -157,6 +244,12 @@ if __name__ == '__main__':
     parser.add_argument('--xlsm', type=str, help='The path to the Excel file.')
     parser.add_argument('--debug', action='store_true', help='Run in debug mode.')
     parser.add_argument('--autoenter', action='store_true', help='Run in auto enter mode.')
+    parser.add_argument('--no-trace', action='store_true', help='Do not write the timing trace of this run.')
+    parser.add_argument('--daemon', action='store_true', help='Stay resident and run battles requested by clients, see src/daemon.py.')
 
     args = parser.parse_args()
-    main(args.xlsm, args.debug, args.autoenter)
\ No newline at end of file
+    if args.daemon:
+        from src.daemon import serve
+        serve(args.debug)
+    else:
+        main(args.xlsm, args.debug, args.autoenter, diagconfig.TRACE_ENABLED and not args.no_trace, requested_at=START_TIME)
\ No newline at end of file
@@ -1,35 +1,129 @@
 import win32gui
+import win32ui
 import win32con
+import win32api
 import ctypes
 import time
+import numpy as np
+from typing import List, Optional, Tuple
 
 from src.logger import logger
 from src.config import MuMuEmulatorConfig as config
 
-__all__ = ["HANDLE"]
+__all__ = ["WindowNotFoundException", "MuMuWindow", "find_windows"]
 
 class WindowNotFoundException(Exception):
     """Exception raised when the game window is not found."""
     pass
 
-# Global variables
-PARENT_HANDLE: int = win32gui.FindWindow(None, config.WINDOW_NAME)
-HANDLE: int = win32gui.FindWindowEx(PARENT_HANDLE, 0, None, config.SUB_WINDOW_NAME)
-if PARENT_HANDLE == 0 or HANDLE == 0:
-    logger.error(f"Failed to find the game window. Please open {config.WINDOW_NAME} and try again.")
-    raise WindowNotFoundException("Failed to find the game window.")
-else:
-    logger.info(f"Found the game window with handle {HANDLE}, parent handle {PARENT_HANDLE}.")
-
-# Restore the window if it is minimized
-if win32gui.IsIconic(PARENT_HANDLE):
-    win32gui.ShowWindow(PARENT_HANDLE, win32con.SW_RESTORE)
-    time.sleep(0.01)
-
 # Attempt to set the program to be DPI aware to get correct window dimensions
 try:
     # Set the process to be system DPI aware (2: Per-monitor DPI aware)
     ctypes.windll.shcore.SetProcessDpiAwareness(2)
 except Exception as e:
     # Ignore the error if the function call is not supported
-    logger.warning(f"Failed to set the program to be DPI aware: {e}")
+    logger.warning("Failed to set the program to be DPI aware: %s", e)
+
+def find_windows(window_name: str = config.WINDOW_NAME, sub_window_name: str = config.SUB_WINDOW_NAME) -> List[Tuple[str, int]]:
+    """
+    Find the game windows of all running MuMu instances.
+
+    Every instance has a top level window whose title starts with window_name (e.g. "MuMu模拟器12-1"),
+    holding the game in a child window named sub_window_name.
+
+    Returns:
+        List[Tuple[str, int]]: The title of each instance and the handle of its game window.
+    """
+    found = []
+    def callback(parent_handle, _):
+        title = win32gui.GetWindowText(parent_handle)
+        if title.startswith(window_name):
+            handle = win32gui.FindWindowEx(parent_handle, 0, None, sub_window_name)
+            if handle != 0:
+                found.append((title, handle))
+        return True
+    win32gui.EnumWindows(callback, None)
+    return sorted(found)
+
+class MuMuWindow:
+    """
+    Connection to a running MuMu emulator window, backed by win32 APIs.
+
+    This is the real backend behind mumu_vision and mumu_controller. Stand-in backends
+    (see mumu_simulator) expose the same get_rect / grab / send_message interface.
+
+    Args:
+        window_name (str, optional): Title of the emulator window, used when no handle is given.
+        sub_window_name (str, optional): Name of the game window inside the emulator window.
+        handle (int, optional): Handle of the game window of a specific instance, see find_windows.
+    """
+    def __init__(self, window_name: str = config.WINDOW_NAME, sub_window_name: str = config.SUB_WINDOW_NAME, handle: Optional[int] = None):
+        if handle is not None:
+            self.handle: int = handle if win32gui.IsWindow(handle) else 0
+            self.parent_handle: int = win32gui.GetParent(handle) if self.handle != 0 else 0
+        else:
+            self.parent_handle: int = win32gui.FindWindow(None, window_name)
+            self.handle: int = win32gui.FindWindowEx(self.parent_handle, 0, None, sub_window_name)
+        if self.parent_handle == 0 or self.handle == 0:
+            logger.error("Failed to find the game window. Please open %s and try again.", window_name)
+            raise WindowNotFoundException("Failed to find the game window.")
+        else:
+            logger.info("Found the game window with handle %s, parent handle %s.", self.handle, self.parent_handle)
+
+        # Restore the window if it is minimized
+        if win32gui.IsIconic(self.parent_handle):
+            win32gui.ShowWindow(self.parent_handle, win32con.SW_RESTORE)
+            time.sleep(0.01)
+
+    def get_rect(self) -> Tuple[int, int, int, int]:
+        """
+        Get the (left, top, right, bottom) screen rectangle of the game window.
+        """
+        return win32gui.GetWindowRect(self.handle)
+
+    def grab(self, rect: Tuple[int, int, int, int]) -> np.ndarray:
+        """
+        Copy an area of the game window into a BGRA image.
+
+        Args:
+            rect (Tuple[int, int, int, int]): (left, top, right, bottom) in window pixel coordinates.
+
+        Returns:
+            np.ndarray: The captured area, of shape (height, width, 4).
+        """
+        capture_left, capture_top, capture_right, capture_bottom = rect
+        capture_width, capture_height = capture_right - capture_left, capture_bottom - capture_top
+
+        try:
+            # Get the window's device context
+            window_dc = win32gui.GetWindowDC(self.handle)
+            mfcDC = win32ui.CreateDCFromHandle(window_dc)
+            saveDC = mfcDC.CreateCompatibleDC()
+
+            # Create a bitmap to hold the screenshot
+            saveBitMap = win32ui.CreateBitmap()
+            saveBitMap.CreateCompatibleBitmap(mfcDC, capture_width, capture_height)
+            saveDC.SelectObject(saveBitMap)
+
+            # Capture the specified area
+            saveDC.BitBlt((0, 0), (capture_width, capture_height), mfcDC, (capture_left, capture_top), win32con.SRCCOPY)
+
+            # Convert the bitmap to a NumPy array
+            bmpinfo = saveBitMap.GetInfo()
+            signedIntsArray = saveBitMap.GetBitmapBits(True)
+            img = np.frombuffer(signedIntsArray, dtype='uint8')
+            img.shape = (bmpinfo['bmHeight'], bmpinfo['bmWidth'], 4)
+        finally:
+            # Free resources
+            win32gui.DeleteObject(saveBitMap.GetHandle())
+            saveDC.DeleteDC()
+            mfcDC.DeleteDC()
+            win32gui.ReleaseDC(self.handle, window_dc)
+
+        return img
+
+    def send_message(self, msg: int, wparam: int, lparam: int) -> None:
+        """
+        Send a window message to the game window and wait for it to be processed.
+        """
+        win32api.SendMessage(self.handle, msg, wparam, lparam)
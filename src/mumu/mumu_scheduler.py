@@ -0,0 +1,111 @@
+"""
+mumu_scheduler.py
+This module issues controller inputs at precise times, for the timed pulses that step the game.
+
+The game runs between two inputs, e.g. from pause() to esc(), so how long it runs depends on the time
+between them. A plain time.sleep() in between overshoots by the OS sleep granularity and jitters by a
+frame or more. The scheduler instead issues every input at an absolute deadline measured from the first
+one: it sleeps until shortly before the deadline, then spins on the clock for the rest. The
+achieved times are recorded, so the jitter distribution shows up in the metrics and the trace.
+"""
+
+import time
+from typing import Callable, List, Sequence, Tuple
+
+from src.config import MuMuEmulatorConfig as config
+from src.utils.trace import tracer
+from src.utils.metrics import metrics
+from src.utils import clock
+
+# Public interface
+__all__ = ['InputScheduler', 'scheduler']
+
+class InputScheduler:
+    """
+    Issue inputs at absolute deadlines with a hybrid of sleeping and spinning.
+
+    The spin time starts at SCHEDULER_SPIN_TIME and grows, up to SCHEDULER_MAX_SPIN_TIME, whenever a sleep
+    overshoots past its deadline, so a coarse OS timer costs CPU instead of accuracy.
+
+    Usage:
+        scheduler.pulse("frame", pause, esc, 0.1)
+        scheduler.run("drag", [(0, pause), (0, lambda: mousedown(pos)), (0.02, esc)])
+    """
+    def __init__(self, spin_time: float = config.SCHEDULER_SPIN_TIME):
+        self.spin_time = spin_time
+        self.last: List[Tuple[float, float]] = []
+
+    def wait_until(self, deadline: float) -> float:
+        """
+        Wait until a clock.now() deadline.
+
+        Returns:
+            float: The time at which the wait ended, never before the deadline.
+        """
+        now = clock.now()
+        wake = deadline - self.spin_time
+        if now < wake:
+            clock.sleep(wake - now)
+            now = clock.now()
+            if now > deadline:
+                # The sleep overshot even the spin time, spin longer from now on
+                metrics.histogram("sleep_overshoot_ms", "ms").record((now - wake) * 1000)
+                self.spin_time = min((now - wake) * 1.25, config.SCHEDULER_MAX_SPIN_TIME)
+        while now < deadline:
+            now = clock.now()
+        return now
+
+    def run(self, name: str, events: Sequence[Tuple[float, Callable[[], None]]]) -> List[float]:
+        """
+        Issue a sequence of inputs, each at its offset from the start of the sequence.
+
+        The first input is issued right away and anchors the deadlines. The lateness of every later input
+        is recorded in the histogram "<name>_jitter_ms".
+
+        Args:
+            name (str): The name of the sequence, used in the trace and the metrics.
+            events (Sequence[Tuple[float, Callable[[], None]]]): The offset in seconds and the input of each event,
+                                                                  sorted by offset.
+
+        Returns:
+            List[float]: The achieved offset of each input, in seconds.
+        """
+        jitter = metrics.histogram(f"{name}_jitter_ms", "ms")
+        with tracer.span("schedule", sequence=name) as span:
+            start = clock.now()
+            achieved = []
+            for offset, issue in events:
+                issued = self.wait_until(start + offset) - start
+                issue()
+                if achieved:
+                    jitter.record((issued - offset) * 1000)
+                achieved.append(issued)
+            self.last = list(zip((offset for offset, _ in events), achieved))
+            span.args["achieved"] = [round(offset * 1000, 3) for offset in achieved]
+        return achieved
+
+    def pulse(self, name: str, start: Callable[[], None], end: Callable[[], None], duration: float) -> float:
+        """
+        Issue two inputs the given duration apart, e.g. resume and pause the game for one frame step.
+
+        Returns:
+            float: The achieved duration, in seconds.
+        """
+        return self.run(name, [(0, start), (duration, end)])[-1]
+
+scheduler = InputScheduler()
+
+if __name__ == "__main__":
+    # Usage and testing
+    # Compare the jitter of plain sleeps with the scheduler, without sending any input
+    samples = []
+    for _ in range(50):
+        start = time.perf_counter()
+        time.sleep(0.02)
+        samples.append((time.perf_counter() - start - 0.02) * 1000)
+    samples.sort()
+    print(f"time.sleep(0.02): p50 {samples[25]:.3f} ms, max {samples[-1]:.3f} ms late")
+
+    for _ in range(50):
+        scheduler.pulse("demo", lambda: None, lambda: None, 0.02)
+    print(metrics.format_table())
@@ -0,0 +1,331 @@
+"""
+mumu_simulator.py
+This module provides stand-in game window backends, for benchmarking and testing without a running emulator.
+Both backends expose the same get_rect / grab / send_message interface as mumu_connection.MuMuWindow,
+and can be activated with mumu_window.set_window.
+"""
+
+import cv2
+import numpy as np
+from typing import Any, Dict, List, Optional, Tuple
+
+from src.config import MuMuEmulatorConfig as config
+from src.config import GameRatioConfig as ratioconfig
+from src.config import ImageProcessingConfig as imgconfig
+from src.logic.game_time import GameTime
+from src.cache import get_avatars, get_view_grids
+from src.logic.calc_view import TileIndex
+from src.utils import clock
+
+__all__ = ["ReplayWindow", "SimulatedWindow"]
+
+def _to_bgra(frame: np.ndarray) -> np.ndarray:
+    if frame.ndim == 2:
+        return cv2.cvtColor(frame, cv2.COLOR_GRAY2BGRA)
+    if frame.shape[2] == 3:
+        return cv2.cvtColor(frame, cv2.COLOR_BGR2BGRA)
+    return frame
+
+def _ratio_rect(ratio: Tuple[float, float, float, float], width: int, height: int) -> Tuple[int, int, int, int]:
+    return (int(width * ratio[0]), int(height * ratio[1]), int(width * ratio[2]), int(height * ratio[3]))
+
+class ReplayWindow:
+    """
+    A stand-in window that serves recorded screenshots of the game window.
+
+    Every grab is served from the current frame; call advance to move to the next one.
+    Input messages are recorded but otherwise ignored.
+    """
+    def __init__(self, frames: List[np.ndarray]):
+        if not frames:
+            raise ValueError("ReplayWindow requires at least one frame.")
+        self.frames = [_to_bgra(frame) for frame in frames]
+        self.index = 0
+        self.messages: List[Tuple[int, int, int]] = []
+
+    def advance(self) -> None:
+        self.index = (self.index + 1) % len(self.frames)
+
+    def get_rect(self) -> Tuple[int, int, int, int]:
+        height, width = self.frames[self.index].shape[:2]
+        return (0, 0, width, height)
+
+    def grab(self, rect: Tuple[int, int, int, int]) -> np.ndarray:
+        left, top, right, bottom = rect
+        return np.ascontiguousarray(self.frames[self.index][top:bottom, left:right])
+
+    def send_message(self, msg: int, wparam: int, lparam: int) -> None:
+        self.messages.append((msg, wparam, lparam))
+
+class SimulatedWindow:
+    """
+    A stand-in window running a minimal simulation of a battle.
+
+    Game time advances with the active clock (see utils.clock) while the game is running, slowed down
+    while an operator is selected (bullet time). With a VirtualClock, grab_seconds stands for the time
+    taken by a capture, which also lets code polling the game time in a loop see it advance.
+
+    The cost bar, the cost number, the deploy strip, the deployed operators, the pause icon, the skill
+    and retreat buttons and the dimmed field in bullet time are rendered on every grab, so the regular vision code can
+    read them back.
+
+    Input messages follow the key mapping used by mumu_controller:
+        - pause(): toggles between running and paused
+        - esc(): pauses the game
+        - clicking a card in the deploy strip or a tile on the field selects it (bullet time)
+        - clicking the skill or retreat button performs the action on the selected operator,
+          a retreat returning the last deployed operator to the deploy strip
+        - dragging a card from the deploy strip to the field deploys the operator
+        - clicking the pause button toggles pause, clicking the speed button toggles 1x and 2x speed
+        - clicking the start button in the lobby (see enter_lobby) starts the battle after loading
+    """
+    TICKS_PER_SECOND = 30
+    SPEED = 2
+    BULLET_TIME_RATE = 0.2
+    CARD_WIDTH = 120
+    CARD_RAISE = 40
+    LOADING_SECONDS = 1.0
+
+    def __init__(
+        self,
+        opers: Optional[List[str]] = None,
+        start_time: GameTime = GameTime(10, 0),
+        size: Tuple[int, int] = imgconfig.SCREEN_STANDARD_SIZE,
+        background: Optional[np.ndarray] = None,
+        grab_seconds: float = 0.0,
+        level: Optional[Dict[str, Any]] = None,
+    ):
+        self.width, self.height = size
+        self.grab_seconds = grab_seconds
+        # With a level, deployed operators are placed on the tile under the drop point in the side view,
+        # and drawn on that tile in the front view, as the camera returns to it after a deploy
+        self.side_index = TileIndex(level, side=True) if level is not None else None
+        self.front_view = get_view_grids(level)[0] if level is not None else None
+        if background is not None:
+            self.background = _to_bgra(cv2.resize(background, size))
+        else:
+            self.background = np.full((self.height, self.width, 4), 40, dtype=np.uint8)
+        # The field is dimmed while an operator is selected in a running game (bullet time)
+        self.dimmed_background = self.background.copy()
+        self.dimmed_background[:, :, :3] //= 2
+        self.cards = list(opers or [])
+        self.card_images = {oper: get_avatars(oper)[0] for oper in self.cards}
+        self.events: List[Tuple[str, Optional[str], GameTime]] = []
+        self.reset(start_time)
+
+    def reset(self, start_time: GameTime) -> None:
+        """
+        Reset the battle to a paused state at the given game time, with all cards back in the strip.
+        """
+        self.ticks = float(start_time.ticks)
+        self.running = False
+        self.selected_card: Optional[int] = None
+        self.field_selected = False
+        self.strip = list(self.cards)
+        self.deployed: List[str] = []
+        self.deployed_at: Dict[str, Tuple[int, int]] = {}
+        self.drag_card: Optional[int] = None
+        self.drag_moved = False
+        self.events.clear()
+        self.speed = self.SPEED
+        self.lobby = False
+        self.loading_until: Optional[float] = None
+        self.last_update = clock.now()
+
+    def enter_lobby(self, start_time: GameTime) -> None:
+        """
+        Go back to the level's start screen. Clicking the start button shows a loading screen for
+        LOADING_SECONDS, after which the battle starts running at 1x speed from the given game time.
+        """
+        self.reset(start_time)
+        self.lobby = True
+        self.speed = 1
+
+    # Simulation
+
+    def _update(self) -> None:
+        now = clock.now()
+        if self.loading_until is not None and now >= self.loading_until:
+            # The battle starts running when the loading screen ends
+            self.lobby = False
+            self.running = True
+            self.last_update, self.loading_until = self.loading_until, None
+        if self.running:
+            rate = self.TICKS_PER_SECOND * self.speed
+            if self._bullet_time():
+                rate *= self.BULLET_TIME_RATE
+            self.ticks += (now - self.last_update) * rate
+        self.last_update = now
+
+    def _bullet_time(self) -> bool:
+        return self.selected_card is not None or self.field_selected or self.drag_card is not None
+
+    def game_time(self) -> GameTime:
+        """Get the ground truth game time of the simulation."""
+        self._update()
+        return GameTime(0, int(self.ticks))
+
+    def _card_rect(self, index: int) -> Tuple[int, int, int, int]:
+        # Cards are laid out from the bottom right of the strip, the first card being the rightmost
+        right = self.width - index * self.CARD_WIDTH
+        top = self.height - self.CARD_WIDTH
+        if index == self.selected_card:
+            top -= self.CARD_RAISE
+        return (right - self.CARD_WIDTH, top, right, top + self.CARD_WIDTH)
+
+    def _card_at(self, pos: Tuple[int, int]) -> Optional[int]:
+        for index in range(len(self.strip)):
+            left, top, right, bottom = self._card_rect(index)
+            if left <= pos[0] < right and top <= pos[1] < bottom:
+                return index
+        return None
+
+    def _near(self, pos: Tuple[int, int], ratio: Tuple[float, float]) -> bool:
+        return abs(pos[0] - ratio[0] * self.width) < 20 and abs(pos[1] - ratio[1] * self.height) < 20
+
+    def _in_strip(self, pos: Tuple[int, int]) -> bool:
+        return pos[1] >= self.height * ratioconfig.OPERATOR_AREA_RATIO[1]
+
+    def _placement(self, pos: Tuple[int, int]) -> Tuple[int, int]:
+        # The operator is placed on the tile the drop point was aimed at, above the finger by DEPLOY_DELTA_RATIO
+        if self.side_index is None:
+            return pos
+        tile = self.side_index.lookup((pos[0] / self.width, pos[1] / self.height - ratioconfig.DEPLOY_DELTA_RATIO))
+        if tile is None:
+            return pos
+        x, y = self.front_view[tile[1]][tile[0]]
+        return (int(x * self.width), int(y * self.height))
+
+    def _record(self, kind: str, oper: Optional[str]) -> None:
+        self.events.append((kind, oper, self.game_time()))
+
+    # Window backend interface
+
+    def get_rect(self) -> Tuple[int, int, int, int]:
+        return (0, 0, self.width, self.height)
+
+    def render(self) -> np.ndarray:
+        """Render the full game window as a BGRA image."""
+        self._update()
+        if self.lobby:
+            # Start screen and loading screen, without the battle HUD
+            return self.background.copy()
+        frame = (self.dimmed_background if self.running and self._bullet_time() else self.background).copy()
+
+        # Deployed operators, standing on the point where they were dropped
+        for oper, (x, y) in self.deployed_at.items():
+            avatar = self.card_images[oper]
+            left, top = max(x - avatar.shape[1] // 2, 0), max(y - avatar.shape[0], 0)
+            right, bottom = min(left + avatar.shape[1], self.width), min(top + avatar.shape[0], self.height)
+            frame[top:bottom, left:right] = cv2.cvtColor(avatar[:bottom - top, :right - left], cv2.COLOR_GRAY2BGRA)
+
+        # Pause icon: two bars while running, a play triangle while paused
+        left, top, right, bottom = _ratio_rect(ratioconfig.PAUSE_ICON_AREA_RATIO, self.width, self.height)
+        width, height = right - left, bottom - top
+        if self.running:
+            for bar_left in (left + width // 5, left + width * 3 // 5):
+                frame[top + height // 5:bottom - height // 5, bar_left:bar_left + width // 5] = 255
+        else:
+            triangle = np.array([
+                (left + width // 5, top + height // 5),
+                (left + width // 5, bottom - height // 5),
+                (right - width // 5, top + height // 2),
+            ], dtype=np.int32)
+            cv2.fillConvexPoly(frame, triangle, (255, 255, 255, 255))
+
+        # Cost bar and cost number
+        left, top, right, bottom = _ratio_rect(ratioconfig.COST_AREA_RATIO, self.width, self.height)
+        frame[top:bottom, left:right] = (20, 20, 20, 255)
+        game_time = GameTime(0, int(self.ticks))
+        fill = round(game_time.tick / (GameTime.TICK_MAX - 1) * (right - left))
+        frame[bottom - 3:bottom, left:left + fill] = 255
+        number_left = left + int((right - left) * ratioconfig.COST_NUMBER_AREA_RATIO[0])
+        number_bottom = top + int((bottom - top) * ratioconfig.COST_NUMBER_AREA_RATIO[3])
+        cv2.putText(frame, str(game_time.cost), (number_left + 4, number_bottom - 8),
+                    cv2.FONT_HERSHEY_SIMPLEX, 1.0, (255, 255, 255, 255), 2)
+
+        # Skill and retreat buttons, shown while an operator on the field is selected
+        if self.field_selected:
+            for ratio in (ratioconfig.SKILL_RATIO, ratioconfig.RETREAT_RATIO):
+                center = (int(ratio[0] * self.width), int(ratio[1] * self.height))
+                cv2.circle(frame, center, 24, (220, 220, 220, 255), -1)
+
+        # Deploy strip
+        for index, oper in enumerate(self.strip):
+            card_left, card_top, card_right, card_bottom = self._card_rect(index)
+            avatar = self.card_images[oper]
+            card = np.full((self.CARD_WIDTH, self.CARD_WIDTH), 90, dtype=np.uint8)
+            offset_y = (self.CARD_WIDTH - avatar.shape[0]) // 2
+            offset_x = (self.CARD_WIDTH - avatar.shape[1]) // 2
+            card[offset_y:offset_y + avatar.shape[0], offset_x:offset_x + avatar.shape[1]] = avatar
+            frame[card_top:card_bottom, card_left:card_right] = cv2.cvtColor(card, cv2.COLOR_GRAY2BGRA)
+        return frame
+
+    def grab(self, rect: Tuple[int, int, int, int]) -> np.ndarray:
+        left, top, right, bottom = rect
+        clock.sleep(self.grab_seconds)
+        return np.ascontiguousarray(self.render()[top:bottom, left:right])
+
+    def send_message(self, msg: int, wparam: int, lparam: int) -> None:
+        self._update()
+        pos = (lparam & 0xFFFF, (lparam >> 16) & 0xFFFF)
+        if self.lobby:
+            if msg == config.WM_LBUTTONUP and self.loading_until is None and self._near(pos, ratioconfig.START_BUTTON_RATIO):
+                self.loading_until = clock.now() + self.LOADING_SECONDS
+            return
+        if msg == config.WM_XBUTTONDOWN and wparam == config.XBUTTON2:
+            self.running = not self.running
+        elif msg == config.WM_XBUTTONDOWN and wparam == config.XBUTTON1:
+            self.running = False
+        elif msg == config.WM_LBUTTONDOWN:
+            self.drag_card = self._card_at(pos)
+            self.drag_moved = False
+        elif msg == config.WM_MOUSEMOVE:
+            self.drag_moved = True
+        elif msg == config.WM_LBUTTONUP:
+            self._mouse_up(pos)
+
+    def _mouse_up(self, pos: Tuple[int, int]) -> None:
+        drag_card, self.drag_card = self.drag_card, None
+        if drag_card is not None and self.drag_moved and not self._in_strip(pos):
+            # Dropping a card on the field deploys the operator
+            oper = self.strip.pop(drag_card)
+            self.deployed.append(oper)
+            self.deployed_at[oper] = self._placement(pos)
+            self.selected_card = None
+            self._record("deploy", oper)
+        elif drag_card is not None:
+            self.selected_card = drag_card
+            self.field_selected = False
+        elif self._near(pos, ratioconfig.PAUSE_BUTTON_RATIO):
+            self.running = not self.running
+        elif self._near(pos, ratioconfig.SPEED_BUTTON_RATIO):
+            self.speed = 3 - self.speed
+        elif self.drag_moved:
+            # Dragging on the field sets the direction of a deployed operator
+            self.field_selected = False
+        elif self.field_selected and self._near(pos, ratioconfig.SKILL_RATIO):
+            self.field_selected = False
+            self._record("skill", None)
+        elif self.field_selected and self._near(pos, ratioconfig.RETREAT_RATIO):
+            self.field_selected = False
+            if self.deployed:
+                oper = self.deployed.pop()
+                del self.deployed_at[oper]
+                self.strip.append(oper)
+            self._record("retreat", None)
+        elif not self._in_strip(pos):
+            self.selected_card = None
+            self.field_selected = True
+
+if __name__ == "__main__":
+    # Usage and testing
+    from src.mumu.mumu_window import set_window
+    from src.mumu.mumu_vision import capture_game_window
+
+    window = SimulatedWindow(["斑点"])
+    set_window(window)
+    img = capture_game_window(ratio=ratioconfig.OPERATOR_AREA_RATIO)
+    cv2.imshow("Simulated Window", img)
+    cv2.waitKey(0)
+    cv2.destroyAllWindows()
@@ -1,15 +1,234 @@
-import win32gui
-import win32ui
-import win32con
 import cv2
 import numpy as np
-from typing import Tuple, Optional
+from enum import Enum
+from typing import Dict, Tuple, Optional
 
 from src.config import ImageProcessingConfig as imgconfig
-from src.mumu.mumu_connection import HANDLE
+from src.mumu.mumu_window import get_window, window_geometry, ratio_to_rect
+from src.utils.trace import tracer
 
-__all__ = ["capture_game_window"]
+__all__ = ["CaptureMode", "Roi", "Snapshot", "register_roi", "get_roi", "capture_roi", "capture_snapshot", "snapshot_from_image", "capture_game_window"]
 
+def check_ratio(ratio: Tuple[float, float, float, float]) -> None:
+    """
+    Check that a ratio is a valid (left, top, right, bottom) area of the window.
+
+    Raises:
+        ValueError: If the ratio is invalid.
+    """
+    if len(ratio) != 4:
+        raise ValueError(f"Ratio must be a tuple of 4 floats, given as (left, top, right, bottom). However, {ratio} was given.")
+    if not all(0 <= x <= 1 for x in ratio):
+        raise ValueError(f"Ratio values must be between 0 and 1. However, {ratio} was given.")
+    if ratio[0] >= ratio[2] or ratio[1] >= ratio[3]:
+        raise ValueError(f"Invalid ratio values. Left and top must be less than right and bottom. However, {ratio} was given.")
+
+class CaptureMode(Enum):
+    GRAY = "gray" # grayscale at native resolution
+    BINARY = "binary" # thresholded grayscale at native resolution
+    STANDARD = "standard" # grayscale resized to SCREEN_STANDARD_SIZE coordinates
+
+class Roi:
+    """
+    A named region of interest of the game window, with its preferred processing.
+
+    The converted images are written into buffers owned by the ROI, which are only reallocated when
+    the window size changes. A captured image is therefore overwritten by the next capture of the
+    same ROI; copy it if it must be kept.
+
+    Attributes:
+        name (str): Name of the ROI.
+        ratio (Tuple[float, float, float, float]): Relative (left, top, right, bottom) area of the window.
+        mode (CaptureMode): Processing of the captured area.
+        threshold (int): Threshold of the BINARY mode.
+        gray (np.ndarray): Grayscale image of the last capture, at native resolution.
+        image (np.ndarray): Processed image of the last capture.
+    """
+    def __init__(self, name: str, ratio: Tuple[float, float, float, float], mode: CaptureMode, threshold: int):
+        check_ratio(ratio)
+        self.name = name
+        self.ratio = ratio
+        self.mode = mode
+        self.threshold = threshold
+        self.gray: Optional[np.ndarray] = None
+        self.image: Optional[np.ndarray] = None
+
+    def convert(self, bgra: np.ndarray, window_width: int, window_height: int) -> np.ndarray:
+        """
+        Convert a captured BGRA area into the preallocated buffers of the ROI.
+
+        Returns:
+            np.ndarray: The processed image.
+        """
+        height, width = bgra.shape[:2]
+        if self.gray is None or self.gray.shape != (height, width):
+            self.gray = np.empty((height, width), dtype=np.uint8)
+        cv2.cvtColor(bgra, cv2.COLOR_BGRA2GRAY, dst=self.gray)
+
+        if self.mode == CaptureMode.GRAY:
+            self.image = self.gray
+        elif self.mode == CaptureMode.BINARY:
+            if self.image is None or self.image.shape != (height, width):
+                self.image = np.empty((height, width), dtype=np.uint8)
+            cv2.threshold(self.gray, self.threshold, 255, cv2.THRESH_BINARY, dst=self.image)
+        elif self.mode == CaptureMode.STANDARD:
+            standardized_width = width * imgconfig.SCREEN_STANDARD_SIZE[0] // window_width
+            standardized_height = height * imgconfig.SCREEN_STANDARD_SIZE[1] // window_height
+            if self.image is None or self.image.shape != (standardized_height, standardized_width):
+                self.image = np.empty((standardized_height, standardized_width), dtype=np.uint8)
+            cv2.resize(self.gray, (standardized_width, standardized_height), dst=self.image)
+        else:
+            raise ValueError(f"Invalid capture mode: {self.mode}")
+        return self.image
+
+# Registered ROIs by name
+_rois: Dict[str, Roi] = {}
+
+def register_roi(
+    name: str,
+    ratio: Tuple[float, float, float, float],
+    mode: CaptureMode = CaptureMode.GRAY,
+    threshold: int = imgconfig.WHITE_THRESHOLD,
+) -> Roi:
+    """
+    Register a named region of interest, to be captured with capture_roi.
+    Registering an existing name again replaces it.
+
+    Args:
+        name (str): Name of the ROI.
+        ratio (Tuple[float, float, float, float]): Relative (left, top, right, bottom) area of the window.
+        mode (CaptureMode, optional): Processing of the captured area. Defaults to CaptureMode.GRAY.
+        threshold (int, optional): Threshold of the BINARY mode. Defaults to WHITE_THRESHOLD.
+
+    Returns:
+        Roi: The registered ROI.
+    """
+    roi = Roi(name, ratio, mode, threshold)
+    _rois[name] = roi
+    return roi
+
+def get_roi(name: str) -> Roi:
+    """
+    Get a registered ROI by name.
+
+    Raises:
+        KeyError: If no ROI is registered with the name.
+    """
+    return _rois[name]
+
+class Snapshot:
+    """
+    A single grab of the union of several ROIs, taken at one decision point.
+
+    Each ROI is served as a zero-copy view into the grabbed area, so consumers of the same snapshot
+    share one BitBlt and also see the exact same frame.
+
+    Usage:
+        snapshot = capture_snapshot("cost", "operator")
+        game_time = get_game_time(snapshot)
+        locate_avatar(action, snapshot)
+    """
+    def __init__(self, bgra: np.ndarray, origin: Tuple[int, int], rects: Dict[str, Tuple[int, int, int, int]], window_size: Tuple[int, int]):
+        self.bgra = bgra
+        self.origin = origin
+        self.rects = rects
+        self.window_size = window_size
+
+    def view(self, name: str) -> np.ndarray:
+        """
+        Get the BGRA view of a ROI in the snapshot, without copying.
+
+        Raises:
+            KeyError: If the ROI is not part of the snapshot.
+        """
+        left, top, right, bottom = self.rects[name]
+        origin_left, origin_top = self.origin
+        return self.bgra[top - origin_top:bottom - origin_top, left - origin_left:right - origin_left]
+
+    def capture(self, name: str) -> np.ndarray:
+        """
+        Process a ROI of the snapshot according to its mode, as capture_roi does for a fresh grab.
+        """
+        with tracer.span("convert", roi=name):
+            return _rois[name].convert(self.view(name), *self.window_size)
+
+def capture_snapshot(*names: str) -> Snapshot:
+    """
+    Grab the bounding union of the given ROIs once.
+
+    Args:
+        names (str): Names of the ROIs needed at this decision point.
+
+    Returns:
+        Snapshot: The grabbed area, serving a view of each ROI.
+
+    Raises:
+        KeyError: If a ROI is not registered.
+        WindowNotFoundException: If the window is not found.
+    """
+    window = get_window()
+    window_width, window_height = window_geometry.size()
+    rects = {name: window_geometry.rect(_rois[name].ratio) for name in names}
+    union = (
+        min(rect[0] for rect in rects.values()),
+        min(rect[1] for rect in rects.values()),
+        max(rect[2] for rect in rects.values()),
+        max(rect[3] for rect in rects.values()),
+    )
+    with tracer.span("grab", rect=union, rois=",".join(names)):
+        bgra = window.grab(union)
+    return Snapshot(bgra, union[:2], rects, (window_width, window_height))
+
+def snapshot_from_image(bgra: np.ndarray, *names: str) -> Snapshot:
+    """
+    Wrap an image of the whole game window, e.g. a frame of a recorded video, as a snapshot of the given ROIs.
+    The image is not copied.
+
+    Args:
+        bgra (np.ndarray): The BGRA image of the whole window.
+        names (str): Names of the ROIs served by the snapshot.
+
+    Returns:
+        Snapshot: The snapshot, whose window size is the size of the image.
+
+    Raises:
+        KeyError: If a ROI is not registered.
+    """
+    height, width = bgra.shape[:2]
+    rects = {name: ratio_to_rect(_rois[name].ratio, width, height) for name in names}
+    return Snapshot(bgra, (0, 0), rects, (width, height))
+
+def capture_roi(name: str, snapshot: Optional[Snapshot] = None) -> np.ndarray:
+    """
+    Capture a registered ROI of the game window, processed according to its mode.
+
+    Only the ROI itself is grabbed and converted, directly into the buffers of the ROI.
+    The returned image is overwritten by the next capture of the same ROI.
+
+    Args:
+        name (str): Name of the ROI.
+        snapshot (Snapshot, optional): A snapshot containing the ROI, used instead of grabbing again.
+
+    Returns:
+        np.ndarray: The processed image.
+
+    Raises:
+        KeyError: If no ROI is registered with the name.
+        WindowNotFoundException: If the window is not found.
+    """
+    if snapshot is not None:
+        return snapshot.capture(name)
+
+    roi = _rois[name]
+    with tracer.span("capture", roi=name):
+        window = get_window()
+        window_width, window_height = window_geometry.size()
+        rect = window_geometry.rect(roi.ratio)
+        with tracer.span("grab", rect=rect):
+            img = window.grab(rect)
+        return roi.convert(img, window_width, window_height)
+
+@tracer.wrap("capture")
 def capture_game_window(ratio: Optional[Tuple[float, float, float, float]] = None) -> np.array:
     """
     Take a screenshot of a specific window and a specific area.
@@ -30,58 +249,26 @@ def capture_game_window(ratio: Optional[Tuple[float, float, float, float]] = Non
         ratio = (0, 0, 1, 1)
 
     # Check if ratio is valid
-    if len(ratio) != 4:
-        raise ValueError(f"Ratio must be a tuple of 4 floats, given as (left, top, right, bottom). However, {ratio} was given.")
-    if not all(0 <= x <= 1 for x in ratio):
-        raise ValueError(f"Ratio values must be between 0 and 1. However, {ratio} was given.")
-    if ratio[0] >= ratio[2] or ratio[1] >= ratio[3]:
-        raise ValueError(f"Invalid ratio values. Left and top must be less than right and bottom. However, {ratio} was given.")
+    check_ratio(ratio)
 
     # Calculate the area to capture
-    left, top, right, bottom = win32gui.GetWindowRect(HANDLE)
-    window_width = right - left
-    window_height = bottom - top
-    rect = (int(window_width * ratio[0]), int(window_height * ratio[1]), 
-            int(window_width * ratio[2]), int(window_height * ratio[3]))
-
-    try:
-        # Get the window's device context
-        window_dc = win32gui.GetWindowDC(HANDLE)
-        mfcDC = win32ui.CreateDCFromHandle(window_dc)
-        saveDC = mfcDC.CreateCompatibleDC()
-
-        # Calculate the dimensions and position of the area to capture
-        capture_left, capture_top, capture_right, capture_bottom = rect
-        capture_width, capture_height = capture_right - capture_left, capture_bottom - capture_top
-
-        # Create a bitmap to hold the screenshot
-        saveBitMap = win32ui.CreateBitmap()
-        saveBitMap.CreateCompatibleBitmap(mfcDC, capture_width, capture_height)
-        saveDC.SelectObject(saveBitMap)
-
-        # Capture the specified area
-        saveDC.BitBlt((0, 0), (capture_width, capture_height), mfcDC, (capture_left, capture_top), win32con.SRCCOPY)
-
-        # Convert the bitmap to a NumPy array
-        bmpinfo = saveBitMap.GetInfo()
-        signedIntsArray = saveBitMap.GetBitmapBits(True)
-        img = np.frombuffer(signedIntsArray, dtype='uint8')
-        img.shape = (bmpinfo['bmHeight'], bmpinfo['bmWidth'], 4)
-
-        # Note: Decide to use grayscale for better performance and image processing
-        # Convert from BGRA to grayscale
-        img = cv2.cvtColor(img, cv2.COLOR_BGRA2GRAY)
-
-        # Resize the image to standard size
-        standardized_width = capture_width * imgconfig.SCREEN_STANDARD_SIZE[0] // window_width
-        standardized_height = capture_height * imgconfig.SCREEN_STANDARD_SIZE[1] // window_height
-        img = cv2.resize(img, (standardized_width, standardized_height))
-    finally:
-        # Free resources
-        win32gui.DeleteObject(saveBitMap.GetHandle())
-        saveDC.DeleteDC()
-        mfcDC.DeleteDC()
-        win32gui.ReleaseDC(HANDLE, window_dc)
+    window = get_window()
+    window_width, window_height = window_geometry.size()
+    rect = ratio_to_rect(ratio, window_width, window_height)
+    capture_width, capture_height = rect[2] - rect[0], rect[3] - rect[1]
+
+    # Capture the specified area as BGRA
+    with tracer.span("grab", rect=rect):
+        img = window.grab(rect)
+
+    # Note: Decide to use grayscale for better performance and image processing
+    # Convert from BGRA to grayscale
+    img = cv2.cvtColor(img, cv2.COLOR_BGRA2GRAY)
+
+    # Resize the image to standard size
+    standardized_width = capture_width * imgconfig.SCREEN_STANDARD_SIZE[0] // window_width
+    standardized_height = capture_height * imgconfig.SCREEN_STANDARD_SIZE[1] // window_height
+    img = cv2.resize(img, (standardized_width, standardized_height))
 
     # Return the image
     return img
@@ -97,7 +284,14 @@ if __name__ == "__main__":
     end_time = time()
     logger.info(f"Time taken: {end_time - start_time:.4f} seconds")
     
+    register_roi("cost", ratioconfig.COST_AREA_RATIO, CaptureMode.BINARY)
+    start_time = time()
+    binary = capture_roi("cost")
+    end_time = time()
+    logger.info(f"Time taken (ROI): {end_time - start_time:.4f} seconds")
+
     # Display the image
     cv2.imshow("Game Window", img)
+    cv2.imshow("Cost ROI", binary)
     cv2.waitKey(0)
     cv2.destroyAllWindows()
@@ -0,0 +1,141 @@
+"""
+mumu_window.py
+This module holds the game window backend shared by mumu_vision and mumu_controller, and the cached
+geometry of the window used by both to convert ratios to pixels.
+"""
+
+import math
+import time
+from typing import Dict, Optional, Tuple
+
+from src.config import MuMuEmulatorConfig as config
+from src.config import GameRatioConfig as ratioconfig
+
+__all__ = ["get_window", "set_window", "ratio_to_rect", "WindowGeometry", "window_geometry"]
+
+# The active window backend, connected on first use
+_window = None
+
+def get_window():
+    """
+    Get the active game window backend, connecting to the MuMu emulator on first use.
+
+    Returns:
+        The window backend, providing get_rect, grab and send_message.
+
+    Raises:
+        WindowNotFoundException: If no backend is set and the emulator window is not found.
+    """
+    global _window
+    if _window is None:
+        # Import lazily so that stand-in backends do not require win32 or a running emulator
+        from src.mumu.mumu_connection import MuMuWindow
+        _window = MuMuWindow()
+    return _window
+
+def set_window(window: Optional[object]) -> None:
+    """
+    Replace the active game window backend, e.g. with a stand-in from mumu_simulator.
+    Passing None makes the next get_window call reconnect to the emulator.
+    """
+    global _window
+    _window = window
+    window_geometry.invalidate()
+
+def ratio_to_rect(ratio: Tuple[float, float, float, float], window_width: int, window_height: int) -> Tuple[int, int, int, int]:
+    """
+    Convert a ratio area to a (left, top, right, bottom) rectangle in window pixel coordinates.
+    """
+    return (int(window_width * ratio[0]), int(window_height * ratio[1]),
+            int(window_width * ratio[2]), int(window_height * ratio[3]))
+
+# The fixed (x, y) points of GameRatioConfig, converted to pixels whenever the window size changes
+FIXED_POINTS = tuple(
+    value for name, value in vars(ratioconfig).items()
+    if name.endswith("_RATIO") and isinstance(value, tuple) and len(value) == 2
+)
+
+class WindowGeometry:
+    """
+    The size of the game window, checked at most once per GEOMETRY_TTL, with the pixel positions derived from it.
+
+    Every click and every capture needs the window size, and asking the window for it is a system call.
+    The size is instead cached and checked again once it is older than the TTL, or right away after
+    invalidate(), e.g. when the window backend is replaced. When the size changed, the fixed points of
+    GameRatioConfig are converted again, and the converted areas are dropped.
+
+    Usage:
+        width, height = window_geometry.size()
+        x, y = window_geometry.point(ratioconfig.PAUSE_BUTTON_RATIO)
+        rect = window_geometry.rect(ratioconfig.COST_AREA_RATIO)
+    """
+    def __init__(self, ttl: float = config.GEOMETRY_TTL):
+        self.ttl = ttl
+        self.invalidate()
+
+    def invalidate(self) -> None:
+        """Check the window size again on the next use."""
+        self._size: Optional[Tuple[int, int]] = None
+        self._checked = -math.inf
+        self._points: Dict[Tuple[float, float], Tuple[int, int]] = {}
+        self._rects: Dict[Tuple[float, float, float, float], Tuple[int, int, int, int]] = {}
+
+    def size(self) -> Tuple[int, int]:
+        """
+        Get the (width, height) of the game window.
+
+        Raises:
+            WindowNotFoundException: If the window is not found.
+        """
+        now = time.perf_counter()
+        if now - self._checked >= self.ttl:
+            left, top, right, bottom = get_window().get_rect()
+            self._checked = now
+            size = (right - left, bottom - top)
+            if size != self._size:
+                self._size = size
+                self._rects = {}
+                self._points = {ratio: self._to_pixels(ratio) for ratio in FIXED_POINTS}
+        return self._size
+
+    def _to_pixels(self, pos: Tuple[float, float]) -> Tuple[int, int]:
+        return (int(pos[0] * self._size[0]), int(pos[1] * self._size[1]))
+
+    def point(self, pos: Tuple[float, float]) -> Tuple[int, int]:
+        """
+        Convert an (x, y) ratio to pixel coordinates. Fixed points of GameRatioConfig are looked up.
+        """
+        self.size()
+        cached = self._points.get(pos) if isinstance(pos, tuple) else None
+        return cached if cached is not None else self._to_pixels(pos)
+
+    def rect(self, ratio: Tuple[float, float, float, float]) -> Tuple[int, int, int, int]:
+        """
+        Convert a (left, top, right, bottom) ratio area to a rectangle in pixel coordinates, cached per window size.
+        """
+        size = self.size()
+        rect = self._rects.get(ratio)
+        if rect is None:
+            rect = self._rects[ratio] = ratio_to_rect(ratio, *size)
+        return rect
+
+window_geometry = WindowGeometry()
+
+if __name__ == "__main__":
+    # Usage and testing
+    from src.mumu.mumu_simulator import SimulatedWindow
+
+    class CountingWindow(SimulatedWindow):
+        calls = 0
+
+        def get_rect(self):
+            CountingWindow.calls += 1
+            return super().get_rect()
+
+    set_window(CountingWindow())
+    start = time.perf_counter()
+    for _ in range(10000):
+        window_geometry.point(ratioconfig.PAUSE_BUTTON_RATIO)
+        window_geometry.rect(ratioconfig.COST_AREA_RATIO)
+    print(f"20000 conversions in {(time.perf_counter() - start) * 1000:.3f} ms, {CountingWindow.calls} get_rect calls")
+    print(f"Pause button at {window_geometry.point(ratioconfig.PAUSE_BUTTON_RATIO)}, cost area at {window_geometry.rect(ratioconfig.COST_AREA_RATIO)}")
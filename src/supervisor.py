@@ -0,0 +1,230 @@
+"""
+supervisor.py
+Run several battles in parallel, one worker process per emulator instance.
+
+Usage:
+    python -m src.supervisor --xlsm A.xlsm --xlsm B.xlsm [--autoenter] [--cpus-per-instance N]
+    python -m src.supervisor --simulate N [--actions N] [--cpus-per-instance N]
+
+The window backend, the ROI buffers, the cost bar reader, the game state classifier and the metrics
+are module-level state of a process, so every battle runs in its own worker process with its own copy
+of them. The i-th script drives the i-th running MuMu instance, sorted by window title. Every worker is
+pinned to its share of the CPU cores, and OpenCV and Tesseract are limited to as many threads, so the
+capture and OCR of one instance can not starve the others.
+
+With --simulate, each worker drives a simulated game window through a series of deploy, skill and
+retreat actions instead, which runs several instances side by side without any emulator or Excel.
+
+The exit code is 1 if any battle failed, or with --simulate, if any action was not performed on time.
+"""
+
+import argparse
+import dataclasses
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional
+
+from src.logger import logger
+
+SIMULATED_OPER = "斑点"
+SIMULATED_MAP = "1-7"
+SIMULATED_POS = "D2"
+
+
+@dataclasses.dataclass
+class InstanceJob:
+    """
+    A battle to run in a worker process.
+
+    Attributes:
+        name (str): Name of the instance, e.g. the title of its emulator window.
+        cpus (List[int]): The CPU cores the worker may use.
+        file_path (str, optional): The Excel file of the battle script.
+        handle (int, optional): The handle of the game window, see mumu_connection.find_windows.
+        autoenter (bool): Whether to enter the battle automatically.
+        simulated_actions (int): Number of actions to perform against a simulated game window instead.
+    """
+    name: str
+    cpus: List[int]
+    file_path: Optional[str] = None
+    handle: Optional[int] = None
+    autoenter: bool = False
+    simulated_actions: int = 0
+
+
+@dataclasses.dataclass
+class InstanceResult:
+    """
+    The outcome of a battle run by a worker process.
+    """
+    name: str
+    actions: int = 0
+    on_time: int = 0
+    seconds: float = 0.0
+    capture_p50_ms: Optional[float] = None
+    error: Optional[str] = None
+
+
+def allocate_cpus(count: int, cpus_per_instance: Optional[int] = None) -> List[List[int]]:
+    """
+    Split the CPU cores between the instances, each getting a contiguous share.
+
+    Args:
+        count (int): Number of instances.
+        cpus_per_instance (int, optional): Cores per instance. Defaults to an even split, at least one.
+
+    Returns:
+        List[List[int]]: The cores of each instance. Shares wrap around when there are more instances than cores.
+    """
+    cpu_count = os.cpu_count() or 1
+    per_instance = cpus_per_instance or max(1, cpu_count // count)
+    return [[(i * per_instance + k) % cpu_count for k in range(per_instance)] for i in range(count)]
+
+
+def limit_cpu(cpus: List[int]) -> None:
+    """
+    Restrict the current process to the given cores, and the capture and OCR libraries to as many threads.
+    """
+    # Read by Tesseract when it is loaded, so this must happen before the OCR module is imported
+    os.environ["OMP_THREAD_LIMIT"] = str(len(cpus))
+    try:
+        if hasattr(os, "sched_setaffinity"):
+            os.sched_setaffinity(0, cpus)
+        else:
+            import win32api
+            import win32process
+            mask = sum(1 << cpu for cpu in set(cpus))
+            win32process.SetProcessAffinityMask(win32api.GetCurrentProcess(), mask)
+    except Exception as e:
+        logger.warning("Failed to set the CPU affinity to %s: %s", cpus, e)
+    import cv2
+    cv2.setNumThreads(len(cpus))
+
+
+def run_simulated(actions: int) -> None:
+    """
+    Perform deploy, skill and retreat actions in turn against a simulated game window, one cost apart.
+    """
+    from src.cache import get_map_by_code, get_view_grids
+    from src.logic.action import Action, ActionType, DirectionType
+    from src.logic.convert_pos import convert_position
+    from src.logic.game_time import GameTime
+    from src.logic.perform_action import perform_action, PerformLateError
+    from src.mumu.mumu_simulator import SimulatedWindow
+    from src.mumu.mumu_window import set_window
+
+    map_data = get_map_by_code(SIMULATED_MAP)
+    view_data_front, view_data_side = get_view_grids(map_data)
+    window = SimulatedWindow([SIMULATED_OPER])
+    set_window(window)
+    action_types = (ActionType.DEPLOY, ActionType.SKILL, ActionType.RETREAT)
+    for i in range(actions):
+        start_time = GameTime(10, 0)
+        window.reset(start_time)
+        target_time = start_time + GameTime(1, 0)
+        action = Action(target_time.cost, target_time.tick, action_types[i % len(action_types)], SIMULATED_OPER, SIMULATED_POS, DirectionType.RIGHT)
+        convert_position(action, map_data["height"], map_data["width"])
+        action.view_pos_front = view_data_front[action.tile_pos[1]][action.tile_pos[0]]
+        action.view_pos_side = view_data_side[action.tile_pos[1]][action.tile_pos[0]]
+        try:
+            perform_action(action, lambda: False)
+        except PerformLateError as e:
+            logger.warning("%s performed late: %s", action.action_type.name, e)
+
+
+def run_instance(job: InstanceJob) -> InstanceResult:
+    """
+    Run a battle in the current worker process. This is the entry point of every worker.
+    """
+    limit_cpu(job.cpus)
+    # Imported after limiting the CPU, so that the OCR is loaded with the thread limit
+    from src.utils.metrics import metrics
+
+    result = InstanceResult(job.name)
+    start = time.perf_counter()
+    try:
+        if job.simulated_actions:
+            logger.setLevel(logging.WARNING)
+            metrics.reset()
+            run_simulated(job.simulated_actions)
+        else:
+            from src.main import main
+            from src.mumu.mumu_connection import MuMuWindow
+            from src.mumu.mumu_window import set_window
+            set_window(MuMuWindow(handle=job.handle))
+            main(job.file_path, False, job.autoenter, interactive=False)
+    except Exception as e:
+        logger.error("Instance %s failed: %s", job.name, e)
+        result.error = f"{type(e).__name__}: {e}"
+    result.seconds = time.perf_counter() - start
+
+    summary = metrics.summary()
+    result.on_time = summary.get("actions_on_time", {}).get("value", 0)
+    result.actions = result.on_time + summary.get("actions_late", {}).get("value", 0)
+    result.capture_p50_ms = summary.get("get_game_time_ms", {}).get("p50")
+    return result
+
+
+def supervise(jobs: List[InstanceJob]) -> List[InstanceResult]:
+    """
+    Run the jobs in parallel, one worker process each, and report the throughput.
+    """
+    start = time.perf_counter()
+    # Spawn rather than fork, as the parent already runs the logging thread
+    with ProcessPoolExecutor(max_workers=len(jobs), mp_context=multiprocessing.get_context("spawn")) as executor:
+        results = list(executor.map(run_instance, jobs))
+    wall = time.perf_counter() - start
+
+    print(format_report(results, wall))
+    return results
+
+
+def format_report(results: List[InstanceResult], wall: float) -> str:
+    """
+    Format the throughput of every instance and of the whole run as a plain text table.
+    """
+    lines = [f"{'instance':<20}{'actions':>9}{'on time':>9}{'seconds':>10}{'per min':>9}{'time p50':>10}  error"]
+    for result in results:
+        per_minute = result.actions / result.seconds * 60 if result.seconds else 0
+        capture = f"{result.capture_p50_ms:>10.3f}" if result.capture_p50_ms is not None else f"{'-':>10}"
+        lines.append(f"{result.name:<20}{result.actions:>9d}{result.on_time:>9d}{result.seconds:>10.2f}{per_minute:>9.1f}{capture}  {result.error or ''}")
+    actions = sum(result.actions for result in results)
+    busy = sum(result.seconds for result in results)
+    lines.append(f"{'total':<20}{actions:>9d}{sum(result.on_time for result in results):>9d}{wall:>10.2f}{actions / wall * 60 if wall else 0:>9.1f}")
+    lines.append(f"Parallel speedup: {busy / wall if wall else 0:.2f}x over running the instances one after another")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="PRTS+ multi-instance supervisor")
+    parser.add_argument("--xlsm", type=str, action="append", default=[], help="The Excel file of a battle. Repeat for every instance.")
+    parser.add_argument("--autoenter", action="store_true", help="Enter the battles automatically.")
+    parser.add_argument("--simulate", type=int, default=0, help="Run this many simulated instances instead.")
+    parser.add_argument("--actions", type=int, default=6, help="Number of actions per simulated instance.")
+    parser.add_argument("--cpus-per-instance", type=int, default=None, help="CPU cores per instance. Defaults to an even split.")
+    args = parser.parse_args()
+
+    if args.simulate:
+        names = [f"simulated-{i + 1}" for i in range(args.simulate)]
+        cpus = allocate_cpus(len(names), args.cpus_per_instance)
+        jobs = [InstanceJob(name, cpus[i], simulated_actions=args.actions) for i, name in enumerate(names)]
+    else:
+        from src.mumu.mumu_connection import find_windows
+        windows = find_windows()
+        if len(windows) < len(args.xlsm):
+            parser.error(f"{len(args.xlsm)} scripts given, but only {len(windows)} MuMu instances are running.")
+        cpus = allocate_cpus(len(args.xlsm), args.cpus_per_instance)
+        jobs = [
+            InstanceJob(title, cpus[i], file_path=os.path.abspath(file_path), handle=handle, autoenter=args.autoenter)
+            for i, (file_path, (title, handle)) in enumerate(zip(args.xlsm, windows))
+        ]
+    if not jobs:
+        parser.error("Give at least one --xlsm, or --simulate N.")
+    results = supervise(jobs)
+    failed = [result.name for result in results if result.error or (args.simulate and result.on_time < args.actions)]
+    if failed:
+        print(f"Failed instances: {', '.join(failed)}")
+    raise SystemExit(1 if failed else 0)
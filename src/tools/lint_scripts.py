@@ -0,0 +1,323 @@
+"""
+lint_scripts.py
+Check many battle scripts at once, without Excel or the emulator, and report every problem in one go.
+
+Usage:
+    python -m src.tools.lint_scripts PATH [PATH ...] [--workers N] [--json REPORT]
+    python -m src.tools.lint_scripts --self-check
+
+A PATH is a workbook, or a directory searched for .xlsm and .xlsx workbooks. The sheet "作战记录" of
+every workbook is read from the file itself (see utils.xlsx_reader) and decoded with the same RowDecoder
+as a battle. The script is then walked row by row as main does, checking:
+    - the map from the settings, resolved with get_map_by_name or get_map_by_code
+    - the rows decoding into valid actions, up to the first empty row, and no rows after it
+    - ticks below the 每费帧数 setting, and the game time not going back after a skill; the cost drops
+      after a deploy and changes with the refund of a retreat, so rows after those are not compared
+    - positions within the map, on a deployable tile for a deploy
+    - skill and retreat rows without a position following a deploy of the operator
+    - operator names, after alias resolution, against OPERATOR_MAPPING
+    - aliases not being redefined for another operator, nor shadowing an operator name
+Workbooks are checked in parallel worker processes. The exit code is 1 if any error was found.
+With --self-check, the sample scripts shipped with PRTS+ are checked instead, and must have no issue at all,
+along with the scripts of SELF_CHECK_CASES, which must have exactly the expected errors.
+"""
+
+import argparse
+import dataclasses
+import glob
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from src.logger import logger
+from src.cache import OPERATOR_MAPPING, get_map_by_code, get_map_by_name
+from src.logic.action import Action, ActionType
+from src.logic.convert_pos import convert_position
+from src.logic.decode_action import ACTION_COLUMN_NAME_MAPPING, RowDecoder
+from src.logic.game_time import GameTime
+from src.config import GameTimeConfig as timeconfig
+from src.utils.xlsx_reader import read_sheet
+
+RECORD_SHEET = "作战记录"
+ERROR = "error"
+WARNING = "warning"
+# Scripts shipped with PRTS+, which must lint clean
+CLEAN_SCRIPTS = [os.path.normpath(os.path.join(os.path.dirname(__file__), "..", "..", "sample 1-7.xlsm"))]
+# Rows of the record sheet covering the time checks, with the number of errors expected from each
+SELF_CHECK_HEADER = ("费用", "帧数", "操作", "干员", "坐标", "朝向", "简称", "设置", None)
+SELF_CHECK_CASES = [
+    ("same cost after a deploy", 0, [
+        (10, 20, "部署", "斑点", "D2", "右", None, "关卡代号", "1-7"),
+        (10, 5, "技能", "斑点", None, None, None, "每费帧数", 30),
+        (10, 5, "部署", "芬", "D6", "左", None, None, None),
+        (4, 0, "撤退", "斑点", None, None, None, None, None),
+        (8, 0, "技能", "芬", None, None, None, None, None),
+    ]),
+    ("back in time after a skill", 1, [
+        (10, 20, "部署", "斑点", "D2", "右", None, "关卡代号", "1-7"),
+        (12, 10, "技能", "斑点", None, None, None, "每费帧数", 30),
+        (12, 5, "撤退", "斑点", None, None, None, None, None),
+    ]),
+]
+
+
+@dataclasses.dataclass
+class Issue:
+    """
+    A problem found in a script.
+
+    Attributes:
+        row (int, optional): The 1-based row of the sheet, as shown by Excel, or None for the whole script.
+        severity (str): ERROR if the battle would fail or go wrong, WARNING if it is suspicious.
+        message (str): What is wrong.
+    """
+    row: Optional[int]
+    severity: str
+    message: str
+
+
+@dataclasses.dataclass
+class ScriptReport:
+    """
+    The result of checking a script.
+    """
+    path: str
+    map_code: Optional[str] = None
+    actions: int = 0
+    issues: List[Issue] = dataclasses.field(default_factory=list)
+
+    def add(self, row: Optional[int], severity: str, message: str) -> None:
+        self.issues.append(Issue(row, severity, message))
+
+    def count(self, severity: str) -> int:
+        return sum(1 for issue in self.issues if issue.severity == severity)
+
+
+def read_settings(data: Sequence[Sequence[Any]], header: Sequence[Any]) -> Dict[str, Any]:
+    """
+    Read the settings of the record sheet, the value to the right of every name in the column "设置".
+    """
+    if "设置" not in header:
+        return {}
+    column = header.index("设置")
+    return {
+        row[column]: row[column + 1] if column + 1 < len(row) else None
+        for row in data[1:] if column < len(row) and row[column] is not None
+    }
+
+
+def resolve_map(settings: Dict[str, Any], report: ScriptReport) -> Optional[Dict[str, Any]]:
+    # As in main, the full name takes precedence over the code
+    map_name, map_code = settings.get("关卡全名"), settings.get("关卡代号")
+    try:
+        if map_name is not None:
+            map_data = get_map_by_name(str(map_name))
+        elif map_code is not None:
+            map_data = get_map_by_code(str(map_code))
+        else:
+            report.add(None, ERROR, "no map given, set 关卡代号 or 关卡全名")
+            return None
+    except (ValueError, FileNotFoundError) as e:
+        report.add(None, ERROR, f"map not found: {e}")
+        return None
+    report.map_code = str(map_data.get("code") or map_name or map_code)
+    return map_data
+
+
+def check_position(action: Action, map_data: Dict[str, Any], row: int, report: ScriptReport) -> bool:
+    """
+    Check the position of an action against the map bounds, and the tile for a deploy.
+
+    Returns:
+        bool: Whether the position is usable.
+    """
+    height, width = map_data["height"], map_data["width"]
+    convert_position(action, height, width)
+    if action.tile_pos is None:
+        report.add(row, ERROR, f"invalid position {action.pos!r}")
+        return False
+    x, y = action.tile_pos
+    if not (0 <= x < width and 0 <= y < height):
+        report.add(row, ERROR, f"position {action.pos} is outside of the {height}x{width} map")
+        return False
+    if action.action_type == ActionType.DEPLOY and map_data["tiles"][y][x].get("buildableType", 0) == 0:
+        report.add(row, ERROR, f"tile {action.pos} is not deployable")
+    return True
+
+
+def lint_script(path: str) -> ScriptReport:
+    """
+    Check a script. This is the entry point of every worker.
+    """
+    report = ScriptReport(path)
+    try:
+        data = read_sheet(path, RECORD_SHEET)
+    except Exception as e:
+        report.add(None, ERROR, f"could not read sheet {RECORD_SHEET}: {e}")
+        return report
+    return lint_rows(data, report)
+
+
+def lint_rows(data: Sequence[Sequence[Any]], report: ScriptReport) -> ScriptReport:
+    """
+    Check the rows of a record sheet, header included, adding the issues to the report.
+    """
+    if not data:
+        report.add(None, ERROR, f"sheet {RECORD_SHEET} is empty")
+        return report
+
+    header = data[0]
+    missing = [name for name in ACTION_COLUMN_NAME_MAPPING if name not in header]
+    if missing:
+        report.add(None, ERROR, f"missing columns {', '.join(missing)}")
+        return report
+    column_loc = {field: header.index(name) for name, field in ACTION_COLUMN_NAME_MAPPING.items()}
+    settings = read_settings(data, header)
+    map_data = resolve_map(settings, report)
+
+    tick_max = settings.get("每费帧数") or timeconfig.TICK_MAX_DEFAULT
+    GameTime.set_tick_max(int(tick_max))
+
+    table = RowDecoder(column_loc).decode_table(data)
+    end = table.first_invalid(1)
+    report.actions = end - 1
+
+    # The battle stops at the first invalid row, which should be the first empty one
+    action_cells = [column for column in column_loc.values()]
+    def has_actions(row: int) -> bool:
+        return any(column < len(data[row]) and data[row][column] is not None for column in action_cells)
+    if end < len(data) and has_actions(end):
+        report.add(end + 1, ERROR, f"the script stops here: {table.error(end)}")
+    ignored = [row + 1 for row in range(end + 1, len(data)) if has_actions(row)]
+    if ignored:
+        report.add(ignored[0], WARNING, f"{len(ignored)} rows after the end of the script at row {end + 1} are never run")
+
+    previous: Optional[Action] = None
+    operator_loc: Dict[str, Tuple[int, int]] = {}
+    operator_alias: Dict[str, str] = {}
+    deployed = set()
+    for index in range(1, end):
+        action, row = table.get(index), index + 1
+        if action.tick >= GameTime.TICK_MAX:
+            report.add(row, ERROR, f"tick {action.tick} is not below 每费帧数 {GameTime.TICK_MAX}")
+        # A skill leaves the cost as it is, while a deploy spends it and a retreat refunds some of it
+        if previous is not None and previous.action_type == ActionType.SKILL and action.get_game_time() < previous.get_game_time():
+            report.add(row, ERROR, f"game time goes back from {previous.cost}:{previous.tick} after a skill to {action.cost}:{action.tick}")
+        previous = action
+
+        # Positions, remembered by operator name and alias as in main
+        if action.pos is not None:
+            if map_data is not None and check_position(action, map_data, row, report) and action.action_type == ActionType.DEPLOY:
+                operator_loc[action.oper] = action.tile_pos
+                if action.alias is not None:
+                    operator_loc[action.alias] = action.tile_pos
+        elif action.oper not in operator_loc:
+            report.add(row, ERROR, f"no position given, and {action.oper} was not deployed before")
+
+        if action.alias is not None:
+            if operator_alias.get(action.alias, action.oper) != action.oper:
+                report.add(row, WARNING, f"alias {action.alias} redefined from {operator_alias[action.alias]} to {action.oper}")
+            if action.alias in OPERATOR_MAPPING:
+                report.add(row, WARNING, f"alias {action.alias} shadows the operator of the same name")
+            operator_alias[action.alias] = action.oper
+        if action.oper is None:
+            # Targeted by position alone
+            continue
+        oper = operator_alias.get(action.oper, action.oper)
+        if oper not in OPERATOR_MAPPING:
+            report.add(row, ERROR if action.action_type == ActionType.DEPLOY else WARNING, f"unknown operator {oper}")
+
+        if action.action_type == ActionType.DEPLOY:
+            if oper in deployed:
+                report.add(row, WARNING, f"{oper} deployed again without a retreat")
+            deployed.add(oper)
+        elif oper not in deployed:
+            report.add(row, WARNING, f"{action.action_type.value} of {oper}, who is not deployed")
+        elif action.action_type == ActionType.RETREAT:
+            deployed.discard(oper)
+    return report
+
+
+def find_scripts(paths: Sequence[str]) -> List[str]:
+    """
+    Expand directories into the workbooks they contain, skipping the lock files of open workbooks.
+    """
+    scripts = []
+    for path in paths:
+        if os.path.isdir(path):
+            found = glob.glob(os.path.join(path, "**", "*.xls[mx]"), recursive=True)
+            scripts.extend(sorted(file for file in found if not os.path.basename(file).startswith("~$")))
+        else:
+            scripts.append(path)
+    return scripts
+
+
+def lint_scripts(paths: Sequence[str], workers: Optional[int] = None) -> List[ScriptReport]:
+    """
+    Check scripts in parallel worker processes.
+
+    Args:
+        paths (Sequence[str]): The workbooks.
+        workers (int, optional): Number of worker processes. Defaults to the number of cores.
+
+    Returns:
+        List[ScriptReport]: The report of every script, in the given order.
+    """
+    workers = min(workers or os.cpu_count() or 1, len(paths))
+    if workers <= 1:
+        return [lint_script(path) for path in paths]
+    # Spawn rather than fork, as the parent already runs the logging thread
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+        return list(executor.map(lint_script, paths, chunksize=max(1, len(paths) // (workers * 4))))
+
+
+def format_report(reports: List[ScriptReport], elapsed: float) -> str:
+    """
+    Format the issues of every script and a summary as plain text.
+    """
+    lines = []
+    for report in reports:
+        status = f"{report.count(ERROR)} errors, {report.count(WARNING)} warnings" if report.issues else "ok"
+        lines.append(f"{report.path}: {report.actions} actions on {report.map_code or '?'}, {status}")
+        for issue in report.issues:
+            where = f"row {issue.row}" if issue.row is not None else "script"
+            lines.append(f"    {where:<9}{issue.severity:<9}{issue.message}")
+    failed = sum(1 for report in reports if report.count(ERROR))
+    lines.append(f"{len(reports)} scripts checked in {elapsed:.2f} seconds, {failed} with errors, "
+                 f"{sum(report.count(WARNING) for report in reports)} warnings in total")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="PRTS+ script linter")
+    parser.add_argument("paths", nargs="*", help="Workbooks, or directories containing workbooks.")
+    parser.add_argument("--workers", type=int, default=None, help="Number of worker processes. Defaults to the number of cores.")
+    parser.add_argument("--json", type=str, default=None, help="Also write the report to this JSON file.")
+    parser.add_argument("--self-check", action="store_true", help="Check the sample scripts, which must have no issue.")
+    args = parser.parse_args()
+
+    scripts = find_scripts(CLEAN_SCRIPTS if args.self_check else args.paths)
+    if not scripts:
+        parser.error("No workbooks found.")
+    start = time.perf_counter()
+    reports = lint_scripts(scripts, args.workers)
+    elapsed = time.perf_counter() - start
+    print(format_report(reports, elapsed))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump([dataclasses.asdict(report) for report in reports], f, ensure_ascii=False, indent=2)
+        logger.info("Wrote the report to %s", args.json)
+    if args.self_check:
+        failed = any(report.issues for report in reports)
+        for name, expected, rows in SELF_CHECK_CASES:
+            report = lint_rows([SELF_CHECK_HEADER, *rows], ScriptReport(name))
+            ok = report.count(ERROR) == expected and not report.count(WARNING)
+            failed = failed or not ok
+            print(f"{name}: {report.count(ERROR)} errors, {report.count(WARNING)} warnings, expected {expected} errors, {'ok' if ok else 'FAILED'}")
+            for issue in report.issues:
+                print(f"    row {issue.row:<5}{issue.severity:<9}{issue.message}")
+        raise SystemExit(1 if failed else 0)
+    raise SystemExit(1 if any(report.count(ERROR) for report in reports) else 0)
@@ -0,0 +1,429 @@
+"""
+video_to_script.py
+Transcribe the operations of a recorded battle video into rows of the battle record sheet "作战记录".
+
+Usage:
+    python -m src.tools.video_to_script VIDEO --map CODE --oper NAME [--oper NAME ...] [--output CSV] [--workers N]
+
+The video is split into chunks of VideoToScriptConfig.CHUNK_SECONDS, analyzed in parallel worker processes.
+Every worker also decodes the CHUNK_OVERLAP_SECONDS before its chunk, to pick up the state of the game
+at its start, and reads past its end until the state is known to the next worker. Every frame is wrapped as a snapshot of the regular vision ROIs and goes through a few cheap
+checks: the game state classifier, the skill and retreat buttons, and a downscaled copy of the deploy strip.
+Only the frames where one of them changed are analyzed in full, with get_game_time and locate_avatar for
+every operator, so an hour of 60 fps footage takes minutes.
+
+The observations of all chunks are then scanned in order for the events:
+    - deploy: a card left the deploy strip. The position is the tile under the feet of whatever appeared
+      on the field since the last frame without selection, found with the TileIndex of the map.
+    - retreat: the card of a deployed operator came back to the deploy strip.
+    - skill: the skill and retreat buttons were shown, then hidden without a retreat.
+Each event is timed by the game time of the first frame it is visible on. The direction of a deploy can
+not be told from the video, and neither can the operator of a skill while several operators are deployed;
+these cells are left empty, to be filled in by hand. A selection cancelled without using the skill is also
+reported as a skill.
+
+The rows are written as a CSV file in the column order of the sheet, to be pasted into it.
+"""
+
+import argparse
+import csv
+import dataclasses
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from src.logger import logger
+from src.config import GameRatioConfig as ratioconfig
+from src.config import ImageProcessingConfig as imgconfig
+from src.config import VideoToScriptConfig as config
+from src.cache import get_map_by_code
+from src.logic.action import Action, ActionType
+from src.logic.analyze_time import cost_bar_reader, get_game_time
+from src.logic.calc_view import TileIndex
+from src.logic.convert_pos import convert_tile
+from src.logic.decode_action import ACTION_COLUMN_NAME_MAPPING
+from src.logic.game_state import GameState, game_state_classifier
+from src.logic.game_time import GameTime
+from src.logic.locate_avatar import locate_avatar
+from src.mumu.mumu_vision import capture_roi, snapshot_from_image
+from src.utils.error_to_log import ErrorToLog
+
+# ROIs read from every frame; "skill_button" and "retreat_button" are registered by verify_action
+import src.logic.verify_action  # noqa: F401
+FRAME_ROIS = ("cost", "operator", "pause_icon", "field_probe", "skill_button", "retreat_button")
+
+# States in which the field is shown as is, neither dimmed nor covered
+CLEAR_STATES = (GameState.RUNNING, GameState.PAUSED)
+
+
+@dataclasses.dataclass
+class Chunk:
+    """
+    A range of frames analyzed by a worker process.
+
+    Attributes:
+        path (str): The video file.
+        start (int): The first frame of the chunk.
+        end (int): The frame after the last frame of the chunk.
+        warmup (int): The first frame decoded, before start, only to pick up the state of the game.
+        opers (List[str]): The operators searched for in the deploy strip.
+        baseline (float, optional): The field brightness of a running game, shared by all chunks.
+    """
+    path: str
+    start: int
+    end: int
+    warmup: int
+    opers: List[str]
+    baseline: Optional[float] = None
+
+
+@dataclasses.dataclass
+class Observation:
+    """
+    The full analysis of a frame where something changed.
+
+    Attributes:
+        frame (int): The frame index.
+        state (GameState): The state of the game.
+        selected (bool, optional): Whether the skill and retreat buttons of a selected operator are shown,
+                                   or None if the worker has not seen the buttons hidden yet.
+        game_time (GameTime, optional): The game time, or None if it could not be read.
+        cards (Dict[str, float]): The horizontal position (ratio) of the card of every operator found in the deploy strip.
+        field (np.ndarray, optional): The downscaled grayscale field of the last frame in a clear state, at or before this one.
+    """
+    frame: int
+    state: GameState
+    selected: Optional[bool]
+    game_time: Optional[GameTime]
+    cards: Dict[str, float]
+    field: Optional[np.ndarray]
+
+
+def downscale(image: np.ndarray, scale: int) -> np.ndarray:
+    return cv2.resize(image, (max(image.shape[1] // scale, 1), max(image.shape[0] // scale, 1)), interpolation=cv2.INTER_AREA)
+
+
+def mean_difference(a: np.ndarray, b: np.ndarray) -> float:
+    return cv2.norm(a, b, cv2.NORM_L1) / a.size
+
+
+def analyze_chunk(chunk: Chunk) -> List[Observation]:
+    """
+    Analyze the frames of a chunk. This is the entry point of every worker.
+
+    The worker reads past the end of the chunk, up to the first frame of a running game without selection.
+    The next worker knows whether an operator is selected from that frame on at the latest, so its
+    observations up to that frame are dropped when merging.
+
+    Returns:
+        List[Observation]: The observations of the frames where something changed, ending with the frame where the worker stopped.
+    """
+    # The readers keep state between frames, which must not leak from the previous chunk of the worker
+    game_state_classifier.reset()
+    game_state_classifier.baseline = chunk.baseline
+    cost_bar_reader.reset()
+
+    capture = cv2.VideoCapture(chunk.path)
+    capture.set(cv2.CAP_PROP_POS_FRAMES, chunk.warmup)
+    observations = []
+    bgra = None
+    clear_frame = clear_field = None
+    buttons = strip = None
+    last_state, last_selected = None, None
+    try:
+        index = chunk.warmup - 1
+        while True:
+            index += 1
+            ok, frame = capture.read()
+            if not ok:
+                break
+            bgra = cv2.cvtColor(frame, cv2.COLOR_BGR2BGRA, dst=bgra)
+            snapshot = snapshot_from_image(bgra, *FRAME_ROIS)
+
+            # The buttons are compared to the last frame of a running game, on which no operator is selected
+            state = game_state_classifier.classify(snapshot)
+            current_buttons = [capture_roi(name, snapshot).copy() for name in ("skill_button", "retreat_button")]
+            selected = None if buttons is None else all(
+                mean_difference(current, reference) > imgconfig.BUTTON_CHANGE_THRESHOLD
+                for current, reference in zip(current_buttons, buttons)
+            )
+            if state == GameState.RUNNING and not selected:
+                buttons = current_buttons
+                selected = False
+            if state in CLEAR_STATES and not selected:
+                clear_frame, clear_field = frame, None
+
+            settled = index >= chunk.end and state == GameState.RUNNING and selected is False
+            current_strip = downscale(capture_roi("operator", snapshot), config.STRIP_SCALE)
+            changed = (
+                settled or state != last_state or selected != last_selected or strip is None
+                or mean_difference(current_strip, strip) > config.STRIP_CHANGE_THRESHOLD
+            )
+            last_state, last_selected = state, selected
+            if not changed:
+                continue
+            strip = current_strip
+            if index < chunk.start:
+                continue
+
+            game_time, cards = None, {}
+            if state not in (GameState.MENU, GameState.UNKNOWN):
+                try:
+                    game_time = get_game_time(snapshot)
+                except ErrorToLog:
+                    pass
+                for oper in chunk.opers:
+                    action = Action(oper=oper)
+                    try:
+                        locate_avatar(action, snapshot)
+                        cards[oper] = action.avatar_pos[0]
+                    except ErrorToLog:
+                        pass
+            # Consecutive observations share the field of the same clear frame
+            if clear_frame is not None and clear_field is None:
+                clear_field = downscale(cv2.cvtColor(clear_frame, cv2.COLOR_BGR2GRAY), config.FIELD_SCALE)
+            observations.append(Observation(index, state, selected, game_time, cards, clear_field))
+            if settled:
+                break
+    finally:
+        capture.release()
+    return observations
+
+
+def locate_deploy(before: np.ndarray, after: np.ndarray, index: TileIndex) -> Optional[Tuple[int, int]]:
+    """
+    Find the tile of a deployed operator, from the field before and after the deploy.
+
+    The largest changed area outside of the deploy strip and the cost area is taken as the operator,
+    standing on the tile under the bottom center of the area.
+
+    Returns:
+        Optional[Tuple[int, int]]: The (x, y) tile position, or None if nothing appeared on a tile.
+    """
+    if before.shape != after.shape:
+        return None
+    # Cancel a global change of brightness, e.g. the end of the dimming of a selection
+    scaled = after.astype(np.float32) * (float(before.mean()) / max(float(after.mean()), 1.0))
+    changed = (np.abs(scaled - before.astype(np.float32)) > config.FIELD_CHANGE_THRESHOLD).astype(np.uint8)
+
+    height, width = changed.shape
+    changed[int(ratioconfig.OPERATOR_AREA_RATIO[1] * height):] = 0
+    left, top, right, bottom = ratioconfig.COST_AREA_RATIO
+    changed[int(top * height):int(np.ceil(bottom * height)), int(left * width):int(np.ceil(right * width))] = 0
+
+    count, _, stats, _ = cv2.connectedComponentsWithStats(changed)
+    if count < 2:
+        return None
+    largest = 1 + int(np.argmax(stats[1:, cv2.CC_STAT_AREA]))
+    area_left, area_top, area_width, area_height = stats[largest, :4]
+    feet = ((area_left + area_width / 2) / width, (area_top + area_height - 0.5) / height)
+    return index.lookup(feet)
+
+
+def detect_events(observations: List[Observation], level: dict) -> List[Action]:
+    """
+    Scan the observations in order for deploy, skill and retreat events.
+
+    Args:
+        observations (List[Observation]): The observations of the whole video, in frame order.
+        level (dict): The map data.
+
+    Returns:
+        List[Action]: The events, in the order they happened.
+    """
+    observations = [
+        observation for observation in observations
+        if observation.state not in (GameState.MENU, GameState.UNKNOWN) and observation.game_time is not None
+    ]
+    # Until the first running frame of the video, no operator is selected
+    selected = False
+    for observation in observations:
+        if observation.selected is None:
+            observation.selected = selected
+        selected = observation.selected
+    # A card missed or found on a single observation is a misread, e.g. during an animation
+    for before, observation, after in zip(observations, observations[1:], observations[2:]):
+        if before.cards.keys() == after.cards.keys() != observation.cards.keys():
+            observation.cards = before.cards
+
+    index = TileIndex(level, side=False)
+    actions: List[Action] = []
+    deployed: Dict[str, Action] = {}
+    pending: List[Tuple[Action, np.ndarray]] = []
+    skill: Optional[Action] = None
+    for previous, observation in zip(observations, observations[1:]):
+        game_time = observation.game_time
+        gone = [oper for oper in previous.cards if oper not in observation.cards]
+        back = [oper for oper in observation.cards if oper not in previous.cards and oper in deployed]
+
+        # A card coming back right after the selection closed was a retreat rather than a skill
+        if skill is not None and not back:
+            actions.append(skill)
+        skill = None
+
+        for oper in gone:
+            action = Action(game_time.cost, game_time.tick, ActionType.DEPLOY, oper)
+            actions.append(action)
+            deployed[oper] = action
+            if previous.field is not None:
+                pending.append((action, previous.field))
+        for oper in back:
+            actions.append(Action(game_time.cost, game_time.tick, ActionType.RETREAT, oper, deployed.pop(oper).pos))
+        if previous.selected and not observation.selected and not gone and not back:
+            oper = next(iter(deployed)) if len(deployed) == 1 else None
+            skill = Action(game_time.cost, game_time.tick, ActionType.SKILL, oper, deployed[oper].pos if oper else None)
+
+        # The field of the next clear frame shows where the deployed operators stand
+        if pending and observation.field is not None and observation.state in CLEAR_STATES and not observation.selected:
+            for action, before in pending:
+                tile = locate_deploy(before, observation.field, index)
+                action.pos = convert_tile(tile, level["height"]) if tile is not None else None
+            pending.clear()
+    if skill is not None:
+        actions.append(skill)
+
+    unknown = sum(1 for action in actions if action.action_type == ActionType.SKILL and action.oper is None)
+    if unknown:
+        logger.warning("The operator of %s skills is unknown, as several operators were deployed", unknown)
+    return actions
+
+
+def sample_baseline(capture: cv2.VideoCapture, frames: int) -> Optional[float]:
+    """
+    Sample frames across the video for the field brightness of a running game, the baseline of the game
+    state classifier. Every worker starts from the same baseline, so a chunk starting in bullet time does
+    not take the dimmed field for the normal one.
+
+    Returns:
+        Optional[float]: The baseline, or None if no sampled frame shows a running game.
+    """
+    baseline = None
+    for index in np.linspace(0, max(frames - 1, 0), config.BASELINE_SAMPLES, dtype=np.int64):
+        capture.set(cv2.CAP_PROP_POS_FRAMES, int(index))
+        ok, frame = capture.read()
+        if not ok:
+            continue
+        snapshot = snapshot_from_image(cv2.cvtColor(frame, cv2.COLOR_BGR2BGRA), "pause_icon", "field_probe")
+        if game_state_classifier.icon_shows_bars(capture_roi("pause_icon", snapshot)):
+            brightness = float(np.mean(capture_roi("field_probe", snapshot)))
+            baseline = brightness if baseline is None else max(baseline, brightness)
+    return baseline
+
+
+def plan_chunks(path: str, opers: List[str]) -> Tuple[List[Chunk], int, float]:
+    """
+    Split a video into chunks.
+
+    Returns:
+        Tuple[List[Chunk], int, float]: The chunks, the number of frames and the frame rate of the video.
+
+    Raises:
+        ValueError: If the video can not be opened.
+    """
+    capture = cv2.VideoCapture(path)
+    if not capture.isOpened():
+        raise ValueError(f"Could not open video {path}")
+    try:
+        frames = int(capture.get(cv2.CAP_PROP_FRAME_COUNT))
+        fps = capture.get(cv2.CAP_PROP_FPS) or 60.0
+        baseline = sample_baseline(capture, frames)
+    finally:
+        capture.release()
+
+    length = max(int(config.CHUNK_SECONDS * fps), 1)
+    overlap = int(config.CHUNK_OVERLAP_SECONDS * fps)
+    chunks = [
+        Chunk(path, start, min(start + length, frames), max(start - overlap, 0), opers, baseline)
+        for start in range(0, frames, length)
+    ]
+    return chunks, frames, fps
+
+
+def init_worker(level: int) -> None:
+    """
+    Set up a worker process: a single thread for OpenCV, as the workers already use every core. Tesseract
+    is already loaded by then, its limit comes from the environment set by extract_script.
+    """
+    cv2.setNumThreads(1)
+    logger.setLevel(level)
+
+
+def extract_script(path: str, map_code: str, opers: List[str], workers: Optional[int] = None) -> List[Action]:
+    """
+    Transcribe the operations of a battle video.
+
+    Args:
+        path (str): The video file.
+        map_code (str): The code of the map of the battle, e.g. "1-7".
+        opers (List[str]): The operators of the battle.
+        workers (int, optional): Number of worker processes. Defaults to the number of cores.
+
+    Returns:
+        List[Action]: The deploy, skill and retreat actions, in the order they happened.
+    """
+    level = get_map_by_code(map_code)
+    chunks, frames, fps = plan_chunks(path, opers)
+    logger.info("Analyzing %s frames at %.1f fps in %s chunks", frames, fps, len(chunks))
+
+    start = time.perf_counter()
+    observations: List[Observation] = []
+    # Read by Tesseract when it is loaded, which a spawned worker does when importing this module, before
+    # its initializer runs: set for the workers to inherit, a single OCR thread each (see supervisor.limit_cpu)
+    thread_limit = os.environ.get("OMP_THREAD_LIMIT")
+    os.environ["OMP_THREAD_LIMIT"] = "1"
+    try:
+        # Spawn rather than fork, as the parent already runs the logging thread
+        # Workers only log errors, as a missing card in the deploy strip is expected on most frames
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                                 initializer=init_worker, initargs=(logging.CRITICAL,)) as executor:
+            for done, chunk_observations in enumerate(executor.map(analyze_chunk, chunks), 1):
+                last = observations[-1].frame if observations else -1
+                observations.extend(observation for observation in chunk_observations if observation.frame > last)
+                logger.debug("Analyzed chunk %s of %s", done, len(chunks))
+    finally:
+        if thread_limit is None:
+            os.environ.pop("OMP_THREAD_LIMIT", None)
+        else:
+            os.environ["OMP_THREAD_LIMIT"] = thread_limit
+    elapsed = time.perf_counter() - start
+
+    actions = detect_events(observations, level)
+    logger.info("Found %s actions in %s analyzed frames out of %s, in %.1f seconds (%.0f fps, %.1fx real time)",
+                len(actions), len(observations), frames, elapsed, frames / elapsed, frames / fps / elapsed)
+    return actions
+
+
+def write_csv(actions: List[Action], path: str) -> None:
+    """
+    Write the actions in the column order of the battle record sheet, with the sheet headers.
+    """
+    with open(path, "w", newline="", encoding="utf-8-sig") as f:
+        writer = csv.writer(f)
+        writer.writerow(ACTION_COLUMN_NAME_MAPPING.keys())
+        for action in actions:
+            row = []
+            for name in ACTION_COLUMN_NAME_MAPPING.values():
+                value = getattr(action, name)
+                row.append(value.value if hasattr(value, "value") else value)
+            writer.writerow(row)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="PRTS+ video to script")
+    parser.add_argument("video", type=str, help="The recorded battle video.")
+    parser.add_argument("--map", type=str, required=True, help="The code of the map, e.g. 1-7.")
+    parser.add_argument("--oper", type=str, action="append", required=True, help="An operator of the battle. Repeat for every operator.")
+    parser.add_argument("--output", type=str, default=None, help="The CSV file to write. Defaults to the video file with a .csv extension.")
+    parser.add_argument("--workers", type=int, default=None, help="Number of worker processes. Defaults to the number of cores.")
+    args = parser.parse_args()
+
+    actions = extract_script(args.video, args.map, args.oper, args.workers)
+    output = args.output or os.path.splitext(args.video)[0] + ".csv"
+    write_csv(actions, output)
+    logger.info("Wrote %s actions to %s", len(actions), output)
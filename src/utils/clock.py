@@ -0,0 +1,82 @@
+"""
+clock.py
+This module provides the clock behind every timed wait of the battle logic, replaceable by a virtual clock.
+
+The logic reads the time with now() and waits with sleep() instead of calling the time module. With the
+default RealClock these are time.perf_counter() and time.sleep(). With a VirtualClock, sleeping only
+moves a counter forward, so a whole battle against the simulated game window (which reads the same
+clock) runs as fast as the code itself, while every wait and timeout behaves as it would in real time.
+"""
+
+import time
+
+__all__ = ["RealClock", "VirtualClock", "get_clock", "set_clock", "now", "sleep"]
+
+
+class RealClock:
+    """
+    The wall clock.
+    """
+    virtual = False
+
+    def now(self) -> float:
+        """Get the current time in seconds, from an arbitrary origin."""
+        return time.perf_counter()
+
+    def sleep(self, seconds: float) -> None:
+        """Wait for the given time in seconds. Non-positive times return right away."""
+        if seconds > 0:
+            time.sleep(seconds)
+
+
+class VirtualClock:
+    """
+    A clock that only moves forward when slept, or by a fixed resolution on every reading.
+
+    The resolution stands for the time taken by the code between two readings, and makes sure that a
+    loop polling the clock without sleeping still sees the time pass.
+
+    Args:
+        start (float, optional): The initial time in seconds.
+        resolution (float, optional): The time added on every reading, in seconds.
+    """
+    virtual = True
+
+    def __init__(self, start: float = 0.0, resolution: float = 1e-4):
+        self.time = start
+        self.resolution = resolution
+
+    def now(self) -> float:
+        self.time += self.resolution
+        return self.time
+
+    def sleep(self, seconds: float) -> None:
+        if seconds > 0:
+            self.time += seconds
+
+
+# The active clock
+_clock = RealClock()
+
+
+def get_clock():
+    """Get the active clock."""
+    return _clock
+
+
+def set_clock(clock) -> None:
+    """
+    Replace the active clock, e.g. with a VirtualClock. Passing None restores the wall clock.
+    """
+    global _clock
+    _clock = clock if clock is not None else RealClock()
+
+
+def now() -> float:
+    """Get the current time of the active clock, in seconds."""
+    return _clock.now()
+
+
+def sleep(seconds: float) -> None:
+    """Wait on the active clock for the given time in seconds."""
+    _clock.sleep(seconds)
@@ -1,6 +1,7 @@
 class ErrorToLog(Exception):
     def __init__(self, message: str, isError: bool = True):
         self.message = f"错误：{message}" if isError else f"{message}"
+        self.isError = isError
 
     def __str__(self):
         return self.message
\ No newline at end of file
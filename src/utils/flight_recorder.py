@@ -0,0 +1,86 @@
+"""
+flight_recorder.py
+This module keeps the last captured frames in memory, to be dumped to disk when an action fails or runs late.
+"""
+
+import collections
+import json
+import os
+import time
+import numpy as np
+from typing import Any, Deque, Dict, Tuple
+
+from src.config import DiagnosticsConfig as diagconfig
+from src.logger import logger
+
+__all__ = ["FlightRecorder", "flight_recorder"]
+
+
+class FlightRecorder:
+    """
+    A bounded ring of recently captured frames, one ring per kind of frame.
+
+    Recording copies the frame, since captured images live in buffers reused by the next capture.
+    The frames are small crops, so the copy is cheap, and nothing is written to disk on the hot path.
+
+    Usage:
+        info = flight_recorder.record("cost", img)
+        info["game_time"] = game_time  # annotate once the frame is decoded
+    """
+    def __init__(self, capacities: Dict[str, int]):
+        self.capacities = dict(capacities)
+        self.rings: Dict[str, Deque[Tuple[float, np.ndarray, Dict[str, Any]]]] = {
+            kind: collections.deque(maxlen=capacity) for kind, capacity in self.capacities.items()
+        }
+
+    def record(self, kind: str, frame: np.ndarray, **info: Any) -> Dict[str, Any]:
+        """
+        Record a frame of the given kind.
+
+        Returns:
+            The info dictionary of the frame, which can be annotated further.
+        """
+        ring = self.rings.get(kind)
+        if ring is None:
+            ring = self.rings[kind] = collections.deque(maxlen=diagconfig.FLIGHT_RECORDER_DEFAULT_FRAMES)
+        ring.append((time.time(), frame.copy(), info))
+        return info
+
+    def clear(self) -> None:
+        for ring in self.rings.values():
+            ring.clear()
+
+    def dump(self, path: str, **info: Any) -> None:
+        """
+        Write all recorded frames to a compressed .npz file.
+
+        Frames are stored as <kind>_<index> arrays, oldest first. The "meta" entry holds a JSON document
+        with the capture time and annotations of every frame, plus the extra keyword arguments.
+        """
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        arrays = {}
+        meta = {"info": info, "frames": {}}
+        for kind, ring in self.rings.items():
+            for index, (timestamp, frame, frame_info) in enumerate(ring):
+                name = f"{kind}_{index:04d}"
+                arrays[name] = frame
+                meta["frames"][name] = {"time": timestamp, **frame_info}
+        arrays["meta"] = np.array(json.dumps(meta, ensure_ascii=False, default=str))
+        np.savez_compressed(path, **arrays)
+        logger.info("Flight recorder dumped %s frames to %s", len(arrays) - 1, path)
+
+
+flight_recorder = FlightRecorder({
+    "cost": diagconfig.FLIGHT_RECORDER_COST_FRAMES,
+    "operator": diagconfig.FLIGHT_RECORDER_OPERATOR_FRAMES,
+})
+
+if __name__ == "__main__":
+    # Usage and testing
+    for i in range(200):
+        info = flight_recorder.record("cost", np.full((50, 120), i, dtype=np.uint8))
+        info["game_time"] = f"GameTime(cost={i}, tick=0)"
+    flight_recorder.dump("flight_test.npz", reason="test")
+    with np.load("flight_test.npz") as data:
+        print(sorted(data.files)[:3], len(data.files))
+        print(json.loads(str(data["meta"]))["frames"]["cost_0000"])
@@ -0,0 +1,182 @@
+"""
+lru.py
+This module provides a least recently used cache bounded by the memory taken by its values.
+
+The size of a value is measured once, when it is stored, by walking the containers it is made of. Numpy
+arrays count their data buffer. When the values exceed the budget, the least recently used entries are
+evicted, except pinned entries, which stay until unpinned, and the entry just stored.
+"""
+
+import sys
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Iterable, Optional, Set, Tuple
+
+import numpy as np
+
+from src.logger import logger
+
+__all__ = ["deep_sizeof", "LRUCache"]
+
+
+def deep_sizeof(value: Any) -> int:
+    """
+    Estimate the memory taken by a value and everything it contains, in bytes.
+
+    Objects shared by several containers are counted once. Only builtin containers and numpy arrays are
+    walked into, other objects count for their own size.
+    """
+    seen: Set[int] = set()
+    stack = [value]
+    total = 0
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen:
+            continue
+        seen.add(id(obj))
+        total += sys.getsizeof(obj)
+        if isinstance(obj, np.ndarray):
+            # getsizeof only counts the data of arrays owning it, views count the data they see
+            if obj.base is not None:
+                total += obj.nbytes
+        elif isinstance(obj, dict):
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+        elif isinstance(obj, (list, tuple, set, frozenset)):
+            stack.extend(obj)
+    return total
+
+
+class LRUCache:
+    """
+    A mapping of keys to values, evicting the least recently used values beyond a memory budget.
+
+    Attributes:
+        name (str): Name of the cache, for logging.
+        max_bytes (int): The memory budget of the values.
+        bytes (int): The memory taken by the values.
+        hits (int): Lookups finding their value.
+        misses (int): Lookups not finding their value.
+        evictions (int): Values evicted to stay within the budget.
+
+    Usage:
+        cache = LRUCache("maps", 64 * 1024 * 1024)
+        level = cache.get("1-7", load_level)
+    """
+    def __init__(self, name: str, max_bytes: int, sizeof: Callable[[Any], int] = deep_sizeof):
+        self.name = name
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self._entries: "OrderedDict[Hashable, Tuple[Any, int]]" = OrderedDict()
+        self._pinned: Set[Hashable] = set()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __setitem__(self, key: Hashable, value: Any) -> None:
+        if key in self._entries:
+            self.bytes -= self._entries.pop(key)[1]
+        size = self.sizeof(value)
+        self._entries[key] = (value, size)
+        self.bytes += size
+        self._evict()
+
+    def get(self, key: Hashable, load: Optional[Callable[[Hashable], Any]] = None) -> Any:
+        """
+        Look up the value of a key, as the most recently used one.
+
+        Args:
+            key (Hashable): The key.
+            load (Callable[[Hashable], Any], optional): Loads the value of the key on a miss, which is then stored.
+
+        Returns:
+            Any: The value, or None on a miss without load.
+        """
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+        self.misses += 1
+        if load is None:
+            return None
+        value = load(key)
+        self[key] = value
+        return value
+
+    def prefetch(self, keys: Iterable[Hashable], load: Callable[[Hashable], Any]) -> None:
+        """
+        Load the values of the keys that are not cached yet, without counting lookups.
+
+        Raises:
+            Exception: Any exception raised by load, the values loaded before it are kept.
+        """
+        for key in keys:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+            else:
+                self[key] = load(key)
+
+    def pin(self, keys: Iterable[Hashable]) -> None:
+        """
+        Keep the values of the keys from being evicted, including values stored later.
+        """
+        self._pinned.update(keys)
+
+    def unpin(self, keys: Optional[Iterable[Hashable]] = None) -> None:
+        """
+        Let the values of the keys be evicted again, or of all keys if not given.
+        """
+        if keys is None:
+            self._pinned.clear()
+        else:
+            self._pinned.difference_update(keys)
+        self._evict()
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self.bytes = 0
+
+    def _evict(self) -> None:
+        if self.bytes <= self.max_bytes:
+            return
+        newest = next(reversed(self._entries), None)
+        for key in list(self._entries):
+            if self.bytes <= self.max_bytes:
+                break
+            if key in self._pinned or key == newest:
+                continue
+            self.bytes -= self._entries.pop(key)[1]
+            self.evictions += 1
+        if self.bytes > self.max_bytes:
+            logger.debug("Cache %s holds %s bytes over its budget of %s in pinned entries", self.name, self.bytes, self.max_bytes)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "pinned": len(self._pinned & self._entries.keys()),
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else None,
+        }
+
+
+if __name__ == "__main__":
+    # Usage and testing
+    cache = LRUCache("arrays", 3 * 1024 * 1024 + 1024)
+    load = lambda key: np.zeros((1024, 1024), dtype=np.uint8)
+    cache.pin(["a"])
+    for key in ["a", "b", "c", "a", "d", "e", "b"]:
+        cache.get(key, load)
+        logger.info(f"Get {key}: {list(cache._entries)}")
+    logger.info(f"Stats: {cache.stats()}")
@@ -0,0 +1,189 @@
+"""
+metrics.py
+This module provides an in-process registry of counters and histograms, summarized at the end of each run.
+"""
+
+import json
+import math
+import os
+import time
+from typing import Any, Dict, List, Optional
+
+__all__ = ["Counter", "Histogram", "MetricsRegistry", "metrics"]
+
+
+class Counter:
+    """
+    A monotonically increasing count.
+    """
+    def __init__(self, name: str):
+        self.name = name
+        self.value = 0
+
+    def inc(self, amount: int = 1) -> None:
+        self.value += amount
+
+    def summary(self) -> Dict[str, Any]:
+        return {"type": "counter", "value": self.value}
+
+
+class Histogram:
+    """
+    A histogram with HDR-style log-linear buckets.
+
+    Every power of two is split into SUB_BUCKETS linear buckets, so any recorded value is kept with
+    a relative error below 1 / SUB_BUCKETS, regardless of its magnitude. Negative values are
+    bucketed symmetrically.
+    """
+    SUB_BUCKETS = 64
+
+    def __init__(self, name: str, unit: str = ""):
+        self.name = name
+        self.unit = unit
+        self.buckets: Dict[float, int] = {}
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def _bucket(self, value: float) -> float:
+        if value == 0:
+            return 0.0
+        magnitude = abs(value)
+        exponent = math.floor(math.log2(magnitude))
+        width = 2.0 ** exponent / self.SUB_BUCKETS
+        lower = math.floor(magnitude / width) * width
+        return math.copysign(lower, value)
+
+    def record(self, value: float) -> None:
+        key = self._bucket(value)
+        self.buckets[key] = self.buckets.get(key, 0) + 1
+        self.count += 1
+        self.total += value
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, p: float) -> Optional[float]:
+        """
+        Get the value at the given percentile (0-100), as the lower bound of its bucket.
+        """
+        if self.count == 0:
+            return None
+        rank = max(1, math.ceil(p / 100 * self.count))
+        seen = 0
+        for key in sorted(self.buckets):
+            seen += self.buckets[key]
+            if seen >= rank:
+                return min(max(key, self.min), self.max)
+        return self.max
+
+    def summary(self) -> Dict[str, Any]:
+        if self.count == 0:
+            return {"type": "histogram", "unit": self.unit, "count": 0}
+        return {
+            "type": "histogram",
+            "unit": self.unit,
+            "count": self.count,
+            "mean": self.total / self.count,
+            "min": self.min,
+            "p50": self.percentile(50),
+            "p90": self.percentile(90),
+            "p99": self.percentile(99),
+            "max": self.max,
+        }
+
+
+class _Timer:
+    __slots__ = ("histogram", "start")
+
+    def __init__(self, histogram: Histogram):
+        self.histogram = histogram
+        self.start = 0.0
+
+    def __enter__(self) -> "_Timer":
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.histogram.record((time.perf_counter() - self.start) * 1000)
+
+
+class MetricsRegistry:
+    """
+    Holds the named counters and histograms of the current run.
+
+    Usage:
+        metrics.counter("ocr_cache_hit").inc()
+        metrics.histogram("template_match_score").record(score)
+        with metrics.timer("get_game_time_ms"):
+            ...
+    """
+    def __init__(self):
+        self.counters: Dict[str, Counter] = {}
+        self.histograms: Dict[str, Histogram] = {}
+
+    def counter(self, name: str) -> Counter:
+        if name not in self.counters:
+            self.counters[name] = Counter(name)
+        return self.counters[name]
+
+    def histogram(self, name: str, unit: str = "") -> Histogram:
+        if name not in self.histograms:
+            self.histograms[name] = Histogram(name, unit)
+        return self.histograms[name]
+
+    def timer(self, name: str) -> _Timer:
+        """
+        Create a context measuring the enclosed block into a histogram, in milliseconds.
+        """
+        return _Timer(self.histogram(name, "ms"))
+
+    def reset(self) -> None:
+        self.counters.clear()
+        self.histograms.clear()
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        summary = {name: counter.summary() for name, counter in self.counters.items()}
+        summary.update({name: histogram.summary() for name, histogram in self.histograms.items()})
+        return summary
+
+    def format_table(self) -> str:
+        """
+        Format the current metrics as a plain text table.
+        """
+        lines = [f"{'metric':<28}{'count':>8}{'mean':>10}{'p50':>10}{'p90':>10}{'p99':>10}{'max':>10}  unit"]
+        for name, counter in sorted(self.counters.items()):
+            lines.append(f"{name:<28}{counter.value:>8d}")
+        for name, histogram in sorted(self.histograms.items()):
+            summary = histogram.summary()
+            if histogram.count == 0:
+                lines.append(f"{name:<28}{0:>8d}")
+                continue
+            cells = "".join(f"{summary[key]:>10.3f}" for key in ("mean", "p50", "p90", "p99", "max"))
+            lines.append(f"{name:<28}{histogram.count:>8d}{cells}  {histogram.unit}")
+        return "\n".join(lines)
+
+    def append_history(self, path: str, **info: Any) -> None:
+        """
+        Append the summary of the current run as one line of a JSONL history file.
+        Extra keyword arguments are stored along with the summary, e.g. the workbook and the map.
+        """
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        record = {"time": time.strftime("%Y-%m-%dT%H:%M:%S"), **info, "metrics": self.summary()}
+        with open(path, "a", encoding="utf-8") as file:
+            file.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+
+
+metrics = MetricsRegistry()
+
+if __name__ == "__main__":
+    # Usage and testing
+    import random
+    for _ in range(10000):
+        metrics.histogram("latency", "ms").record(random.expovariate(1 / 20))
+        metrics.counter("calls").inc()
+    metrics.histogram("ticks_late", "tick").record(-1)
+    metrics.histogram("ticks_late", "tick").record(3)
+    print(metrics.format_table())
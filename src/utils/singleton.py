@@ -5,3 +5,19 @@ class Singleton(type):
         if cls not in cls._instances:
             cls._instances[cls] = super(Singleton, cls).__call__(*args, **kwargs)
         return cls._instances[cls]
+
+
+class KeyedSingleton(type):
+    """
+    One instance per class and key, the key being the first argument of the constructor.
+    """
+    _instances = {}
+
+    def __call__(cls, key, *args, **kwargs):
+        if (cls, key) not in cls._instances:
+            cls._instances[(cls, key)] = super(KeyedSingleton, cls).__call__(key, *args, **kwargs)
+        return cls._instances[(cls, key)]
+
+    def forget(cls, key) -> None:
+        """Drop the instance of a key, so that the next call creates a new one."""
+        KeyedSingleton._instances.pop((cls, key), None)
@@ -0,0 +1,32 @@
+import dataclasses
+
+
+def add_slots(cls):
+    """
+    Rebuild a dataclass with __slots__ for its fields, like dataclass(slots=True) on Python 3.10+.
+
+    Instances then have no __dict__: they are smaller and their fields are read and written through slot
+    descriptors. The field defaults are already part of the generated __init__, so they are dropped from
+    the class namespace where they would clash with the slots.
+
+    Usage:
+        @add_slots
+        @dataclasses.dataclass
+        class Point:
+            x: int = 0
+            y: int = 0
+    """
+    if "__slots__" in cls.__dict__:
+        raise TypeError(f"{cls.__name__} already specifies __slots__")
+    namespace = dict(cls.__dict__)
+    field_names = tuple(field.name for field in dataclasses.fields(cls))
+    namespace["__slots__"] = field_names
+    for name in field_names:
+        namespace.pop(name, None)
+    namespace.pop("__dict__", None)
+    namespace.pop("__weakref__", None)
+    qualname = getattr(cls, "__qualname__", None)
+    cls = type(cls)(cls.__name__, cls.__bases__, namespace)
+    if qualname is not None:
+        cls.__qualname__ = qualname
+    return cls
@@ -0,0 +1,160 @@
+"""
+trace.py
+This module provides lightweight timing spans, exported in the Chrome trace event format.
+The exported file can be opened with chrome://tracing or https://ui.perfetto.dev.
+"""
+
+import contextlib
+import functools
+import json
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Tuple
+
+__all__ = ["Tracer", "tracer"]
+
+
+class _Span:
+    __slots__ = ("tracer", "name", "args", "start")
+
+    def __init__(self, tracer: "Tracer", name: str, args: Dict[str, Any]):
+        self.tracer = tracer
+        self.name = name
+        self.args = args
+        self.start = 0
+
+    def __enter__(self) -> "_Span":
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        if exc_type is not None:
+            self.args["error"] = exc_type.__name__
+        self.tracer._complete(self.name, self.start, time.perf_counter_ns(), self.args)
+
+
+class _NullSpan:
+    __slots__ = ("args",)
+
+    def __init__(self):
+        self.args = {}
+
+    def __enter__(self) -> "_NullSpan":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.args.clear()
+
+
+class Tracer:
+    """
+    Collects timing spans of the current run.
+
+    Spans are only recorded while the tracer is enabled; otherwise span() returns a shared no-op context.
+    Polling loops should run under quiet(), so that a long wait is recorded as one span instead of
+    one span per iteration.
+
+    Usage:
+        with tracer.span("capture", ratio=ratio) as span:
+            ...
+            span.args["size"] = img.shape
+    """
+    def __init__(self):
+        self.enabled = False
+        # (phase, name, start, duration, thread id, args), times in nanoseconds
+        self.events: List[Tuple[str, str, int, int, int, Dict[str, Any]]] = []
+        self._quiet = 0
+        self._null_span = _NullSpan()
+        self._origin = time.perf_counter_ns()
+        self._pid = os.getpid()
+
+    def enable(self) -> None:
+        self.enabled = True
+
+    def disable(self) -> None:
+        self.enabled = False
+
+    def clear(self) -> None:
+        self.events = []
+        self._origin = time.perf_counter_ns()
+
+    def span(self, name: str, **args: Any):
+        """
+        Create a span measuring the enclosed block. Extra keyword arguments are attached to the span.
+        """
+        if not self.enabled or self._quiet:
+            return self._null_span
+        return _Span(self, name, args)
+
+    @contextlib.contextmanager
+    def quiet(self):
+        """
+        Suppress all spans inside the enclosed block.
+        """
+        self._quiet += 1
+        try:
+            yield
+        finally:
+            self._quiet -= 1
+
+    def instant(self, name: str, **args: Any) -> None:
+        """
+        Record a point in time, e.g. a detected event.
+        """
+        if not self.enabled or self._quiet:
+            return
+        self.events.append(("i", name, time.perf_counter_ns(), 0, threading.get_ident(), args))
+
+    def wrap(self, name: str) -> Callable:
+        """
+        A decorator recording a span for every call of the decorated function.
+        """
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled or self._quiet:
+                    return func(*args, **kwargs)
+                with _Span(self, name, {}):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def _complete(self, name: str, start: int, end: int, args: Dict[str, Any]) -> None:
+        self.events.append(("X", name, start, end - start, threading.get_ident(), args))
+
+    def to_chrome_events(self) -> List[Dict[str, Any]]:
+        """
+        Convert the recorded spans to Chrome trace events, with timestamps in microseconds.
+        """
+        events = []
+        for phase, name, start, duration, tid, args in self.events:
+            event = {"name": name, "ph": phase, "ts": (start - self._origin) / 1000, "pid": self._pid, "tid": tid, "args": args}
+            if phase == "X":
+                event["dur"] = duration / 1000
+            else:
+                event["s"] = "t"
+            events.append(event)
+        return events
+
+    def export(self, path: str) -> None:
+        """
+        Write the recorded spans to a Chrome trace JSON file.
+        """
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as file:
+            json.dump({"traceEvents": self.to_chrome_events(), "displayTimeUnit": "ms"}, file, ensure_ascii=False, default=str)
+
+
+tracer = Tracer()
+
+if __name__ == "__main__":
+    # Usage and testing
+    tracer.enable()
+    with tracer.span("outer", row=1) as span:
+        with tracer.span("inner"):
+            time.sleep(0.01)
+        span.args["actual"] = "GameTime(cost=1, tick=0)"
+    tracer.instant("marker")
+    tracer.export("trace_test.json")
+    print(json.dumps(tracer.to_chrome_events(), indent=2))
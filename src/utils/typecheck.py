@@ -19,3 +19,33 @@ def get_optional_type(opt_type):
     if get_origin(opt_type) is Union:
         return next((t for t in get_args(opt_type) if t is not type(None)), None)
     return opt_type
+
+
+def compile_type_check(field_type):
+    """
+    Build a checker equivalent to is_valid_type(value, field_type), resolving the type once.
+    """
+    origin = get_origin(field_type)
+    if origin is None:
+        return lambda value: isinstance(value, field_type)
+    args = get_args(field_type)
+    if origin is Union:
+        checks = [compile_type_check(t) for t in args]
+        return lambda value: any(check(value) for check in checks)
+    if len(args) == 1:
+        check = compile_type_check(args[0])
+        return lambda value: isinstance(value, origin) and check(value)
+    checks = [compile_type_check(t) for t in args]
+    return lambda value: isinstance(value, origin) and all(check(v) for check, v in zip(checks, value))
+
+
+def compile_converter(opt_type):
+    """
+    Build a converter from a raw cell value to the actual type of an optional type.
+
+    The converter returns None for None, and raises ValueError or TypeError for a value that can not be converted.
+    """
+    actual_type = get_optional_type(opt_type)
+    if actual_type is None:
+        return lambda value: None
+    return lambda value: None if value is None else actual_type(value)